@@ -2,13 +2,19 @@ import numpy as np
 import pandas as pd
 from scipy.spatial.distance import euclidean
 from fastdtw import fastdtw
-import matplotlib.pyplot as plt
 from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
 
 from data_manager import StockDataManager
+from results import ForecastResult
+from instrumentation import span, timed
 
 from configparser import ConfigParser
 
+class AnalysisCancelled(Exception):
+    """分析在计算中途被取消"""
+
+
 class AnalysisEngine:
     def __init__(self):
         self.config = ConfigParser()
@@ -25,6 +31,9 @@ class AnalysisEngine:
         self.topn = self.config.getint('Analysis', 'topn', fallback=5)
         self.use_broad_market_index = self.config.getboolean('Analysis', 'use_broad_market_index', fallback=False)
         
+        # 取消检查: 返回True时retrieve_similar_patterns在下一个窗口前抛出AnalysisCancelled
+        self.should_stop = None
+
         self.data_mgr = StockDataManager()
         # 新增指数数据字典
         self.broad_indices = {}
@@ -59,6 +68,7 @@ class AnalysisEngine:
         if scale_method == "pctchange":   #适合returns
             return np.diff(series, axis=0) / series[:-1]
 
+    @timed('dtw')
     def compute_dtw_distance(self, series_a, series_b):
         scaled_a = self.scale_series(series_a)
         scaled_b = self.scale_series(series_b)
@@ -104,6 +114,8 @@ class AnalysisEngine:
         top_matches = [(float('inf'), -1)]
 
         for index in range(1,len(series) - 2 * self.window_size - self.days_to_forecast):
+            if self.should_stop is not None and self.should_stop():
+                raise AnalysisCancelled()
             historical_segment = series[index: index + self.window_size].values
             
             if self.use_volume and volume is not None:
@@ -127,6 +139,81 @@ class AnalysisEngine:
                     break
         return top_matches
 
+    def prepare_windows(self, series, market=None, volume=None, volume_ratio=None):
+        """
+        一次性构造并缩放全部历史窗口, 供同一只股票的多个分析日期复用
+
+        返回的prepared中features第i行对应series的第i根K线;
+        对任意截止位置end调用retrieve_similar_patterns_prepared,
+        结果与retrieve_similar_patterns(series[:end], ...)一致
+        """
+        if self.use_returns:
+            series = series.pct_change(1)
+        columns = [series.values]
+        if self.use_volume and volume is not None:
+            if self.use_returns:
+                volume = volume.pct_change(1)
+            columns.append(volume.reindex(series.index).values)
+        if self.use_volume_ratio and volume_ratio is not None:
+            columns.append(volume_ratio.reindex(series.index).values)
+        market_data = self.broad_indices.get(market) if market is not None else None
+        if self.use_broad_market_index and market_data is not None:
+            if self.use_returns:
+                market_data = market_data.pct_change(1)
+            columns.append(market_data.reindex(series.index, method='ffill').values)
+        features = np.column_stack(columns) if len(columns) > 1 else columns[0]
+
+        # windows[i] = features[i:i+window_size], 按scale_method逐窗口缩放
+        windows = sliding_window_view(features, self.window_size, axis=0)
+        if windows.ndim == 3:
+            windows = windows.transpose(0, 2, 1)
+        scaled = np.stack([self.scale_series(w) for w in windows]) if len(windows) > 0 else windows
+        if scaled.ndim == 2:
+            scaled = scaled[..., None]
+        return {'features': features, 'scaled_windows': scaled}
+
+    def retrieve_similar_patterns_prepared(self, prepared, end):
+        """以前end根K线为历史数据寻找相似模式, 返回格式与retrieve_similar_patterns相同"""
+        scaled_windows = prepared['scaled_windows']
+        current = scaled_windows[end - self.window_size]
+        candidates = range(1, end - 2 * self.window_size - self.days_to_forecast)
+        with span('dtw_prepared'):
+            distances = np.array([fastdtw(current, scaled_windows[index], radius=self.dtw_radius, dist=euclidean)[0]
+                                  for index in candidates])
+        # 稳定排序, 距离相同时保持索引顺序, 与逐个插入的结果一致
+        order = np.argsort(distances, kind='stable')
+        return [(distances[i], candidates[i]) for i in order] + [(float('inf'), -1)]
+
+    def find_patterns_and_forecast_prepared(self, prepared, close_prices, end):
+        """
+        基于预构造窗口的预测, 分析日期为close_prices的第end根K线
+
+        返回值与find_patterns_and_forecast相同 (ForecastResult)
+        """
+        before_prices = close_prices.iloc[:end]
+        after_prices = close_prices.iloc[end:]
+        matches = self.retrieve_similar_patterns_prepared(prepared, end)
+        best_matches = self.find_best_matches(matches)
+        forecast_returns, forecast_prices = self.cal_forecast(before_prices, best_matches)
+        real_prices = after_prices.values[:self.days_to_forecast]
+        return ForecastResult(best_matches, forecast_returns, forecast_prices, real_prices, before_prices)
+
+    def get_params(self):
+        """影响预测结果的全部参数, 用作结果缓存键的一部分"""
+        return {
+            'dtw_radius': self.dtw_radius,
+            'window_size': self.window_size,
+            'days_to_forecast': self.days_to_forecast,
+            'use_returns': self.use_returns,
+            'use_volume': self.use_volume,
+            'use_volume_ratio': self.use_volume_ratio,
+            'scale_method': self.scale_method,
+            'forecast_cal_method': self.forecast_cal_method,
+            'index_distance': self.index_distance,
+            'topn': self.topn,
+            'use_broad_market_index': self.use_broad_market_index,
+        }
+
     def set_window_size(self, value):
         self.window_size = value
 
@@ -201,27 +288,53 @@ class AnalysisEngine:
         else:
             real_prices = after_prices.values[:self.days_to_forecast]
         
-        return best_matches,forecast_returns, forecast_prices ,real_prices, before_prices
+        return ForecastResult(best_matches, forecast_returns, forecast_prices, real_prices, before_prices)
+
+    def forecast_plot_data(self, close_prices, best_matches, forecast_returns, forecast_prices, real_prices):
+        """
+        预测图表的三组曲线数据, plot_patterns_and_forecast和复用线条的ForecastCharts共用
+
+        返回:
+            matches: [(标签, 历史片段Series, 归一化片段)]
+            current: 当前模式归一化曲线
+            median: 预测路径归一化曲线
+            current_prices / forecast_prices / real_prices: 第三个子图的(x, y)
+        """
+        return_series = close_prices.pct_change(1)
+        matches = []
+        for idx, (similarity_score, match_index) in enumerate(best_matches):
+            historical_data = close_prices[match_index:match_index + self.window_size]
+            normalized_pattern = (return_series[match_index:match_index + self.window_size + self.days_to_forecast] + 1).cumprod() * 100
+            label = f"Pattern {idx + 1},{similarity_score:.2f},{str(close_prices.index[match_index])[:10]}"
+            matches.append((label, historical_data, normalized_pattern))
+        median_forecast = np.append(return_series[-self.window_size:], forecast_returns)
+        return {
+            'matches': matches,
+            'current': (return_series[-self.window_size:] + 1).cumprod() * 100,
+            'median': (median_forecast + 1).cumprod() * 100,
+            'current_prices': (np.arange(self.window_size), close_prices.values[-self.window_size:]),
+            'forecast_prices': (np.arange(self.window_size - 1, self.window_size + self.days_to_forecast),
+                                np.r_[close_prices.iloc[-1], forecast_prices]),
+            'real_prices': (np.arange(self.window_size - 1, self.window_size + len(real_prices)),
+                            np.r_[close_prices.iloc[-1], real_prices] if len(real_prices) > 0 else np.asarray([])),
+        }
 
     def plot_patterns_and_forecast(self, figs, close_prices, best_matches, forecast_returns, forecast_prices, real_prices,analysis_date=None):
-        return_series = close_prices.pct_change(1)
+        from lod import plot_lod  # 绘图时才导入matplotlib, 命令行和服务进程不需要
+        data = self.forecast_plot_data(close_prices, best_matches, forecast_returns, forecast_prices, real_prices)
         axes = [figs[i].add_subplot(111) for i in range(3)]
 
         # 绘制历史价格曲线
         label0= f"Price Patterns to {analysis_date}" if analysis_date is not None else "Price Patterns to Current Date"
-        axes[0].plot(close_prices, color='black', label="Stock Price History")
+        plot_lod(axes[0], close_prices.index, close_prices.values, color='black', label="Stock Price History")
 
         # 颜色配置
         color_palette = ['red', 'green', 'purple', 'orange', 'cyan']
-        projected_prices = []
-
 
         # 绘制匹配模式
-        for idx, (similarity_score, match_index) in enumerate(best_matches):
+        for idx, (label, historical_data, _) in enumerate(data['matches']):
             line_color = color_palette[idx % len(color_palette)]
-            historical_data = close_prices[match_index:match_index + self.window_size]
-
-            axes[0].plot(historical_data, color=line_color, label=f"Pattern {idx + 1},{similarity_score:.2f},{str(close_prices.index[match_index])[:10]}")
+            axes[0].plot(historical_data, color=line_color, label=label)
 
         # 设置第一个子图
         axes[0].set_title(label0,fontsize=10)
@@ -231,22 +344,16 @@ class AnalysisEngine:
         axes[0].legend(fontsize=8)
 
         # 绘制归一化模式
-        for idx, (_, match_index) in enumerate(best_matches):
+        for idx, (_, _, normalized_pattern) in enumerate(data['matches']):
             line_color = color_palette[idx % len(color_palette)]
-            normalized_pattern = (return_series[match_index:match_index + self.window_size + self.days_to_forecast] + 1).cumprod() * 100
-            axes[1].plot(range(self.window_size + self.days_to_forecast), normalized_pattern, color=line_color,
+            axes[1].plot(range(len(normalized_pattern)), normalized_pattern, color=line_color,
                         linewidth=3 if idx == 0 else 1, label=f"Pattern {idx + 1}")
 
         # 绘制当前模式
-        normalized_current = (return_series[-self.window_size:] + 1).cumprod() * 100
-        axes[1].plot(range(self.window_size), normalized_current, color='black', linewidth=3, label="Current Pattern")
-
+        axes[1].plot(range(self.window_size), data['current'], color='black', linewidth=3, label="Current Pattern")
 
-
-        # 计算并绘制预测路径
-        median_forecast = np.append(return_series[-self.window_size:], forecast_returns)
-        median_forecast_cumulative = (median_forecast + 1).cumprod() * 100
-        axes[1].plot(range(self.window_size + self.days_to_forecast), median_forecast_cumulative,
+        # 绘制预测路径
+        axes[1].plot(range(self.window_size + self.days_to_forecast), data['median'],
                     color='black', linestyle='dashed', label="Median Projected Path")
 
         # 设置第二个子图
@@ -254,18 +361,11 @@ class AnalysisEngine:
         axes[1].set_xlabel("Days",fontsize=8)
         axes[1].set_ylabel("Reindexed Price",fontsize=8)
         axes[1].tick_params(axis='both', which='major', labelsize=8)
-        #axes[1].legend(fontsize=8)
-
-
-        axes[2].plot(range(self.window_size), close_prices[-self.window_size:], color='black', linewidth=3, label="Current Price")
-        
-        axes[2].plot(range(self.window_size-1, self.window_size + self.days_to_forecast), np.r_[close_prices.iloc[-1],forecast_prices],
-                    color='black', linestyle='dashed', label="Forecast Price")
-        #for i in range(self.days_to_forecast):
-        #    axes[2].text(self.window_size+i, forecast_prices[i], f"{forecast_prices[i]:.2f}", ha ='center', va='bottom',fontsize=8)
 
+        axes[2].plot(*data['current_prices'], color='black', linewidth=3, label="Current Price")
+        axes[2].plot(*data['forecast_prices'], color='black', linestyle='dashed', label="Forecast Price")
         if len(real_prices) > 0:
-            axes[2].plot(range(self.window_size-1, self.window_size + len(real_prices)), np.r_[close_prices.iloc[-1],real_prices], color='red', linestyle='dashed', label="Real Price")
+            axes[2].plot(*data['real_prices'], color='red', linestyle='dashed', label="Real Price")
         
         # 设置第三个子图
         axes[2].set_title(f"Similar {self.window_size}-Day Patterns and Forecast Price",fontsize=10)
@@ -273,4 +373,3 @@ class AnalysisEngine:
         axes[2].set_ylabel("Reindexed Price",fontsize=8)
         axes[2].tick_params(axis='both', which='major', labelsize=8)
         axes[2].legend(fontsize=8)
-
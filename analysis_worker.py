@@ -0,0 +1,170 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError
+from configparser import ConfigParser
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from analysis_engine import AnalysisEngine, AnalysisCancelled
+from result_store import ResultStore, data_version
+
+
+# 趋势预测页的后台分析: 每个分析日期作为一个任务提交到进程池, 完成后通过Qt信号送回GUI线程.
+# 取消时递增共享的批次号, 正在计算的子进程在下一个DTW窗口前发现批次号变化并放弃当前日期.
+
+ENGINE_NAME = 'trend_analysis'
+
+_worker_engine = None
+_worker_generation = None
+
+
+def _init_worker(generation):
+    """子进程初始化: 保存共享批次号, 每个进程只构造一次分析引擎"""
+    global _worker_engine, _worker_generation
+    _worker_generation = generation
+    _worker_engine = AnalysisEngine()
+
+
+def _forecast_date(task):
+    """子进程任务: 计算一个分析日期的预测, 批次号变化时抛出AnalysisCancelled"""
+    generation, market, close_prices, volume, volume_ratio, analysis_date = task
+    _worker_engine.should_stop = lambda: _worker_generation.value != generation
+    return _worker_engine.find_patterns_and_forecast(
+        close_prices,
+        market=market,
+        volume=volume,
+        volume_ratio=volume_ratio,
+        analysis_date=analysis_date
+    )
+
+
+class ForecastExecutor(QObject):
+    """
+    多日期趋势预测的执行器
+
+    信号(均在GUI线程发出):
+        result_ready(date_str, ForecastResult): 某个日期计算完成或命中缓存
+        date_failed(date_str, message): 某个日期计算出错
+        finished(cancelled): 本批次全部日期结束
+    """
+    result_ready = pyqtSignal(str, object)
+    date_failed = pyqtSignal(str, str)
+    finished = pyqtSignal(bool)
+    # 进程池回调线程 -> GUI线程的内部转发
+    _completed = pyqtSignal(int, str, object, str)
+
+    def __init__(self, workers=None, store=None, parent=None):
+        super().__init__(parent)
+        if workers is None:
+            config = ConfigParser()
+            config.read('config.ini')
+            workers = config.getint('Analysis', 'analysis_workers', fallback=0)
+        self.workers = workers or os.cpu_count() or 1
+        self.store = store if store is not None else ResultStore()
+        # 用spawn启动子进程, 避免fork带着Qt的线程和状态
+        self.context = multiprocessing.get_context('spawn')
+        self.generation = self.context.Value('i', 0)
+        self.executor = None
+        self.futures = []
+        self.pending = 0
+        self.job = None
+        self._completed.connect(self._on_completed)
+
+    def _ensure_pool(self):
+        # 进程池在首次分析时创建并跨批次复用, 省去重复启动进程和加载引擎
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self.context,
+                                                initializer=_init_worker, initargs=(self.generation,))
+        return self.executor
+
+    @property
+    def running(self):
+        return self.pending > 0
+
+    def start(self, stock_code, market, df, dates):
+        """
+        开始分析一只股票的多个日期, 会先取消尚未结束的批次
+
+        参数:
+            df: 含Close/Volume/Volume_Ratio列的周线数据
+            dates: 分析日期字符串列表
+        """
+        self.cancel()
+        with self.generation.get_lock():
+            self.generation.value += 1
+            generation = self.generation.value
+        engine = AnalysisEngine()
+        params = engine.get_params()
+        params.update({'market': market, 'first_date': df.index[0]})
+        self.job = {'generation': generation, 'stock_code': stock_code,
+                    'version': data_version(df), 'params': params}
+        self.pending = len(dates)
+
+        cached = []
+        for analysis_date in dates:
+            result = self.store.get(stock_code, self.job['version'], ENGINE_NAME, self._date_params(analysis_date))
+            if result is not None:
+                cached.append((analysis_date, result))
+                continue
+            task = (generation, market, df['Close'], df['Volume'], df['Volume_Ratio'], analysis_date)
+            future = self._ensure_pool().submit(_forecast_date, task)
+            future.add_done_callback(lambda f, d=analysis_date: self._on_future_done(generation, d, f))
+            self.futures.append(future)
+
+        for analysis_date, result in cached:
+            self.result_ready.emit(analysis_date, result)
+            self._date_done()
+        if not dates:
+            # 没有要分析的日期, 批次立即结束
+            self.job = None
+            self.finished.emit(False)
+
+    def _date_params(self, analysis_date):
+        return dict(self.job['params'], analysis_date=analysis_date)
+
+    def _on_future_done(self, generation, analysis_date, future):
+        # 运行在进程池的回调线程, 只做转发
+        try:
+            result, error = future.result(), ''
+        except (CancelledError, AnalysisCancelled):
+            result, error = None, ''
+        except Exception as e:
+            result, error = None, str(e)
+        self._completed.emit(generation, analysis_date, result, error)
+
+    def _on_completed(self, generation, analysis_date, result, error):
+        if self.job is None or generation != self.job['generation']:
+            return
+        if result is not None:
+            self.store.put(self.job['stock_code'], self.job['version'], ENGINE_NAME,
+                           self._date_params(analysis_date), result)
+            self.result_ready.emit(analysis_date, result)
+        elif error:
+            self.date_failed.emit(analysis_date, error)
+        self._date_done()
+
+    def _date_done(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.futures = []
+            self.job = None
+            self.finished.emit(False)
+
+    def cancel(self):
+        """取消当前批次: 未开始的日期直接取消, 正在计算的日期在下一个窗口前中止"""
+        if self.job is None:
+            return
+        with self.generation.get_lock():
+            self.generation.value += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.job = None
+        self.pending = 0
+        self.finished.emit(True)
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
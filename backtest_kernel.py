@@ -0,0 +1,135 @@
+import numpy as np
+
+
+def performance_metrics(portfolio_value, periods_per_year=52):
+    """
+    根据组合价值序列计算回测指标 (与EnvelopeStrategy.backtest_strategy的计算口径一致)
+
+    返回:
+        dict: cumulative_returns, annualized_returns, max_drawdown, sharpe_ratio
+    """
+    portfolio_value = np.asarray(portfolio_value, dtype=float)
+    returns = np.diff(portfolio_value) / portfolio_value[:-1]
+    years = len(portfolio_value) / periods_per_year
+    peak = np.maximum.accumulate(portfolio_value)
+    if len(returns) > 0 and np.std(returns) > 0:
+        sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(periods_per_year)
+    else:
+        sharpe_ratio = 0
+    return {
+        'cumulative_returns': portfolio_value[-1] / portfolio_value[0] - 1,
+        'annualized_returns': (portfolio_value[-1] / portfolio_value[0]) ** (1/years) - 1,
+        'max_drawdown': np.min((portfolio_value - peak) / peak),
+        'sharpe_ratio': sharpe_ratio,
+    }
+
+
+def simulate_positions(prices, positions, initial_capital=100000):
+    """
+    按目标仓位序列模拟交易, 买卖规则与EnvelopeStrategy.backtest_strategy的逐日循环一致
+
+    只在仓位变化的K线上处理交易, 其余K线的组合价值由持股数和现金直接向量化计算.
+
+    参数:
+        prices: 收盘价序列
+        positions: 每根K线收盘时的目标仓位(0~1)
+
+    返回:
+        dict: portfolio_value, position_history, trades (交易记录列表, 含K线序号index)
+    """
+    prices = np.asarray(prices, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    changes = np.flatnonzero(np.diff(np.concatenate([[0.0], positions])) != 0)
+
+    cash = float(initial_capital)
+    shares = 0.0
+    position = 0.0
+    portfolio_value = np.empty(len(prices))
+    trades = []
+    previous = 0
+    for i in changes:
+        portfolio_value[previous:i] = cash + shares * prices[previous:i]
+        price = prices[i]
+        new_position = positions[i]
+        if new_position > position:  # 买入
+            buy_value = (cash + shares * price) * new_position - shares * price
+            shares += buy_value / price
+            cash -= buy_value
+            trades.append({'index': i, 'action': '买入', 'price': price, 'shares': buy_value / price,
+                           'value': buy_value, 'position': new_position})
+        else:  # 卖出
+            shares_to_sell = shares * (position - new_position) / position if position > 0 else 0
+            shares -= shares_to_sell
+            cash += shares_to_sell * price
+            trades.append({'index': i, 'action': '卖出', 'price': price, 'shares': shares_to_sell,
+                           'value': shares_to_sell * price, 'position': new_position})
+        position = new_position
+        previous = i
+    portfolio_value[previous:] = cash + shares * prices[previous:]
+
+    return {
+        'portfolio_value': portfolio_value,
+        'position_history': positions,
+        'trades': trades,
+    }
+
+
+def simulate_positions_batch(prices, positions, initial_capital=100000):
+    """
+    simulate_positions的多股票版本: 逐K线循环, 每根K线对所有股票向量化处理, 结果与逐只调用simulate_positions一致
+
+    参数:
+        prices: (股票数×K线数)收盘价矩阵, 按最后一根K线右对齐, 无数据处为NaN (见align_series)
+        positions: 同形状的目标仓位矩阵, 无数据处为0
+
+    返回:
+        dict: portfolio_value (同形状, 无数据处为NaN), trades (每只股票的交易记录列表, index为该股票自身的K线序号)
+    """
+    prices = np.asarray(prices, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    n_stocks, n_bars = prices.shape
+    offsets = n_bars - np.sum(~np.isnan(prices), axis=1)
+
+    cash = np.full(n_stocks, float(initial_capital))
+    shares = np.zeros(n_stocks)
+    position = np.zeros(n_stocks)
+    portfolio_value = np.empty((n_stocks, n_bars))
+    trades = [[] for _ in range(n_stocks)]
+    for t in range(n_bars):
+        price = prices[:, t]
+        changed = np.flatnonzero(positions[:, t] != position)
+        if len(changed) > 0:
+            p, new, old, held = price[changed], positions[changed, t], position[changed], shares[changed]
+            buy = new > old
+            # 买入: 目标市值减去持仓市值; 卖出: 按仓位下降比例卖出持股
+            buy_value = np.where(buy, (cash[changed] + held * p) * new - held * p, 0.0)
+            bought = buy_value / p
+            sold = np.where(buy | (old <= 0), 0.0, held * (old - new) / np.where(old > 0, old, 1.0))
+            shares[changed] = held + bought - sold
+            cash[changed] = cash[changed] - buy_value + sold * p
+            position[changed] = new
+            for j, k in enumerate(changed):
+                if buy[j]:
+                    trades[k].append({'index': t - offsets[k], 'action': '买入', 'price': p[j], 'shares': bought[j],
+                                      'value': buy_value[j], 'position': new[j]})
+                else:
+                    trades[k].append({'index': t - offsets[k], 'action': '卖出', 'price': p[j], 'shares': sold[j],
+                                      'value': sold[j] * p[j], 'position': new[j]})
+        portfolio_value[:, t] = cash + shares * price
+
+    return {
+        'portfolio_value': portfolio_value,
+        'position_history': positions,
+        'trades': trades,
+    }
+
+
+def win_rate(trades):
+    """按相邻的买入/卖出交易对计算胜率"""
+    profitable_trades = 0
+    for i in range(0, len(trades) - 1, 2):
+        if trades[i]['action'] == '买入' and trades[i+1]['action'] == '卖出':
+            if trades[i+1]['value'] > trades[i]['value']:
+                profitable_trades += 1
+    pairs = len(trades) // 2
+    return profitable_trades / pairs if pairs > 0 else 0
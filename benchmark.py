@@ -0,0 +1,406 @@
+"""
+性能基准测试
+
+用合成的OHLCV数据(带行情切换的几何布朗运动)在多个数据规模下测量关键路径耗时,
+结果按git提交保存到SQLite, 并可比较两个提交的结果、标记超过阈值的性能回退.
+
+用法:
+    python benchmark.py run [--quick] [--case NAME ...] [--skip-parity]
+    python benchmark.py parity
+    python benchmark.py compare BASE [HEAD] [--threshold 0.2]
+    python benchmark.py list
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+from datetime import datetime
+from configparser import ConfigParser
+import numpy as np
+import pandas as pd
+
+from data_manager import StockDataManager
+
+
+# 行情状态: (年化漂移, 年化波动率), 依次为牛市、熊市、震荡
+REGIMES = ((0.25, 0.20), (-0.30, 0.35), (0.02, 0.12))
+
+
+def synthetic_ohlcv(n_bars, seed=0, start='2000-01-03', regimes=REGIMES, switch_prob=0.01):
+    """
+    生成日线OHLCV数据: 对数收益服从几何布朗运动, 漂移和波动率按马尔可夫链在regimes之间切换
+
+    返回:
+        DataFrame, 索引为工作日, 列为Open/High/Low/Close/Volume
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1 / 252
+    switches = rng.random(n_bars) < switch_prob
+    choices = rng.integers(0, len(regimes), size=n_bars)
+    # 每次切换后保持新状态直到下一次切换, 第一次切换前为状态0
+    last_switch = np.maximum.accumulate(np.where(switches, np.arange(n_bars), 0))
+    state = np.where(np.cumsum(switches) > 0, choices[last_switch], 0)
+    mu = np.array([r[0] for r in regimes])[state]
+    sigma = np.array([r[1] for r in regimes])[state]
+    log_returns = (mu - sigma ** 2 / 2) * dt + sigma * np.sqrt(dt) * rng.standard_normal(n_bars)
+    close = 100 * np.exp(np.cumsum(log_returns))
+    open_ = np.concatenate([[100.0], close[:-1]]) * np.exp(0.2 * sigma * np.sqrt(dt) * rng.standard_normal(n_bars))
+    spread = np.abs(rng.standard_normal((2, n_bars))) * sigma * np.sqrt(dt) * 0.5
+    high = np.maximum(open_, close) * (1 + spread[0])
+    low = np.minimum(open_, close) * (1 - spread[1])
+    volume = np.round(1e6 * np.exp(0.3 * rng.standard_normal(n_bars)) * (1 + 20 * np.abs(log_returns)))
+    index = pd.bdate_range(start, periods=n_bars)
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+# 与实际数据使用相同的周线重采样和量比计算
+resample_weekly = StockDataManager.resample_weekly
+
+
+def synthetic_weekly(n_weeks, seed=0):
+    """生成n_weeks根周线"""
+    return resample_weekly(synthetic_ohlcv(n_weeks * 5 + 5, seed)).iloc[-n_weeks:]
+
+
+def synthetic_universe(n_symbols, n_weeks, seed=0):
+    """生成n_symbols只股票的周线, 返回{code: DataFrame}"""
+    return {f"SYN{i:04d}": synthetic_weekly(n_weeks, seed + i) for i in range(n_symbols)}
+
+
+class FrameSource:
+    """以内存中的DataFrame代替StockDataManager提供周线数据, 供策略类在合成数据上运行"""
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get_stock_weekly_data(self, code):
+        frame = self.frames.get(code)
+        return None if frame is None else frame.copy()
+
+    def get_stock_market(self, code):
+        return 'US'
+
+    calculate_volume_ratio = staticmethod(StockDataManager.calculate_volume_ratio)
+
+
+# 基准测试注册表: name -> (sizes, setup), setup(size)返回无参的被测函数
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes):
+    def decorator(setup):
+        BENCHMARKS[name] = (sizes, setup)
+        return setup
+    return decorator
+
+
+def _with_tmp_dir(func, tmp_dir):
+    """被测函数持有TemporaryDirectory, 函数释放后临时目录随之删除"""
+    func.tmp_dir = tmp_dir
+    return func
+
+
+@benchmark('load_csv', sizes=[2600, 5200])
+def bench_load_csv(size):
+    tmp_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp_dir.name, 'bench_daily.csv')
+    synthetic_ohlcv(size).to_csv(path)
+    return _with_tmp_dir(lambda: pd.read_csv(path, index_col=0, parse_dates=True), tmp_dir)
+
+
+@benchmark('load_binary', sizes=[2600, 5200])
+def bench_load_binary(size):
+    tmp_dir = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp_dir.name, 'bench_daily.pkl')
+    synthetic_ohlcv(size).to_pickle(path)
+    return _with_tmp_dir(lambda: pd.read_pickle(path), tmp_dir)
+
+
+@benchmark('resample_weekly', sizes=[2600, 5200])
+def bench_resample_weekly(size):
+    data = synthetic_ohlcv(size)
+    return lambda: resample_weekly(data)
+
+
+def _dtw_setup(size, scale_method):
+    from analysis_engine import AnalysisEngine
+    engine = AnalysisEngine()
+    engine.scale_method = scale_method
+    close = synthetic_weekly(size)['Close']
+    return lambda: engine.retrieve_similar_patterns(close)
+
+
+for _scale_method in ('first', 'minmax', 'mean', 'zscore'):
+    benchmark(f'retrieve_similar_patterns[{_scale_method}]', sizes=[260, 520])(
+        lambda size, _method=_scale_method: _dtw_setup(size, _method))
+
+
+@benchmark('retrieve_similar_patterns_prepared', sizes=[260, 520])
+def bench_retrieve_prepared(size):
+    from analysis_engine import AnalysisEngine
+    engine = AnalysisEngine()
+    close = synthetic_weekly(size)['Close']
+
+    def run():
+        prepared = engine.prepare_windows(close)
+        return engine.retrieve_similar_patterns_prepared(prepared, len(close))
+    return run
+
+
+@benchmark('analyze_stability', sizes=[260, 520, 1040])
+def bench_analyze_stability(size):
+    from feature_analysis import FeatureAnalyzer
+    analyzer = FeatureAnalyzer()
+    close = synthetic_weekly(size)['Close'].values
+    return lambda: analyzer.analyze_stability(close, [1, 2, 3, 5])
+
+
+def _strategy(frames):
+    from envelope_strategy import EnvelopeStrategy
+    strategy = EnvelopeStrategy()
+    strategy.data_manager = FrameSource(frames)
+    return strategy
+
+
+@benchmark('generate_signals', sizes=[520, 1040])
+def bench_generate_signals(size):
+    df = synthetic_weekly(size)
+    strategy = _strategy({'SYN': df})
+    return lambda: strategy.generate_signals('SYN', 'US', df=df)
+
+
+@benchmark('backtest_strategy', sizes=[520, 1040])
+def bench_backtest_strategy(size):
+    strategy = _strategy({'SYN': synthetic_weekly(size)})
+    return lambda: strategy.backtest_strategy('SYN', 'US')
+
+
+@benchmark('screen_universe', sizes=[50, 200, 500])
+def bench_screen_universe(size):
+    from screener import StockScreener
+    screener = StockScreener()
+    closes = {code: df['Close'] for code, df in synthetic_universe(size, 520).items()}
+    return lambda: screener.compute_metrics(closes)
+
+
+def quiet(func):
+    """运行时屏蔽被测代码的print输出"""
+    def run():
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            return func()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    return run
+
+
+def time_case(func, repeat=3):
+    """预热一次后重复repeat次, 返回(最短耗时, 平均耗时)秒"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return min(timings), float(np.mean(timings))
+
+
+def current_commit():
+    """当前git提交(短哈希)和工作区是否有未提交修改"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], text=True,
+                                             stderr=subprocess.DEVNULL).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+class BenchmarkStore:
+    """基准测试结果数据库"""
+    def __init__(self, db_path=None):
+        if db_path is None:
+            config = ConfigParser()
+            config.read('config.ini')
+            db_path = config.get('Benchmark', 'db_path', fallback='./bench_results.db')
+        self.db_conn = sqlite3.connect(db_path)
+        self.db_conn.execute('''
+            CREATE TABLE IF NOT EXISTS bench_results (
+                commit_id TEXT NOT NULL,
+                dirty INTEGER NOT NULL,
+                created TEXT NOT NULL,
+                case_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                best REAL NOT NULL,
+                mean REAL NOT NULL,
+                repeats INTEGER NOT NULL,
+                peak_mb REAL
+            )
+        ''')
+        # 旧版本数据库没有内存峰值列
+        columns = [row[1] for row in self.db_conn.execute('PRAGMA table_info(bench_results)')]
+        if 'peak_mb' not in columns:
+            self.db_conn.execute('ALTER TABLE bench_results ADD COLUMN peak_mb REAL')
+        self.db_conn.commit()
+
+    def save(self, commit, dirty, rows):
+        now = datetime.now().isoformat()
+        self.db_conn.executemany('INSERT INTO bench_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 [(commit, int(dirty), now, row['case'], row['size'], row['best'], row['mean'],
+                                   row['repeats'], row.get('peak_mb')) for row in rows])
+        self.db_conn.commit()
+
+    def latest(self, commit):
+        """某个提交每个(用例, 规模)最近一次的结果"""
+        return pd.read_sql_query('''
+            SELECT case_name, size, best, mean FROM bench_results
+            WHERE commit_id = ? AND created = (
+                SELECT MAX(created) FROM bench_results r
+                WHERE r.commit_id = bench_results.commit_id AND r.case_name = bench_results.case_name
+                  AND r.size = bench_results.size)
+        ''', self.db_conn, params=(commit,)).set_index(['case_name', 'size'])
+
+    def commits(self):
+        return pd.read_sql_query('''
+            SELECT commit_id, MAX(created) AS created, COUNT(*) AS results FROM bench_results
+            GROUP BY commit_id ORDER BY created
+        ''', self.db_conn)
+
+
+def measure_memory(func, name, budget_mb=0):
+    """在tracemalloc下单独运行一次, 返回阶段内存记录; 超过budget_mb时抛出MemoryBudgetExceeded"""
+    from memory_profile import memory_profiler
+    was_enabled = memory_profiler.enabled
+    previous_budget = memory_profiler.budget_mb
+    memory_profiler.start(budget_mb)
+    try:
+        with memory_profiler.stage(name) as stage:
+            func()
+        return stage.entry
+    finally:
+        memory_profiler.budget_mb = previous_budget
+        if not was_enabled:
+            memory_profiler.stop()
+
+
+def run_benchmarks(cases=None, quick=False, repeat=3, memory=False, memory_budget_mb=0):
+    """
+    运行基准测试
+
+    参数:
+        cases: 用例名列表, None为全部
+        quick: 每个用例只跑最小规模且只重复一次
+        memory: 计时后再在tracemalloc下运行一次, 记录内存峰值(不影响计时结果)
+        memory_budget_mb: 内存峰值预算, 超过时该用例记为失败
+
+    返回:
+        结果列表 [{'case', 'size', 'best', 'mean', 'repeats', 'peak_mb', 'over_budget'}]
+    """
+    from memory_profile import MemoryBudgetExceeded
+    rows = []
+    for name, (sizes, setup) in BENCHMARKS.items():
+        if cases and name not in cases:
+            continue
+        for size in (sizes[:1] if quick else sizes):
+            func = quiet(setup(size))
+            best, mean = time_case(func, 1 if quick else repeat)
+            row = {'case': name, 'size': size, 'best': best, 'mean': mean, 'repeats': 1 if quick else repeat,
+                   'peak_mb': None, 'over_budget': False}
+            line = f"{name:<45}{size:>8}{best * 1000:>12.2f} ms"
+            if memory or memory_budget_mb:
+                try:
+                    row['peak_mb'] = measure_memory(func, f"{name}[{size}]", memory_budget_mb)['peak_mb']
+                except MemoryBudgetExceeded as e:
+                    from memory_profile import memory_profiler
+                    row['over_budget'] = True
+                    row['peak_mb'] = memory_profiler.stages[-1]['peak_mb']
+                    print(e)
+                line += f"{row['peak_mb']:>12.1f} MB" + (' 超出预算' if row['over_budget'] else '')
+            rows.append(row)
+            print(line)
+    return rows
+
+
+def compare(store, base, head, threshold=0.2):
+    """
+    比较两个提交的结果, 耗时比值超过1+threshold的标记为回退
+
+    返回:
+        (对比表, 是否存在回退)
+    """
+    base_results = store.latest(base)
+    head_results = store.latest(head)
+    table = base_results[['best']].join(head_results[['best']], lsuffix='_base', rsuffix='_head', how='inner')
+    table['ratio'] = table['best_head'] / table['best_base']
+    table['regression'] = table['ratio'] > 1 + threshold
+    return table, bool(table['regression'].any())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    parser.add_argument('--db', default=None, help='结果数据库路径')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='运行基准测试并保存结果')
+    run_parser.add_argument('--case', action='append', help='只运行指定用例, 可重复')
+    run_parser.add_argument('--quick', action='store_true', help='只跑最小规模')
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--skip-parity', action='store_true', help='不运行数值一致性检查')
+    run_parser.add_argument('--memory', action='store_true', help='同时记录每个用例的内存峰值')
+    run_parser.add_argument('--memory-budget', type=float, default=None,
+                            help='内存峰值预算(MB), 超过时失败; 缺省取[Profiling] memory_budget_mb')
+
+    subparsers.add_parser('parity', help='只运行数值一致性检查')
+
+    compare_parser = subparsers.add_parser('compare', help='比较两个提交的结果')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head', nargs='?', default=None, help='缺省为当前提交')
+    compare_parser.add_argument('--threshold', type=float, default=None, help='回退阈值, 如0.2表示慢20%%')
+
+    subparsers.add_parser('list', help='列出已保存结果的提交')
+
+    args = parser.parse_args(argv)
+    store = BenchmarkStore(args.db)
+    if args.command == 'run':
+        commit, dirty = current_commit()
+        config = ConfigParser()
+        config.read('config.ini')
+        budget = args.memory_budget if args.memory_budget is not None else \
+            config.getfloat('Profiling', 'memory_budget_mb', fallback=0)
+        memory = args.memory or args.memory_budget is not None
+        rows = run_benchmarks(args.case, args.quick, args.repeat, memory, budget if memory else 0)
+        store.save(commit, dirty, rows)
+        print(f"已保存{len(rows)}条结果到提交{commit}{' (有未提交修改)' if dirty else ''}")
+        over_budget = [row for row in rows if row['over_budget']]
+        if over_budget:
+            print(f"{len(over_budget)}个用例超出内存预算{budget}MB")
+            return 1
+        if args.skip_parity:
+            return 0
+        args.command = 'parity'
+    if args.command == 'parity':
+        from parity import run_parity
+        return 1 if run_parity(max_symbols=5 if getattr(args, 'quick', False) else None) else 0
+    if args.command == 'compare':
+        config = ConfigParser()
+        config.read('config.ini')
+        threshold = args.threshold if args.threshold is not None else \
+            config.getfloat('Benchmark', 'regression_threshold', fallback=0.2)
+        head = args.head or current_commit()[0]
+        table, regressed = compare(store, args.base, head, threshold)
+        print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+        if regressed:
+            print(f"性能回退: {int(table['regression'].sum())}项超过阈值{threshold:.0%}")
+            return 1
+        return 0
+    print(store.commits().to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
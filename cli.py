@@ -0,0 +1,430 @@
+import os
+import sys
+import math
+import time
+import argparse
+from configparser import ConfigParser
+
+
+# 无界面的批处理命令行: python main.py <子命令> 或 python cli.py <子命令>
+# 只导入标准库、pandas和分析模块, 不导入Qt, 可在服务器上直接运行夜间任务.
+#
+#   update    增量下载(并发), 只更新超过refresh_days未更新的股票
+#   screen    稳定性和收益指标筛选
+#   forecast  批量DTW预测
+#   backtest  包络线/滚动预测单股票回测, 或TopN组合回测
+#   bench     性能基准测试
+#   pipeline  夜间流水线: 下载→周线→包络线→筛选/预测/回测, 只重算输入有变化的股票(见pipeline.py)
+#
+# 输出文件格式按扩展名: .csv / .json / .parquet(需要pyarrow), 不指定时打印到终端.
+
+_worker_objects = {}
+
+
+def worker_object(name, factory):
+    """进程池子进程中按名称缓存的对象(分析引擎、结果库等), 每个进程只构造一次"""
+    if name not in _worker_objects:
+        _worker_objects[name] = factory()
+    return _worker_objects[name]
+
+
+def load_weekly(code):
+    """
+    子进程中缓存的周线数据(含量比), CSV文件更新后自动重新读取
+
+    没有数据时抛出ValueError
+    """
+    from data_manager import StockDataManager
+    data_mgr = worker_object('data_mgr', StockDataManager)
+    path = os.path.join(data_mgr.storage_path, f"{code}_weekly.csv")
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cache = worker_object('weekly', dict)
+    if code not in cache or cache[code][0] != mtime:
+        df = data_mgr.get_stock_weekly_data(code)
+        if df is None or df.empty:
+            raise ValueError(f"无法获取股票{code}的数据")
+        cache[code] = (mtime, data_mgr.calculate_volume_ratio(df))
+    return cache[code][1]
+
+
+def read_config():
+    config = ConfigParser()
+    config.read('config.ini')
+    return config
+
+
+def list_codes(config, stock_list, market=None):
+    """
+    --list参数对应的代码列表
+
+    可以是StockLists中的键(如 'HK' 或 'HK_自选', 也可只写'自选'并用--market指定市场), 或逗号分隔的代码
+    """
+    if 'StockLists' in config:
+        for key in (f"{market}_{stock_list}" if market else None, stock_list):
+            if key and key in config['StockLists']:
+                return [code.strip() for code in config['StockLists'][key].split(',') if code.strip()]
+    return [code.strip() for code in stock_list.split(',') if code.strip()]
+
+
+def resolve_universe(data_mgr, config, market=None, stock_list=None, stored_only=True):
+    """
+    确定处理范围, 返回[(code, market)]
+
+    没有--list时为已存储的股票(可按--market过滤); 有--list时, 已存储的股票使用元数据库中的市场,
+    未存储的股票使用--market (stored_only为True时跳过)
+    """
+    stored = {stock['code']: stock['market'] for stock in data_mgr.get_all_stocks()}
+    if stock_list is None:
+        return [(code, m) for code, m in stored.items() if market is None or m == market]
+    universe = []
+    for code in list_codes(config, stock_list, market):
+        if code in stored:
+            if market is None or stored[code] == market:
+                universe.append((code, stored[code]))
+        elif not stored_only and market is not None:
+            universe.append((code, market))
+        else:
+            print(f"跳过未导入的股票{code}")
+    return universe
+
+
+def write_table(table, path=None):
+    """按扩展名写出结果表, path为空时打印"""
+    if path is None:
+        print(table.to_string() if not table.empty else '(无结果)')
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        table.to_csv(path)
+    elif ext == '.json':
+        table.reset_index().to_json(path, orient='records', date_format='iso', force_ascii=False, indent=2)
+    elif ext == '.parquet':
+        try:
+            table.to_parquet(path)
+        except ImportError as e:
+            raise ValueError(f"写入Parquet需要安装pyarrow或fastparquet: {e}")
+    else:
+        raise ValueError(f"不支持的输出格式: {ext or path} (可用.csv/.json/.parquet)")
+    print(f"已写入{len(table)}行到{path}")
+
+
+def jsonable(value):
+    """numpy/pandas值转换为JSON可表示的值, NaN/inf转换为null"""
+    if isinstance(value, dict):
+        return {str(k): jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if hasattr(value, 'tolist'):        # numpy数组和标量
+        return jsonable(value.tolist())
+    if hasattr(value, 'isoformat'):     # Timestamp/datetime
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def run_tasks(func, tasks, workers, threads=False):
+    """
+    并发执行func(task), 按完成顺序产生(task, 结果, 错误信息)
+
+    workers为1时在当前进程顺序执行; 计算密集的任务用进程池, 等待网络的任务用线程池(threads=True)
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                yield task, func(task), ''
+            except Exception as e:
+                yield task, None, str(e) or type(e).__name__
+        return
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+    executor_class = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor_class(max_workers=workers) as executor:
+        futures = {executor.submit(func, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), ''
+            except Exception as e:
+                yield futures[future], None, str(e) or type(e).__name__
+
+
+def default_workers(config, args):
+    return args.workers or config.getint('Analysis', 'analysis_workers', fallback=0) or os.cpu_count() or 1
+
+
+# ---------------------------------------------------------------- update
+
+def cmd_update(args, config):
+    import pandas as pd
+    from data_manager import StockDataManager
+    data_mgr = StockDataManager()
+    universe = resolve_universe(data_mgr, config, args.market, args.list, stored_only=False)
+    if not args.force:
+        universe = [(code, market) for code, market in universe if data_mgr.needs_update(code)]
+    workers = args.workers or config.getint('Data', 'download_workers', fallback=4)
+    print(f"需要更新{len(universe)}只股票")
+
+    rows = []
+    started = time.perf_counter()
+    fetch = lambda task: data_mgr.fetch_symbol(task[0], task[1])
+    for (code, market), record, error in run_tasks(fetch, universe, workers, threads=True):
+        # 元数据库在主线程写入
+        if record is not None:
+            data_mgr.record_download(record)
+        status = 'failed' if error else ('ok' if record is not None else 'empty')
+        rows.append({'code': code, 'market': market, 'status': status,
+                     'end_date': record[3] if record else None, 'message': error})
+        print(f"[{len(rows)}/{len(universe)}] {code} {status} {error}")
+    elapsed = time.perf_counter() - started
+    if rows:
+        print(f"用时{elapsed:.1f}秒, {len(rows) * 60 / max(elapsed, 1e-9):.1f}只/分钟")
+    write_table(pd.DataFrame(rows, columns=['code', 'market', 'status', 'end_date', 'message']).set_index('code'),
+                args.output)
+    return 1 if any(row['status'] == 'failed' for row in rows) else 0
+
+
+# ---------------------------------------------------------------- screen
+
+def symbol_metrics(code):
+    """子进程任务: 一只股票最近lookback周的筛选指标(年化收益、成长性、包络线仓位), 与StockScreener相同口径"""
+    from screener import StockScreener
+    screener = worker_object('screener', StockScreener)
+    close = load_weekly(code)['Close'].dropna()
+    return screener.compute_metrics({code: close}).iloc[0].to_dict()
+
+
+def cmd_screen(args, config):
+    from data_manager import StockDataManager
+    from screener import StockScreener
+    data_mgr = StockDataManager()
+    screener = StockScreener(data_mgr)
+    if args.workers:
+        screener.workers = args.workers
+    codes = [code for code, _ in resolve_universe(data_mgr, config, args.market, args.list)]
+    table = screener.screen(stock_list=codes, sort_by=args.sort_by, ascending=args.ascending)
+    if args.top:
+        table = table.head(args.top)
+    write_table(table, args.output)
+    return 0
+
+
+# ---------------------------------------------------------------- forecast
+
+def forecast_symbol(task, refresh=False):
+    """
+    子进程任务: 一只股票在analysis_date的DTW预测, 结果与趋势预测页共用ResultStore缓存
+
+    refresh: 不读取缓存, 重新计算并覆盖(流水线判断输入已变化时使用)
+    """
+    code, market, analysis_date = task
+    from analysis_engine import AnalysisEngine
+    from result_store import ResultStore, data_version
+    engine = worker_object('engine', AnalysisEngine)
+    store = worker_object('store', ResultStore)
+    df = load_weekly(code).iloc[-1000:]
+    # 键与analysis_worker.ForecastExecutor相同
+    params = dict(engine.get_params(), market=market, first_date=df.index[0], analysis_date=analysis_date)
+    version = data_version(df)
+    result = None if refresh else store.get(code, version, 'trend_analysis', params)
+    cached = result is not None
+    if not cached:
+        result = engine.find_patterns_and_forecast(df['Close'], market=market, volume=df['Volume'],
+                                                   volume_ratio=df['Volume_Ratio'], analysis_date=analysis_date)
+        store.put(code, version, 'trend_analysis', params, result)
+    return {
+        'analysis_date': result.before_prices.index[-1],
+        'last_close': float(result.before_prices.iloc[-1]),
+        'forecast_close': float(result.forecast_prices[-1]),
+        'expected_return': float(result.expected_return),
+        'matches': len(result.best_matches),
+        'cached': cached,
+    }
+
+
+def cmd_forecast(args, config):
+    import pandas as pd
+    from data_manager import StockDataManager
+    universe = resolve_universe(StockDataManager(), config, args.market, args.list)
+    tasks = [(code, market, args.date) for code, market in universe]
+    rows = []
+    for (code, market, _), row, error in run_tasks(forecast_symbol, tasks, default_workers(config, args)):
+        rows.append(dict(row or {}, code=code, market=market, error=error))
+        print(f"[{len(rows)}/{len(tasks)}] {code} {error or 'ok'}")
+    table = pd.DataFrame(rows).set_index('code') if rows else pd.DataFrame()
+    if not table.empty and 'expected_return' in table:
+        table = table.sort_values('expected_return', ascending=False, na_position='last')
+    write_table(table, args.output)
+    return 1 if any(row['error'] for row in rows) else 0
+
+
+# ---------------------------------------------------------------- backtest
+
+BACKTEST_COLUMNS = ['final_value', 'cumulative_returns', 'annualized_returns', 'buy_hold_cumulative_returns',
+                    'max_drawdown', 'sharpe_ratio', 'num_trades', 'win_rate']
+
+
+def backtest_symbol(task, refresh=False):
+    """
+    子进程任务: 一只股票的包络线或滚动预测回测, 返回汇总指标
+
+    refresh: 不读取包络线回测的结果缓存, 重新计算并覆盖
+    """
+    strategy, code, market, start_date, end_date, capital = task
+    from result_store import ResultStore
+    store = worker_object('store', ResultStore)
+    if strategy == 'envelope':
+        from envelope_strategy import EnvelopeStrategy
+        results = worker_object('envelope', EnvelopeStrategy).backtest_strategy_cached(
+            code, market, capital, start_date, end_date, store=store, refresh=refresh)
+    else:
+        from forecast_backtest import ForecastBackTest
+        results = worker_object('forecast', ForecastBackTest).backtest(
+            code, market, start_date, end_date, initial_capital=capital)
+    return {column: results[column] for column in BACKTEST_COLUMNS if column in results}
+
+
+def cmd_backtest(args, config):
+    import pandas as pd
+    from data_manager import StockDataManager
+    data_mgr = StockDataManager()
+    universe = resolve_universe(data_mgr, config, args.market, args.list)
+    if args.strategy == 'topn':
+        return backtest_topn(args, data_mgr, [code for code, _ in universe])
+
+    tasks = [(args.strategy, code, market, args.start, args.end, args.capital) for code, market in universe]
+    rows = []
+    for task, row, error in run_tasks(backtest_symbol, tasks, default_workers(config, args)):
+        rows.append(dict(row or {}, code=task[1], market=task[2], error=error))
+        print(f"[{len(rows)}/{len(tasks)}] {task[1]} {error or 'ok'}")
+    table = pd.DataFrame(rows).set_index('code') if rows else pd.DataFrame()
+    if not table.empty and 'annualized_returns' in table:
+        table = table.sort_values('annualized_returns', ascending=False, na_position='last')
+    write_table(table, args.output)
+    return 1 if any(row['error'] for row in rows) else 0
+
+
+def backtest_topn(args, data_mgr, codes):
+    """TopN组合回测, 输出一行汇总指标和最后一次调仓的持仓"""
+    import pandas as pd
+    import portfolio_backtest
+    score_fn = {
+        'momentum': portfolio_backtest.momentum_scores,
+        'envelope': portfolio_backtest.envelope_position_scores,
+        'growth': portfolio_backtest.growth_scores,
+        'dtw': portfolio_backtest.dtw_forecast_scores,
+    }[args.score]
+    backtest = portfolio_backtest.TopNBackTest(score_fn, topn=args.topn, initial_capital=args.capital)
+    panel = data_mgr.get_weekly_close_panel(codes, workers=args.workers or 8)
+    if panel.empty:
+        print("没有可用的股票数据")
+        return 1
+    results = backtest.run(panel, args.start, args.end)
+    last_date, last_holdings = results['holdings'][-1]
+    row = {column: results[column] for column in
+           ['final_value', 'cumulative_returns', 'annualized_returns', 'max_drawdown', 'sharpe_ratio',
+            'benchmark_cumulative_returns']}
+    row.update({'score': args.score, 'symbols': panel.shape[1], 'rebalances': len(results['rebalance_dates']),
+                'mean_turnover': float(results['turnover'].mean()),
+                'last_rebalance': last_date, 'holdings': ','.join(last_holdings)})
+    write_table(pd.DataFrame([row], index=pd.Index(['topn'], name='strategy')), args.output)
+    return 0
+
+
+# ---------------------------------------------------------------- bench
+
+def cmd_bench(args, config):
+    import pandas as pd
+    from benchmark import BenchmarkStore, current_commit, run_benchmarks
+    rows = run_benchmarks(args.case, args.quick, args.repeat)
+    commit, dirty = current_commit()
+    BenchmarkStore().save(commit, dirty, rows)
+    write_table(pd.DataFrame(rows).set_index('case') if rows else pd.DataFrame(), args.output)
+    return 0
+
+
+# ---------------------------------------------------------------- pipeline
+
+def cmd_pipeline(args, config):
+    import pandas as pd
+    from data_manager import StockDataManager
+    from pipeline import Pipeline
+    universe = resolve_universe(StockDataManager(), config, args.market, args.list, stored_only=False)
+    pipeline = Pipeline(workers=default_workers(config, args),
+                        download_workers=config.getint('Data', 'download_workers', fallback=4), config=config)
+    stages = [stage.name for stage in pipeline.plan(args.stage, args.skip or ())]
+    counts = pipeline.run(universe, args.stage, args.force or (), args.skip or ())
+    codes = [code for code, _ in universe]
+    for name in ('forecast', 'backtest'):
+        if name in stages:
+            write_table(pipeline.export(name, codes), os.path.join(pipeline.output_dir, f"{name}.csv"))
+    summary = pd.DataFrame([dict(counts[name], stage=name) for name in stages],
+                           columns=['stage', 'computed', 'skipped', 'failed', 'blocked']).set_index('stage')
+    write_table(summary.fillna(0).astype(int), args.output)
+    return 1 if summary[['failed', 'blocked']].fillna(0).to_numpy().any() else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='股票分析批处理命令行(不需要图形界面)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--workers', type=int, default=None, help='并发数, 缺省取配置或CPU核数')
+    common.add_argument('--market', default=None, help='市场, 如A-SH/HK/US')
+    common.add_argument('--list', default=None, help='StockLists中的键或逗号分隔的代码, 缺省为全部已导入股票')
+    common.add_argument('-o', '--output', default=None, help='输出文件(.csv/.json/.parquet), 缺省打印')
+
+    update_parser = subparsers.add_parser('update', parents=[common], help='增量下载股票数据')
+    update_parser.add_argument('--force', action='store_true', help='忽略refresh_days, 全部重新下载')
+    update_parser.set_defaults(func=cmd_update)
+
+    screen_parser = subparsers.add_parser('screen', parents=[common], help='稳定性和收益指标筛选')
+    screen_parser.add_argument('--sort-by', default=None, help='排序列, 缺省为默认年数的年化收益')
+    screen_parser.add_argument('--ascending', action='store_true')
+    screen_parser.add_argument('--top', type=int, default=None, help='只输出前N只')
+    screen_parser.set_defaults(func=cmd_screen)
+
+    forecast_parser = subparsers.add_parser('forecast', parents=[common], help='批量DTW预测')
+    forecast_parser.add_argument('--date', default=None, help='分析日期, 缺省为最新K线')
+    forecast_parser.set_defaults(func=cmd_forecast)
+
+    backtest_parser = subparsers.add_parser('backtest', parents=[common], help='回测')
+    backtest_parser.add_argument('--strategy', choices=['envelope', 'forecast', 'topn'], default='envelope')
+    backtest_parser.add_argument('--score', choices=['momentum', 'envelope', 'growth', 'dtw'], default='momentum',
+                                 help='TopN组合回测的打分方法')
+    backtest_parser.add_argument('--topn', type=int, default=None)
+    backtest_parser.add_argument('--start', default=None, help='回测开始日期')
+    backtest_parser.add_argument('--end', default=None, help='回测结束日期')
+    backtest_parser.add_argument('--capital', type=float, default=100000)
+    backtest_parser.set_defaults(func=cmd_backtest)
+
+    bench_parser = subparsers.add_parser('bench', help='运行性能基准测试并保存结果')
+    bench_parser.add_argument('--case', action='append', help='只运行指定用例, 可重复')
+    bench_parser.add_argument('--quick', action='store_true', help='只跑最小规模')
+    bench_parser.add_argument('--repeat', type=int, default=3)
+    bench_parser.add_argument('-o', '--output', default=None, help='输出文件(.csv/.json/.parquet), 缺省打印')
+    bench_parser.set_defaults(func=cmd_bench)
+
+    pipeline_parser = subparsers.add_parser('pipeline', parents=[common], help='夜间增量流水线')
+    pipeline_parser.add_argument('--stage', action='append', default=None,
+                                 help='只运行到指定阶段(含其上游), 可重复; 缺省为全部')
+    pipeline_parser.add_argument('--force', action='append', default=None, help='强制重算的阶段, 可重复')
+    pipeline_parser.add_argument('--skip', action='append', default=None,
+                                 help='本次不运行的阶段(如离线时跳过update), 沿用已有结果, 可重复')
+    pipeline_parser.set_defaults(func=cmd_pipeline)
+    return parser
+
+
+COMMANDS = ('update', 'screen', 'forecast', 'backtest', 'bench', 'pipeline')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args, read_config())
+    except ValueError as e:
+        print(f"错误: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from configparser import ConfigParser
+
+from envelope_strategy import EnvelopeStrategy
+from feature_analysis import align_series
+from forecast_backtest import ForecastBackTest
+from backtest_kernel import simulate_positions_batch, performance_metrics, win_rate
+
+
+# 组合规则: rule(regime, envelope, forecast, regime_min) -> 目标仓位
+# regime: 大盘指数包络线仓位, envelope: 个股包络线仓位, forecast: 个股价格预测方向(1=看涨, 0=看跌)
+# 三者为同形状的数组(单只股票的K线序列或股票数×K线数矩阵), 缺失信号为NaN
+COMBINE_RULES = {
+    'envelope': lambda regime, envelope, forecast, regime_min: envelope,
+    'forecast': lambda regime, envelope, forecast, regime_min: forecast,
+    'regime_envelope': lambda regime, envelope, forecast, regime_min: envelope * (regime >= regime_min),
+    'regime_forecast': lambda regime, envelope, forecast, regime_min: forecast * (regime >= regime_min),
+    'envelope_forecast': lambda regime, envelope, forecast, regime_min: envelope * forecast,
+    'regime_envelope_forecast': lambda regime, envelope, forecast, regime_min:
+        envelope * forecast * (regime >= regime_min),
+}
+
+# 规则需要的个股信号
+RULE_SIGNALS = {
+    'envelope': ('envelope',),
+    'forecast': ('forecast',),
+    'regime_envelope': ('regime', 'envelope'),
+    'regime_forecast': ('regime', 'forecast'),
+    'envelope_forecast': ('envelope', 'forecast'),
+    'regime_envelope_forecast': ('regime', 'envelope', 'forecast'),
+}
+
+
+class CombinedStrategy:
+    """
+    价格预测+行情预测组合策略 (framework.txt中的组合模式)
+
+    大盘指数的包络线仓位作为行情状态, 每个市场只计算一次并由该市场所有股票共享;
+    个股包络线仓位和DTW预测方向按组合规则合成目标仓位, 再批量回测:
+    所有股票的包络线窗口拼成一个矩阵计算, 仓位按最后一根K线右对齐成(股票数×K线数)矩阵,
+    组合规则和交易模拟对全部股票一次完成.
+    """
+    def __init__(self, rule=None, regime_min=None, forecast_threshold=None, window_size=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.rule = rule or self.config.get('Combined', 'rule', fallback='regime_envelope')
+        if self.rule not in COMBINE_RULES:
+            raise ValueError(f"未知的组合规则: {self.rule}")
+        self.regime_min = regime_min if regime_min is not None else \
+            self.config.getfloat('Combined', 'regime_min', fallback=0.3)
+        self.forecast_threshold = forecast_threshold if forecast_threshold is not None else \
+            self.config.getfloat('Combined', 'forecast_threshold', fallback=0.0)
+        self.window_size = window_size or self.config.getint('Combined', 'window_size', fallback=260)
+
+        self.strategy = EnvelopeStrategy()
+        self.analyzer = self.strategy.analyzer
+        self.data_manager = self.strategy.data_manager
+        self.forecaster = None
+        self.regimes = {}
+
+    def envelope_positions(self, prices):
+        """
+        逐K线的包络线仓位: 每根K线用截至该K线的最近window_size周计算包络线极值点, 按get_position定仓
+
+        返回:
+            与prices等长的仓位数组, 历史不足window_size的K线为NaN
+        """
+        return self.envelope_positions_batch([prices])[0]
+
+    def envelope_positions_batch(self, price_list, starts=None):
+        """
+        多只股票的逐K线包络线仓位, 所有股票的窗口拼成一个矩阵批量计算包络线和极值点
+
+        参数:
+            price_list: 各股票的收盘价序列
+            starts: 各股票从第几根K线开始计算(之前为NaN), 默认从头计算
+
+        返回:
+            与price_list对应的仓位数组列表, 历史不足window_size的K线为NaN
+        """
+        price_list = [np.asarray(prices, dtype=float) for prices in price_list]
+        results = [np.full(len(prices), np.nan) for prices in price_list]
+        windows, owners = [], []
+        for k, prices in enumerate(price_list):
+            first = max(starts[k] if starts is not None else 0, self.window_size - 1)
+            if first >= len(prices):
+                continue
+            # 第j个窗口以第first+j根K线结尾
+            windows.append(sliding_window_view(prices, self.window_size)[first - self.window_size + 1:])
+            owners.append((k, first))
+        if not windows:
+            return results
+        envelopes = self.analyzer.extract_hilbert_envelope_batch(np.concatenate(windows))
+        extrema, extrema2 = self.analyzer.find_extrema_batch_multi(
+            envelopes, [self.analyzer.low_rate, self.analyzer.low_rate2])
+        row = 0
+        for (k, first), stock_windows in zip(owners, windows):
+            for j in range(len(stock_windows)):
+                results[k][first + j], _ = self.strategy.get_position(extrema[row], extrema2[row])
+                row += 1
+        return results
+
+    def load_regimes(self):
+        """读取各市场大盘指数(与AnalysisEngine.load_broad_market_indices相同)"""
+        if self.forecaster is None:
+            self.forecaster = ForecastBackTest()
+        engine = self.forecaster.engine
+        if not engine.broad_indices:
+            engine.load_broad_market_indices()
+        return engine.broad_indices
+
+    def regime_series(self, market):
+        """市场行情状态序列(指数包络线仓位), 每个市场只计算一次"""
+        if market not in self.regimes:
+            index_close = self.load_regimes().get(market)
+            if index_close is None or index_close.empty:
+                print(f"市场{market}没有大盘指数数据, 不使用行情过滤")
+                self.regimes[market] = None
+            else:
+                self.regimes[market] = pd.Series(self.envelope_positions(index_close.values), index=index_close.index)
+        return self.regimes[market]
+
+    def forecast_signals(self, stock_code, market, df, start_date, end_date):
+        """DTW预测方向(1=看涨, 0=看跌, NaN=无信号), 预测结果使用ForecastBackTest的磁盘缓存"""
+        if self.forecaster is None:
+            self.forecaster = ForecastBackTest()
+        forecasts = self.forecaster.walk_forward(stock_code, market, start_date, end_date, df=df)
+        if forecasts.empty:
+            return np.full(len(df), np.nan)
+        expected = forecasts['forecast_last'] / forecasts['close'] - 1
+        signal = pd.Series(np.where(expected > self.forecast_threshold, 1.0,
+                                    np.where(expected < -self.forecast_threshold, 0.0, np.nan)),
+                           index=forecasts.index)
+        return signal.reindex(df.index).ffill().values
+
+    def backtest(self, stock_codes, start_date=None, end_date=None, initial_capital=100000):
+        """
+        对一组股票运行组合策略回测
+
+        返回:
+            DataFrame, 每只股票一行: market, final_value, cumulative_returns, annualized_returns,
+            max_drawdown, sharpe_ratio, num_trades, win_rate, buy_hold_cumulative_returns
+        """
+        stocks = []
+        for stock_code in stock_codes:
+            df = self.data_manager.get_stock_weekly_data(stock_code)
+            if df is None or df.empty:
+                print(f"无法获取股票{stock_code}的数据")
+                continue
+            df = self.data_manager.calculate_volume_ratio(df)
+            market = self.data_manager.get_stock_market(stock_code)
+            stock_start = start_date or df.index[-min(260, len(df) - 1)]
+            stock_end = pd.Timestamp(end_date or df.index[-1])
+            df = df[df.index <= stock_end]
+            first = int(df.index.searchsorted(pd.Timestamp(stock_start)))
+            if len(df) - first < 2:
+                continue
+            stocks.append((stock_code, market, df, first, stock_start, stock_end))
+        if not stocks:
+            return pd.DataFrame()
+
+        # 各信号只取回测区间, 缺省为1(不参与组合)
+        needed = RULE_SIGNALS[self.rule]
+        ranges = [df.index[first:] for _, _, df, first, _, _ in stocks]
+        regime = [np.ones(len(index)) for index in ranges]
+        envelope = [np.ones(len(index)) for index in ranges]
+        forecast = [np.ones(len(index)) for index in ranges]
+        if 'regime' in needed:
+            for k, (_, market, _, _, _, _) in enumerate(stocks):
+                regime_series = self.regime_series(market)
+                if regime_series is not None:
+                    regime[k] = regime_series.reindex(ranges[k], method='ffill').values
+        if 'envelope' in needed:
+            positions = self.envelope_positions_batch([df['Close'].values for _, _, df, _, _, _ in stocks],
+                                                      [first for _, _, _, first, _, _ in stocks])
+            envelope = [p[first:] for p, (_, _, _, first, _, _) in zip(positions, stocks)]
+        if 'forecast' in needed:
+            # DTW预测逐只进行(结果有磁盘缓存)
+            for k, (stock_code, market, df, first, stock_start, stock_end) in enumerate(stocks):
+                forecast[k] = self.forecast_signals(stock_code, market, df, stock_start, stock_end)[first:]
+
+        # 按最后一根K线右对齐, 组合规则和交易模拟对所有股票一次完成
+        prices, mask = align_series([df['Close'].values[first:] for _, _, df, first, _, _ in stocks])
+        with np.errstate(invalid='ignore'):
+            positions = COMBINE_RULES[self.rule](align_series(regime, prices.shape[1])[0],
+                                                 align_series(envelope, prices.shape[1])[0],
+                                                 align_series(forecast, prices.shape[1])[0],
+                                                 self.regime_min).astype(float)
+        positions = np.where(mask, np.nan_to_num(positions, nan=0.0), 0.0)
+        simulation = simulate_positions_batch(prices, positions, initial_capital)
+
+        rows = []
+        for k, (stock_code, market, _, _, _, _) in enumerate(stocks):
+            portfolio_value = simulation['portfolio_value'][k][mask[k]]
+            stock_prices = prices[k][mask[k]]
+            trades = simulation['trades'][k]
+            row = {
+                'code': stock_code,
+                'market': market,
+                'final_value': portfolio_value[-1],
+                'num_trades': len(trades),
+                'win_rate': win_rate(trades),
+                'buy_hold_cumulative_returns': stock_prices[-1] / stock_prices[0] - 1,
+            }
+            row.update(performance_metrics(portfolio_value))
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('code')
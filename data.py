@@ -8,6 +8,8 @@ import numpy as np
 import pandas as pd
 import csv
 
+from instrumentation import span
+
 class StockMetaDB:
     def __init__(self, storage_path: str, db_name: str):
         # 初始化存储路径
@@ -265,7 +267,8 @@ class StockDataMgr:
             file = f"{base_path}/{code}_weekly.csv"
         if not os.path.exists(file):
             return None
-        return pd.read_csv(file, index_col=0, parse_dates=True)
+        with span('read_csv'):
+            return pd.read_csv(file, index_col=0, parse_dates=True)
 
     def get_symbols(self, codes, market, data_type = "day"):
         '''获取指定股票的日线数据'''
@@ -281,7 +284,8 @@ class StockDataMgr:
                 file = f"{base_path}/{code}_weekly.csv"  
             if not os.path.exists(file):
                 continue
-            result[(code,market,data_type)] = pd.read_csv(file, index_col=0, parse_dates=True)
+            with span('read_csv'):
+                result[(code,market,data_type)] = pd.read_csv(file, index_col=0, parse_dates=True)
         return result
 
     def get_instrument_symbols(self, instrument, market, data_type = "day"):
@@ -1,12 +1,13 @@
 import os
 import sqlite3
-import yfinance as yf
 from configparser import ConfigParser
 from datetime import datetime
 from typing import List, Tuple
 import numpy as np
 import pandas as pd
 
+from instrumentation import span
+
 
 class StockDataManager:
     def __init__(self):
@@ -46,7 +47,8 @@ class StockDataManager:
             'DP': ''
         }.get(market, '')
 
-    def resample_weekly(self, data):
+    @staticmethod
+    def resample_weekly(data):
         """将日线数据重采样为周线数据"""
         return data.resample('W-FRI').agg({
             'Open': 'first',
@@ -56,8 +58,9 @@ class StockDataManager:
             'Volume': 'sum',
         }).dropna()
 
-    def calculate_volume_ratio(self, data, window_size=5):
-        
+    @staticmethod
+    def calculate_volume_ratio(data, window_size=5):
+        """量比: 成交量除以前window_size根K线的平均成交量, 写入Volume_Ratio列"""
         mean_previous_volume = data['Volume'].rolling(window=window_size, min_periods=1).mean().shift(1)
         data['Volume_Ratio'] = data['Volume'] / mean_previous_volume
               
@@ -76,6 +79,7 @@ class StockDataManager:
                 end_date = end.strftime('%Y-%m-%d')
                 
                 # 下载日线和周线数据
+                import yfinance as yf  # 只在下载时导入, 减少启动时间
                 data = yf.download(symbol, start=start, end=end, interval='1D', auto_adjust=True)
                 if data.empty:
                     print(f"No data available for {symbol}")
@@ -134,6 +138,7 @@ class StockDataManager:
             end_date = end.strftime('%Y-%m-%d')
 
             # 下载日线数据           
+            import yfinance as yf
             datas = yf.download(symbols, group_by="ticker", start=start, end=end, interval='1D', auto_adjust=True)
             #infos = yf.Tickers(symbols).tickers    
             if datas.empty:
@@ -175,6 +180,44 @@ class StockDataManager:
         self.db_conn.commit()
         return success_codes
 
+    def fetch_symbol(self, code, market, start_date=None):
+        '''
+        下载一只股票的日线数据, 写入日线和周线CSV
+
+        不访问元数据库(sqlite连接只能在创建它的线程使用), 可以在工作线程中并发调用,
+        返回的记录交给record_download写入元数据库.
+
+        返回:
+            (code, market, start_date, end_date, last_updated, data_path), 没有数据时返回None
+        '''
+        if start_date is None:
+            start_date = self.config.get('Data', 'start_date')
+        symbol = code + self._get_symbol_suffix(market)
+        end = datetime.now()
+
+        import yfinance as yf
+        # yf.download共用全局结果表, 不能多线程同时调用; 每个任务使用独立的Ticker
+        data = yf.Ticker(symbol).history(start=start_date, end=end, interval='1d', auto_adjust=True)
+        if data.empty:
+            print(f"No data available for {symbol}")
+            return None
+        data.index = data.index.tz_localize(None)
+        daily_data = data[['Open', 'High', 'Low', 'Close', 'Volume']].dropna().drop_duplicates()
+        weekly_data = self.resample_weekly(daily_data)
+
+        base_path = os.path.join(self.storage_path, code)
+        daily_data.to_csv(f"{base_path}_daily.csv")
+        weekly_data.to_csv(f"{base_path}_weekly.csv")
+        return (code, market, start_date, end.strftime('%Y-%m-%d'), datetime.now().isoformat(), base_path)
+
+    def record_download(self, record):
+        '''把fetch_symbol返回的记录写入元数据库'''
+        self.db_conn.execute('''
+            INSERT OR REPLACE INTO stocks_info
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', record)
+        self.db_conn.commit()
+
     def needs_update(self, code: str) -> bool:
         '''检查数据是否需要更新'''
         cursor = self.db_conn.cursor()
@@ -222,14 +265,18 @@ class StockDataManager:
         cursor = self.db_conn.cursor()
         cursor.execute('SELECT * FROM stocks_info')
         rows = cursor.fetchall()
-        return [{
-            'code': row[0],
-            'market': row[1],
-            'start_date': row[2],
-            'end_date': row[3],
-            'last_updated': row[4],
-            'data_path': row[5]
-        } for row in rows]
+        # 除基本字段外, 表中如有名称、行业等扩展列(见StockScreener.META_COLUMNS)也一并返回
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def get_stock_info(self, code: str):
+        '''获取一只股票的信息(与get_all_stocks的行相同), 不存在时返回None'''
+        cursor = self.db_conn.cursor()
+        cursor.execute('SELECT * FROM stocks_info WHERE code = ?', (code,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([description[0] for description in cursor.description], row))
 
     def get_stock_data(self, code: str):
         '''获取指定股票的日线数据'''
@@ -238,7 +285,8 @@ class StockDataManager:
         if not os.path.exists(daily_file):
             return None
 
-        return pd.read_csv(daily_file, index_col=0, parse_dates=True)
+        with span('read_csv'):
+            return pd.read_csv(daily_file, index_col=0, parse_dates=True)
 
     def get_stock_weekly_data(self, code: str):
         '''获取指定股票的周线数据'''
@@ -246,8 +294,24 @@ class StockDataManager:
         weekly_file = f"{base_path}_weekly.csv"
         if not os.path.exists(weekly_file):
             return None
-        return pd.read_csv(weekly_file, index_col=0, parse_dates=True)
+        with span('read_csv'):
+            return pd.read_csv(weekly_file, index_col=0, parse_dates=True)
     
+    def get_weekly_close_panel(self, codes, workers=8):
+        """
+        读取多只股票的周线收盘价并按日期对齐
+
+        返回:
+            DataFrame (日期×股票代码), 缺失为NaN; 没有数据的代码不出现在列中
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(self.get_stock_weekly_data, codes))
+        closes = {code: df['Close'] for code, df in zip(codes, frames) if df is not None and not df.empty}
+        if not closes:
+            return pd.DataFrame()
+        return pd.DataFrame(closes).sort_index()
+
     def get_index_weekly_data(self, symbol):
         """获取指数周线数据"""
         df =  self.get_stock_weekly_data(symbol)
@@ -7,6 +7,8 @@ from typing import List, Tuple
 import numpy as np
 import pandas as pd
 
+from instrumentation import span
+
 
 class StockDataManager:
     def __init__(self):
@@ -273,7 +275,8 @@ class StockDataManager:
         if not os.path.exists(daily_file):
             return None
 
-        return pd.read_csv(daily_file, index_col=0, parse_dates=True)
+        with span('read_csv'):
+            return pd.read_csv(daily_file, index_col=0, parse_dates=True)
 
     def get_stock_weekly_data(self, code: str):
         '''获取指定股票的周线数据'''
@@ -281,7 +284,8 @@ class StockDataManager:
         weekly_file = f"{base_path}_weekly.csv"
         if not os.path.exists(weekly_file):
             return None
-        return pd.read_csv(weekly_file, index_col=0, parse_dates=True)
+        with span('read_csv'):
+            return pd.read_csv(weekly_file, index_col=0, parse_dates=True)
     
     def get_index_weekly_data(self, symbol):
         """获取指数周线数据"""
@@ -2,12 +2,9 @@ import numpy as np
 import pandas as pd
 from feature_analysis import FeatureAnalyzer
 from data_manager import StockDataManager
-import matplotlib.pyplot as plt
-
-# 设置全局字体为支持中文的字体
-plt.rcParams['font.family'] = ['Songti SC', 'Heiti TC', 'sans-serif']
-plt.rcParams['font.size'] = 8  # 字体大小
-plt.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+from results import BacktestResult
+from instrumentation import timed
+from memory_profile import memory_stage
 
 class EnvelopeStrategy:
     """
@@ -88,7 +85,8 @@ class EnvelopeStrategy:
         
         return 0.0, "未知情况"
     
-    def generate_signals(self, stock_code, market='A-SH', start_date=None, end_date=None, df=None):
+    @timed('generate_signals')
+    def generate_signals(self, stock_code, market='A-SH', start_date=None, end_date=None, df=None, keep_history=True):
         """
         生成买卖信号
         
@@ -97,6 +95,7 @@ class EnvelopeStrategy:
             market: 市场代码，默认'A-SH'（上海证券交易所）
             start_date: 开始日期
             end_date: 结束日期
+            keep_history: 为False时只保留最后一个时间点的包络线和极值点, 避免保存每个时间点的整条包络线
             
         返回:
             signals: 包含买卖信号的DataFrame
@@ -151,11 +150,16 @@ class EnvelopeStrategy:
             current_extreme_data2 = self.analyzer.find_extrema_in_envelope(current_envelope, low_rate=self.analyzer.low_rate2)
             
             # 保存历史数据
-            envelope_history.append(current_envelope)
-            extreme_data_history.append({
+            extreme_data_entry = {
                 'extreme_data': current_extreme_data,
                 'extreme_data2': current_extreme_data2
-            })
+            }
+            if keep_history or not envelope_history:
+                envelope_history.append(current_envelope)
+                extreme_data_history.append(extreme_data_entry)
+            else:
+                envelope_history[-1] = current_envelope
+                extreme_data_history[-1] = extreme_data_entry
             
             # 每个时间点都判断仓位
             position, signal_type = self.get_position(current_extreme_data, current_extreme_data2)
@@ -183,6 +187,7 @@ class EnvelopeStrategy:
         # 返回信号、包络线历史和极值点历史
         return signals_df, envelope_history, extreme_data_history
     
+    @timed('backtest_strategy')
     def backtest_strategy(self, stock_code, market='A-SH', initial_capital=100000, start_date=None, end_date=None):
         """
         包络线趋势跟踪策略的回测函数
@@ -217,7 +222,10 @@ class EnvelopeStrategy:
         df = df[df.index <= end_date]
 
         # 获取买卖信号
-        signals_df, envelope_history, extreme_data_history = self.generate_signals(stock_code, market, start_date, end_date, df)
+        # 回测只用到最后一个时间点的包络线和极值点
+        with memory_stage('generate_signals'):
+            signals_df, envelope_history, extreme_data_history = self.generate_signals(
+                stock_code, market, start_date, end_date, df, keep_history=False)
         
         # 应用日期过滤        
         backtest_df = df[(df.index >= start_date) & (df.index <= end_date)]
@@ -334,36 +342,62 @@ class EnvelopeStrategy:
             last_extreme_data = {'peaks': [], 'valleys': []}
             last_extreme_data2 = {'peaks': [], 'valleys': []}
         
-        # 整理回测结果
-        backtest_results = {
-            'stock_code': stock_code,
-            'market': market,
-            'initial_capital': initial_capital,
-            'final_value': portfolio_value[-1],
-            'cumulative_returns': cumulative_returns,
-            'annualized_returns': annualized_returns,
-            'buy_hold_cumulative_returns': buy_hold_cumulative_returns,
-            'buy_hold_annualized_returns': buy_hold_annualized_returns,
-            'max_drawdown': max_drawdown,
-            'sharpe_ratio': sharpe_ratio,
-            'num_trades': num_trades,
-            'win_rate': win_rate,
-            'portfolio_value': portfolio_value,
-            'position_history': position_history,
-            'trades': pd.DataFrame(trades),
-            'signals': signals_df,
-            'envelope': last_envelope,
-            'extreme_data': last_extreme_data,
-            'extreme_data2': last_extreme_data2,
-            'dates': df.index,
-            'prices': df['Close'].values,
-            'backtest_df': backtest_df,
-            'backtest_dates': backtest_df.index,
-            'backtest_prices': backtest_df['Close'].values,
-        }
+        # 整理回测结果: 价格、日期和回测区间均为df的视图, 不再复制
+        backtest_results = BacktestResult(
+            stock_code=stock_code,
+            market=market,
+            initial_capital=initial_capital,
+            final_value=portfolio_value[-1],
+            cumulative_returns=cumulative_returns,
+            annualized_returns=annualized_returns,
+            buy_hold_cumulative_returns=buy_hold_cumulative_returns,
+            buy_hold_annualized_returns=buy_hold_annualized_returns,
+            max_drawdown=max_drawdown,
+            sharpe_ratio=sharpe_ratio,
+            num_trades=num_trades,
+            win_rate=win_rate,
+            portfolio_value=portfolio_value,
+            position_history=np.asarray(position_history),
+            trades=pd.DataFrame(trades),
+            signals=signals_df,
+            envelope=last_envelope,
+            extreme_data=last_extreme_data,
+            extreme_data2=last_extreme_data2,
+            df=df,
+            start=int(df.index.searchsorted(backtest_df.index[0])) if len(backtest_df) > 0 else len(df),
+        )
         
         return backtest_results
     
+    def backtest_strategy_cached(self, stock_code, market='A-SH', initial_capital=100000, start_date=None,
+                                 end_date=None, store=None, refresh=False):
+        """
+        带持久化缓存的backtest_strategy: 相同股票数据和参数的回测结果直接从ResultStore读取
+
+        refresh为True时不读取缓存, 重新计算并覆盖
+        """
+        from result_store import ResultStore, data_version
+        store = store or ResultStore()
+        df = self.data_manager.get_stock_weekly_data(stock_code)
+        if df is None or df.empty:
+            raise ValueError(f"无法获取股票{stock_code}的数据")
+        params = {
+            'market': market,
+            'initial_capital': initial_capital,
+            'start_date': start_date,
+            'end_date': end_date,
+            'filter_order': self.analyzer.filter_order,
+            'cutoff_freq': self.analyzer.cutoff_freq,
+            'low_rate': self.analyzer.low_rate,
+            'low_rate2': self.analyzer.low_rate2,
+        }
+        compute = lambda: self.backtest_strategy(stock_code, market, initial_capital, start_date, end_date)
+        if refresh:
+            results = compute()
+            store.put(stock_code, data_version(df), 'envelope_backtest', params, results)
+            return results
+        return store.get_or_compute(stock_code, data_version(df), 'envelope_backtest', params, compute)
+
     def plot_backtest_results(self, backtest_results, figsize=(15, 10)):
         """
         绘制回测结果图表
@@ -372,21 +406,30 @@ class EnvelopeStrategy:
             backtest_results: 回测结果字典
             figsize: 图表大小
         """
+        # 绘图时才导入matplotlib, 命令行和服务进程不需要
+        import matplotlib.pyplot as plt
+        from lod import plot_lod
+
+        # 设置全局字体为支持中文的字体
+        plt.rcParams['font.family'] = ['Songti SC', 'Heiti TC', 'sans-serif']
+        plt.rcParams['font.size'] = 8  # 字体大小
+        plt.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+
         fig, axes = plt.subplots(6, 1, figsize=figsize)
         
         # 子图1：价格和包络线
+        # 长序列按坐标轴像素宽度降采样绘制, 极值点和交易点所在位置保留原始数据
         ax1 = axes[0]
-
-        ax1.plot(backtest_results['dates'], backtest_results['prices'], label='价格', color='blue')
+        plot_lod(ax1, backtest_results['dates'], backtest_results['prices'], label='价格', color='blue')
         ax1.set_title(f"{backtest_results['stock_code']} - 价格线")
         ax1.legend()
         
         ax2 = axes[1]
-        ax2.plot(backtest_results['dates'], backtest_results['envelope'], label='包络线', color='orange', alpha=0.7)
-        
         # 标记极值点
         peaks = backtest_results['extreme_data']['peaks']
         valleys = backtest_results['extreme_data']['valleys']
+        plot_lod(ax2, backtest_results['dates'], backtest_results['envelope'], keep=np.r_[peaks, valleys],
+                 label='包络线', color='orange', alpha=0.7)
         
         if len(peaks) > 0:
             ax2.scatter(backtest_results['dates'][peaks], backtest_results['prices'][peaks], 
@@ -398,11 +441,11 @@ class EnvelopeStrategy:
         ax2.legend()
 
         ax3 = axes[2]
-        ax3.plot(backtest_results['dates'], backtest_results['envelope'], label='包络线', color='orange', alpha=0.7)
-        
         # 标记极值点
         peaks2 = backtest_results['extreme_data2']['peaks']
         valleys2 = backtest_results['extreme_data2']['valleys']
+        plot_lod(ax3, backtest_results['dates'], backtest_results['envelope'], keep=np.r_[peaks2, valleys2],
+                 label='包络线', color='orange', alpha=0.7)
         
         if len(peaks2) > 0:
             ax3.scatter(backtest_results['dates'][peaks2], backtest_results['prices'][peaks2], 
@@ -415,7 +458,7 @@ class EnvelopeStrategy:
 
         ax4 = axes[3]
 
-        ax4.plot(backtest_results['backtest_dates'], backtest_results['backtest_prices'], label='价格', color='blue')
+        plot_lod(ax4, backtest_results['backtest_dates'], backtest_results['backtest_prices'], label='价格', color='blue')
         ax4.set_title(f"{backtest_results['stock_code']} - 价格线")
         ax4.legend()
         
@@ -423,7 +466,7 @@ class EnvelopeStrategy:
         
         # 子图2：仓位变化
         ax5 = axes[4]
-        ax5.plot(backtest_results['backtest_dates'], backtest_results['position_history'], label='仓位', color='purple')
+        plot_lod(ax5, backtest_results['backtest_dates'], backtest_results['position_history'], label='仓位', color='purple')
         ax5.set_ylabel('仓位比例')
         ax5.set_ylim(-0.1, 1.1)
         ax5.set_title("仓位变化")
@@ -431,14 +474,16 @@ class EnvelopeStrategy:
         
         # 子图3：组合价值
         ax6 = axes[5]
-        ax6.plot(backtest_results['backtest_dates'], backtest_results['portfolio_value'], label='策略组合价值', color='green')
+        trades = backtest_results['trades']
+        trade_index = pd.DatetimeIndex(backtest_results['backtest_dates']).get_indexer(trades['date']) if not trades.empty else []
+        plot_lod(ax6, backtest_results['backtest_dates'], backtest_results['portfolio_value'],
+                 keep=[i for i in trade_index if i >= 0], label='策略组合价值', color='green')
         
         # 计算买入并持有策略的价值
         buy_hold_value = backtest_results['initial_capital'] * (backtest_results['backtest_prices'] / backtest_results['backtest_prices'][0])
-        ax6.plot(backtest_results['backtest_dates'], buy_hold_value, label='买入持有价值', color='gray', alpha=0.7)
+        plot_lod(ax6, backtest_results['backtest_dates'], buy_hold_value, label='买入持有价值', color='gray', alpha=0.7)
         
         # 标记买卖点
-        trades = backtest_results['trades']
         if not trades.empty:
             buy_trades = trades[trades['action'] == '买入']
             sell_trades = trades[trades['action'] == '卖出']
@@ -0,0 +1,348 @@
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.collections import PolyCollection
+from matplotlib.ticker import FuncFormatter
+from PyQt5.QtCore import QObject, QTimer
+
+from instrumentation import span
+from lod import set_lod_data
+
+
+# 复用线条的快速重绘: 坐标轴和线条每页只创建一次, 翻页时用set_data更新.
+# 数据线条、标题和图例注册为animated, 坐标范围不变时只恢复背景并重绘这些对象(blit), 否则整图重绘;
+# 新数据仍能放进当前坐标范围时保持范围不变, 翻页时大多不需要整图重绘. 连续按键只在事件队列空闲时重绘一次.
+
+COLOR_PALETTE = ['red', 'green', 'purple', 'orange', 'cyan']
+
+
+class RedrawScheduler(QObject):
+    """合并短时间内的多次重绘请求, 事件循环空闲时只调用一次callback"""
+    def __init__(self, callback, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self):
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        self.callback()
+
+
+class BlitCanvas:
+    """
+    一个画布的增量重绘
+
+    会变化的对象(线条、标题、图例)用add注册为animated, 整图重绘时不画进背景;
+    之后每次更新比较各坐标轴的范围, 不变时恢复背景并只画注册的对象, 变化时整图重绘并重新截取背景.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.figure = canvas.figure
+        self.artists = []
+        self.background = None
+        self.state = None
+        self.full_draws = 0
+        self.blits = 0
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add(self, artist):
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def remove(self, artist):
+        if artist in self.artists:
+            self.artists.remove(artist)
+        artist.remove()
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            if artist.get_visible():
+                self.figure.draw_artist(artist)
+
+    def _layout_state(self):
+        state = []
+        for ax in self.figure.axes:
+            state.append((ax.get_xlim(), ax.get_ylim()))
+        return state
+
+    def update(self):
+        """数据已用set_data更新后调用"""
+        state = self._layout_state()
+        if self.background is None or state != self.state:
+            self.state = state
+            self.full_draws += 1
+            with span('chart_full_draw'):
+                self.canvas.draw()
+            return
+        self.blits += 1
+        with span('chart_blit'):
+            self.canvas.restore_region(self.background)
+            self._draw_artists()
+            self.canvas.blit(self.figure.bbox)
+
+
+# 保持坐标范围时数据至少要占范围的比例, 低于该比例时重新计算, 避免数据被压扁
+KEEP_FILL = 0.5
+
+
+def fits(limits, low, high):
+    """数据区间[low, high]在limits内且占其KEEP_FILL以上"""
+    lim_low, lim_high = sorted(limits)
+    return lim_low <= low and high <= lim_high and high - low >= KEEP_FILL * (lim_high - lim_low)
+
+
+def autoscale(ax, scalex=True, scaley=True, keep=False):
+    """
+    按当前线条数据重新计算坐标范围
+
+    keep: 数据仍能放进当前范围(见fits)时保持不变, 翻页时避免整图重绘; 否则按新数据重新计算
+    """
+    ax.relim(visible_only=True)
+    if not keep:
+        ax.autoscale_view(scalex=scalex, scaley=scaley)
+        return
+    data = ax.dataLim
+    if not np.isfinite(data.bounds).all():
+        return
+    ax.autoscale_view(scalex=scalex and not fits(ax.get_xlim(), *data.intervalx),
+                      scaley=scaley and not fits(ax.get_ylim(), *data.intervaly))
+
+
+def set_legend(canvas, ax, handles, labels, **kwargs):
+    """图例条目数不变时只替换文字, 否则重建并注册为animated"""
+    legend = ax.get_legend()
+    if legend is not None and len(legend.get_texts()) == len(labels):
+        for text, label in zip(legend.get_texts(), labels):
+            text.set_text(label)
+        return legend
+    if legend is not None:
+        canvas.remove(legend)
+    return canvas.add(ax.legend(handles, labels, **kwargs))
+
+
+def set_line(line, x, y, keep=None):
+    """更新线条数据, 长序列按坐标轴像素宽度降采样, keep中的索引(如极值点)保留原始数据"""
+    set_lod_data(line, x, y, keep)
+    line.set_visible(len(y) > 0)
+
+
+def set_markers(collection, x, y):
+    """更新散点位置, x为日期时先转换为matplotlib日期数值"""
+    x = mdates.date2num(x) if len(x) > 0 and not np.issubdtype(np.asarray(x).dtype, np.number) else x
+    collection.set_offsets(np.column_stack([x, y]) if len(x) > 0 else np.empty((0, 2)))
+
+
+def bar_verts(x, heights, width):
+    """柱状图各柱的矩形顶点, x为日期时先转换为matplotlib日期数值"""
+    x = mdates.date2num(x) if not np.issubdtype(np.asarray(x).dtype, np.number) else np.asarray(x, dtype=float)
+    heights = np.nan_to_num(np.asarray(heights, dtype=float))
+    left, right = x - width / 2, x + width / 2
+    zeros = np.zeros_like(heights)
+    return np.stack([np.column_stack([left, zeros]), np.column_stack([left, heights]),
+                     np.column_stack([right, heights]), np.column_stack([right, zeros])], axis=1)
+
+
+def set_bars(bars, x, heights, width):
+    """更新柱状图(单个PolyCollection, 比逐个Rectangle绘制快得多)"""
+    bars.set_verts(bar_verts(x, heights, width))
+
+
+class ForecastCharts:
+    """
+    趋势预测页的三张图, 线条只创建一次
+
+    绘制内容与AnalysisEngine.plot_patterns_and_forecast相同; 同一批分析日期内新数据仍能放进
+    当前坐标范围时保持不变, 开始新一批分析时调用reset.
+    """
+    def __init__(self, canvases, engine):
+        self.canvases = [BlitCanvas(canvas) for canvas in canvases]
+        self.engine = engine
+        self.axes = None
+        self.fresh = True
+
+    def reset(self):
+        self.fresh = True
+
+    def _build(self):
+        figs = [c.figure for c in self.canvases]
+        for fig in figs:
+            fig.clear()
+        self.axes = [fig.add_subplot(111) for fig in figs]
+        ax0, ax1, ax2 = self.axes
+        c0, c1, c2 = self.canvases
+        window_size = self.engine.window_size
+        topn = self.engine.topn
+
+        self.history_line = c0.add(ax0.plot([], [], color='black', label="Stock Price History")[0])
+        self.match_lines = [c0.add(ax0.plot([], [], color=COLOR_PALETTE[i % len(COLOR_PALETTE)])[0])
+                            for i in range(topn)]
+        ax0.xaxis_date()
+        ax0.set_xlabel('Date', fontsize=8)
+        ax0.set_ylabel('Price', fontsize=8)
+        ax0.tick_params(axis='both', which='major', labelsize=8)
+        c0.add(ax0.title)
+
+        self.pattern_lines = [c1.add(ax1.plot([], [], color=COLOR_PALETTE[i % len(COLOR_PALETTE)],
+                                              linewidth=3 if i == 0 else 1, label=f"Pattern {i + 1}")[0])
+                              for i in range(topn)]
+        self.current_line = c1.add(ax1.plot([], [], color='black', linewidth=3, label="Current Pattern")[0])
+        self.median_line = c1.add(ax1.plot([], [], color='black', linestyle='dashed', label="Median Projected Path")[0])
+        ax1.set_title(f"Similar {window_size}-Day Patterns and Forecast", fontsize=10)
+        ax1.set_xlabel("Days", fontsize=8)
+        ax1.set_ylabel("Reindexed Price", fontsize=8)
+        ax1.tick_params(axis='both', which='major', labelsize=8)
+
+        self.current_price_line = c2.add(ax2.plot([], [], color='black', linewidth=3, label="Current Price")[0])
+        self.forecast_line = c2.add(ax2.plot([], [], color='black', linestyle='dashed', label="Forecast Price")[0])
+        self.real_line = c2.add(ax2.plot([], [], color='red', linestyle='dashed', label="Real Price")[0])
+        ax2.set_title(f"Similar {window_size}-Day Patterns and Forecast Price", fontsize=10)
+        ax2.set_xlabel("Days", fontsize=8)
+        ax2.set_ylabel("Reindexed Price", fontsize=8)
+        ax2.tick_params(axis='both', which='major', labelsize=8)
+        ax2.legend(fontsize=8)
+
+    def show(self, analysis_date, close_prices, best_matches, forecast_returns, forecast_prices, real_prices):
+        if self.axes is None:
+            self._build()
+        data = self.engine.forecast_plot_data(close_prices, best_matches, forecast_returns, forecast_prices,
+                                              real_prices)
+        ax0, ax1, ax2 = self.axes
+        keep = not self.fresh
+        self.fresh = False
+
+        set_line(self.history_line, close_prices.index, close_prices.values)
+        handles = [self.history_line]
+        for i, line in enumerate(self.match_lines):
+            if i < len(data['matches']):
+                label, historical_data, normalized_pattern = data['matches'][i]
+                set_line(line, historical_data.index, historical_data.values)
+                set_line(self.pattern_lines[i], np.arange(len(normalized_pattern)), normalized_pattern.values)
+                line.set_label(label)
+                handles.append(line)
+            else:
+                set_line(line, [], [])
+                set_line(self.pattern_lines[i], [], [])
+        ax0.set_title(f"Price Patterns to {analysis_date}" if analysis_date is not None
+                      else "Price Patterns to Current Date", fontsize=10)
+        # 图例文字每个日期都变化, 固定位置避免loc='best'每次遍历全部数据点
+        set_legend(self.canvases[0], ax0, handles, [line.get_label() for line in handles], fontsize=8,
+                   loc='upper left')
+        autoscale(ax0, keep=keep)
+
+        set_line(self.current_line, np.arange(len(data['current'])), data['current'].values)
+        set_line(self.median_line, np.arange(len(data['median'])), data['median'])
+        autoscale(ax1, keep=keep)
+
+        set_line(self.current_price_line, *data['current_prices'])
+        set_line(self.forecast_line, *data['forecast_prices'])
+        set_line(self.real_line, *data['real_prices'])
+        autoscale(ax2, keep=keep)
+
+        for canvas in self.canvases:
+            canvas.update()
+
+
+class EnvelopeCharts:
+    """
+    包络线分析页的三张图: 收盘价+量比, 两组包络线和极值点
+
+    横轴使用窗口内的K线序号, 窗口长度不变时横轴范围固定, 日期只通过刻度标签显示(x轴注册为animated,
+    每次随数据重绘); 按周滑动窗口时纵轴范围能容纳新数据就保持不变, 只需blit.
+    """
+    def __init__(self, canvases):
+        self.canvases = [BlitCanvas(canvas) for canvas in canvases]
+        self.axes = None
+        self.dates = None
+
+    def _format_date(self, x, pos=None):
+        i = int(round(x))
+        if self.dates is None or not 0 <= i < len(self.dates):
+            return ''
+        return self.dates[i].strftime('%Y-%m-%d')
+
+    def _build(self):
+        figs = [c.figure for c in self.canvases]
+        for fig in figs:
+            fig.clear()
+        self.axes = [fig.add_subplot(111) for fig in figs]
+        ax1_price = self.axes[0]
+        self.ax1_volume = ax1_price.twinx()
+        c1 = self.canvases[0]
+
+        self.price_line = c1.add(ax1_price.plot([], [], 'b-', label='收盘价', linewidth=1.5)[0])
+        ax1_price.set_ylabel('价格', color='b', fontsize=8)
+        ax1_price.tick_params(axis='y', labelcolor='b', labelsize=7)
+        ax1_price.tick_params(axis='both', which='major', labelsize=7)
+        # 日期标签倾斜显示
+        ax1_price.tick_params(axis='x', labelrotation=45)
+        self.bars = c1.add(self.ax1_volume.add_collection(
+            PolyCollection([], facecolors='orange', alpha=0.3, label='量比')))
+        self.ax1_volume.set_ylabel('量比', color='orange', fontsize=8)
+        self.ax1_volume.tick_params(axis='y', labelcolor='orange', labelsize=7)
+        c1.add(ax1_price.title)
+        ax1_price.legend([self.price_line, self.bars], ['收盘价', '量比'], fontsize=7, loc='upper left')
+
+        self.envelope_lines, self.peak_markers, self.valley_markers = [], [], []
+        for canvas, ax in zip(self.canvases[1:], self.axes[1:]):
+            self.envelope_lines.append(canvas.add(ax.plot([], [], 'g--', label='包络线')[0]))
+            self.peak_markers.append(canvas.add(ax.scatter([], [], marker='^', color='b')))
+            self.valley_markers.append(canvas.add(ax.scatter([], [], marker='v', color='r')))
+            ax.tick_params(axis='both', which='major', labelsize=8)
+            ax.legend(fontsize=8)
+            canvas.add(ax.title)
+
+        # twinx与价格图共用x轴, 只需处理三个主坐标轴
+        for canvas, ax in zip(self.canvases, self.axes):
+            ax.xaxis.set_major_formatter(FuncFormatter(self._format_date))
+            canvas.add(ax.xaxis)
+
+    def show(self, window_df, volume_ratio, return_labels, stability_sets):
+        """
+        参数:
+            return_labels: 第一张图标题中的年化收益率和量比标签
+            stability_sets: [(stability_data, envelope)] 对应第二、三张图
+        """
+        if self.axes is None:
+            self._build()
+        ax1_price = self.axes[0]
+        self.dates = window_df.index
+        x = np.arange(len(window_df))
+        for ax in self.axes:
+            if ax.get_xlim() != (-0.5, len(x) - 0.5):
+                ax.set_xlim(-0.5, len(x) - 0.5)
+
+        set_line(self.price_line, x, window_df['Close'].values)
+        autoscale(ax1_price, scalex=False, keep=True)
+        set_bars(self.bars, x, volume_ratio, width=0.7)
+        # 量比序列开头可能为NaN, 用nanmax确定Y轴范围
+        max_volume_ratio = np.nanmax(volume_ratio) if np.isfinite(volume_ratio).any() else 1.0
+        if not fits(self.ax1_volume.get_ylim(), 0, max_volume_ratio) or self.ax1_volume.get_ylim()[0] != 0:
+            self.ax1_volume.set_ylim(0, max_volume_ratio * 1.2)
+        ax1_price.set_title(f'年化收益率: {return_labels}', fontsize=10)
+
+        for i, (stability_data, envelope) in enumerate(stability_sets):
+            ax = self.axes[i + 1]
+            stability_labels = [f'{y}年: {r*100:.1f}' for y, r in stability_data['growth_scores']]
+            stability_labels.extend([f'extrema: {stability_data["last_extrema_value"]:.1f}',
+                                     f'value: {stability_data["lastvalue"]:.1f}',
+                                     f'change: {stability_data["lastchange"]:.1f}%'])
+            peaks, valleys = stability_data['peaks'], stability_data['valleys']
+            set_line(self.envelope_lines[i], x, envelope, keep=np.r_[peaks, valleys])
+            set_markers(self.peak_markers[i], x[peaks], envelope[peaks])
+            set_markers(self.valley_markers[i], x[valleys], envelope[valleys])
+            ax.set_title(f'成长性得分: {stability_labels}', fontsize=10)
+            autoscale(ax, scalex=False, keep=True)
+
+        for canvas in self.canvases:
+            canvas.update()
@@ -1,6 +1,125 @@
 import numpy as np
-from scipy.signal import find_peaks, hilbert, butter, filtfilt
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import find_peaks, hilbert, butter, filtfilt, sosfilt, sosfilt_zi
 from configparser import ConfigParser
+from results import GrowthScoreResult
+from instrumentation import span, timed
+
+
+@lru_cache(maxsize=32)
+def butter_coefficients(order, cutoff):
+    """按(order, cutoff)缓存巴特沃斯低通滤波器系数, 返回只读的(b, a)"""
+    b, a = butter(order, cutoff, btype='low')
+    b.setflags(write=False)
+    a.setflags(write=False)
+    return b, a
+
+
+@lru_cache(maxsize=32)
+def butter_sos(order, cutoff):
+    """按(order, cutoff)缓存二阶节(SOS)形式的巴特沃斯低通滤波器, 用于因果滤波 (sosfilt要求数组可写, 调用方不得修改)"""
+    return butter(order, cutoff, btype='low', output='sos')
+
+
+def align_series(series_list, length=None):
+    """
+    将不等长的一维序列右对齐(按最后一根K线对齐)拼成二维矩阵
+
+    参数:
+        series_list: 一维序列列表
+        length: 矩阵列数, 默认取最长序列的长度; 更长的序列只保留最后length个值
+
+    返回:
+        matrix: (序列数×length) 的float矩阵, 无数据位置为NaN
+        mask: 同形状布尔矩阵, True表示有效数据
+    """
+    arrays = [np.asarray(s, dtype=float)[-length:] if length else np.asarray(s, dtype=float)
+              for s in series_list]
+    if length is None:
+        length = max((len(a) for a in arrays), default=0)
+    matrix = np.full((len(arrays), length), np.nan)
+    mask = np.zeros((len(arrays), length), dtype=bool)
+    for i, a in enumerate(arrays):
+        if len(a) > 0:
+            matrix[i, length - len(a):] = a
+            mask[i, length - len(a):] = True
+    return matrix, mask
+
+
+class StreamingExtremaDetector:
+    """
+    find_extrema_in_envelope的流式版本
+
+    逐点输入包络线值, 波峰在回落幅度超过 峰值*low_rate 时确认, 波谷在反弹幅度超过
+    谷值*low_rate/(1-low_rate) 时确认, 与find_extrema_in_envelope的突出度阈值一致.
+    波峰波谷交替输出; 与前一个同类极值点的距离小于distance的确认点被丢弃.
+    """
+    def __init__(self, low_rate, distance=4):
+        self.low_rate = low_rate
+        self.distance = distance
+        self.index = -1
+        self.trend = 0          # 1: 寻找波峰, -1: 寻找波谷, 0: 尚未确定方向
+        self.max_idx = self.min_idx = -1
+        self.max_value = -np.inf
+        self.min_value = np.inf
+        self.last_peak = None
+        self.last_valley = None
+
+    def _peak_confirmed(self, value):
+        return self.max_value - value > self.max_value * self.low_rate
+
+    def _valley_confirmed(self, value):
+        return value - self.min_value > self.min_value * self.low_rate / (1 - self.low_rate)
+
+    def _emit(self, kind, index, value):
+        last = self.last_peak if kind == 'peak' else self.last_valley
+        if kind == 'peak':
+            self.last_peak = index
+        else:
+            self.last_valley = index
+        if last is not None and index - last < self.distance:
+            return []
+        return [(kind, index, value)]
+
+    def update(self, value):
+        """
+        输入下一个包络线值
+
+        返回:
+            本次新确认的极值点列表 [(类型'peak'/'valley', 索引, 包络线值), ...]
+        """
+        self.index += 1
+        events = []
+        if value > self.max_value:
+            self.max_idx, self.max_value = self.index, value
+        if value < self.min_value:
+            self.min_idx, self.min_value = self.index, value
+
+        if self.trend >= 0 and self.max_idx < self.index and self._peak_confirmed(value):
+            if self.trend == 1 or self.max_idx > self.min_idx:
+                events += self._emit('peak', self.max_idx, self.max_value)
+                self.trend = -1
+                self.min_idx, self.min_value = self.index, value
+        elif self.trend <= 0 and self.min_idx < self.index and self._valley_confirmed(value):
+            if self.trend == -1 or self.min_idx > self.max_idx:
+                events += self._emit('valley', self.min_idx, self.min_value)
+                self.trend = 1
+                self.max_idx, self.max_value = self.index, value
+        return events
+
+    def update_many(self, values):
+        events = []
+        for value in values:
+            events += self.update(value)
+        return events
+
+    def get_state(self):
+        return {k: (float(v) if isinstance(v, (float, np.floating)) else v) for k, v in self.__dict__.items()}
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
 
 class FeatureAnalyzer:
     def __init__(self):
@@ -14,14 +133,94 @@ class FeatureAnalyzer:
 
     def extract_hilbert_envelope(self, price_data: np.ndarray):
         """使用希尔伯特变换提取包络线"""
-        # 设计低通滤波器
-        b, a = butter(self.filter_order, self.cutoff_freq, btype='low')
+        # 低通滤波器系数按(order, cutoff)缓存
+        b, a = butter_coefficients(self.filter_order, self.cutoff_freq)
         
         # 零相位滤波
-        envelope = filtfilt(b, a, price_data)
+        with span('filtfilt'):
+            envelope = filtfilt(b, a, price_data)
+
+        return envelope
 
+    def extract_causal_envelope(self, price_data):
+        """
+        因果(实时)包络线: 只用当前及以前的数据, 追加新K线不会改变历史值, 但有相位滞后
+
+        price_data可以是一维序列或二维矩阵(沿最后一维滤波)
+        """
+        data = np.asarray(price_data, dtype=float)
+        sos = butter_sos(self.filter_order, self.cutoff_freq)
+        # 以首个价格作为稳态初值, 避免启动瞬态
+        first = data[..., 0]
+        zi = sosfilt_zi(sos)
+        zi = zi.reshape((zi.shape[0],) + (1,) * first.ndim + (2,)) * first[None, ..., None]
+        envelope, _ = sosfilt(sos, data, axis=-1, zi=zi)
         return envelope
 
+    def create_extrema_detector(self, low_rate=None, distance=4):
+        """创建与find_extrema_in_envelope参数一致的流式极值点检测器"""
+        if low_rate is None:
+            low_rate = self.low_rate
+        return StreamingExtremaDetector(low_rate, distance=distance)
+
+    def extract_hilbert_envelope_batch(self, price_matrix, mask=None):
+        """
+        批量提取包络线
+
+        参数:
+            price_matrix: 二维数组 (股票×时间 或 窗口×时间)
+            mask: 同形状布尔数组, True为有效数据, 默认取非NaN位置; 每行的有效数据必须连续
+
+        返回:
+            envelopes: 与price_matrix同形状的包络线矩阵, 无效位置(或有效长度不足以滤波的行)为NaN
+        """
+        data = np.asarray(price_matrix, dtype=float)
+        if data.ndim != 2:
+            raise ValueError("price_matrix必须是二维数组")
+        if mask is None:
+            mask = ~np.isnan(data)
+        else:
+            mask = np.asarray(mask, dtype=bool)
+            if mask.shape != data.shape:
+                raise ValueError("mask与price_matrix的形状不一致")
+
+        # 每行有效区间[start, end)
+        counts = mask.sum(axis=1)
+        starts = np.argmax(mask, axis=1)
+        ends = starts + counts
+        cols = np.arange(data.shape[1])
+        contiguous = (cols >= starts[:, None]) & (cols < ends[:, None])
+        if not np.array_equal(contiguous, mask):
+            raise ValueError("每行的有效数据必须连续")
+
+        b, a = butter_coefficients(self.filter_order, self.cutoff_freq)
+        padlen = 3 * max(len(a), len(b))
+        envelopes = np.full(data.shape, np.nan)
+
+        # 有效区间相同的行合并为一次filtfilt调用
+        spans = np.stack([starts, ends], axis=1)
+        valid_rows = counts > padlen
+        if not np.any(valid_rows):
+            return envelopes
+        unique_spans, group_ids = np.unique(spans[valid_rows], axis=0, return_inverse=True)
+        row_ids = np.flatnonzero(valid_rows)
+        for g, (start, end) in enumerate(unique_spans):
+            rows = row_ids[group_ids.ravel() == g]
+            with span('filtfilt_batch'):
+                envelopes[rows, start:end] = filtfilt(b, a, data[rows, start:end], axis=1)
+        return envelopes
+
+    def extract_window_envelopes(self, price_data, window_size, step=1):
+        """
+        一次性计算单只股票所有滑动窗口的包络线
+
+        返回:
+            envelopes: (窗口数×window_size), 第i行对应起始索引i*step的窗口
+        """
+        windows = sliding_window_view(np.asarray(price_data, dtype=float), window_size)[::step]
+        return self.extract_hilbert_envelope_batch(windows)
+
+    @timed('find_peaks')
     def find_extrema_in_envelope(self, envelope, distance=4, low_rate=None):
         if low_rate is None:
             low_rate = self.low_rate
@@ -50,6 +249,53 @@ class FeatureAnalyzer:
             
         }
 
+    @timed('find_peaks_multi')
+    def find_extrema_multi(self, envelope, low_rates, distance=4):
+        """
+        同一条包络线按多个阈值寻找波峰和波谷
+
+        find_peaks的候选点与阈值无关, 只计算一次, 再分别按各阈值过滤;
+        结果与对每个阈值调用find_extrema_in_envelope相同
+        """
+        peaks, properties = find_peaks(envelope, prominence=0.01, distance=distance)
+        peak_prominences = properties["prominences"]
+        valleys, properties = find_peaks(- envelope + np.max(envelope) + np.min(envelope),
+                                         prominence=0.01, distance=distance)
+        valley_prominences = properties["prominences"]
+        return [{
+            'peaks': peaks[peak_prominences > (envelope[peaks] * low_rate)],
+            'valleys': valleys[valley_prominences > (envelope[valleys] * low_rate/(1-low_rate))],
+        } for low_rate in low_rates]
+
+    def find_extrema_batch_multi(self, envelopes, low_rates, distance=4):
+        """
+        对包络线矩阵逐行按多个阈值寻找波峰和波谷
+
+        返回:
+            每个阈值一个列表, 列表中每行一个 {'peaks', 'valleys'}, 索引相对于该行有效数据(非NaN)的起点
+        """
+        envelopes = np.asarray(envelopes, dtype=float)
+        results = [[] for _ in low_rates]
+        empty = {'peaks': np.zeros(0, dtype=int), 'valleys': np.zeros(0, dtype=int)}
+        for row in envelopes:
+            envelope = row[~np.isnan(row)]
+            row_extrema = self.find_extrema_multi(envelope, low_rates, distance) if len(envelope) > 0 \
+                else [empty] * len(low_rates)
+            for result, extrema in zip(results, row_extrema):
+                result.append(extrema)
+        return results
+
+    def find_extrema_batch(self, envelopes, distance=4, low_rate=None):
+        """
+        对包络线矩阵逐行寻找波峰和波谷
+
+        返回:
+            每行一个 {'peaks', 'valleys'}, 索引相对于该行有效数据(非NaN)的起点
+        """
+        if low_rate is None:
+            low_rate = self.low_rate
+        return self.find_extrema_batch_multi(envelopes, [low_rate], distance)[0]
+
     def calculate_growth_score(self, envelope, peaks, valleys):
         #计算成长性分数
         envelope_len = len(envelope)        
@@ -100,12 +346,13 @@ class FeatureAnalyzer:
 
     
     def calculate_growth_score_v2(self, envelope, peaks, valleys, years_list):
-        #计算成长性分数
-
+        #计算成长性分数, 返回GrowthScoreResult (涨跌幅、周期长度等在访问时计算)
+        envelope = np.asarray(envelope)
+        peaks = np.asarray(peaks, dtype=int)
+        valleys = np.asarray(valleys, dtype=int)
         envelope_len = len(envelope) 
 
-        k=np.append(peaks,valleys)
-        k.sort()
+        k = np.sort(np.concatenate([peaks, valleys]))
 
         lastchange = 0
         last_extrema_value = 0
@@ -116,88 +363,171 @@ class FeatureAnalyzer:
             elif len(valleys) > 0 and valleys[-1] == k[-1]:
                 max_value = np.max(envelope[valleys[-1]:])
                 lastchange = (envelope[-1] - max_value) / max_value *100
-            else:
-                print(peaks, valleys, k)
-                lastchange = 0
             last_extrema_value = envelope[k[-1]]
 
         if len(k) < 2:
-            return {
-                'growth_score': 0,
-                'growth_scores':[],
-                'peaks_values':[],
-                'valleys_values':[],
-                'peaks_rate':[],
-                'valleys_rate':[],
-                'peaks_len':[],
-                'peaks_avg_len':0,
-                'peaks_std_len':0,
-                'valleys_len':[],
-                'valleys_avg_len':0,
-                'valleys_std_len':0,
-                'lastvalue':envelope[-1],
-                'lastchange':lastchange,
-                'last_extrema_value':last_extrema_value
-            }
+            return GrowthScoreResult(envelope, peaks, valleys, lastvalue=envelope[-1], lastchange=lastchange,
+                                     last_extrema_value=last_extrema_value)
         if (k[0] != 0):
-            k = np.append(np.asarray([0]),k)
+            k = np.concatenate([[0], k])
         if (k[-1] != envelope_len-1):
-            k = np.append(k, np.asarray([envelope_len-1]))
-      
-        #计算波峰和波谷的周期长度
-        if (peaks[0] == k[1]):
-            peaks_len = [k[i]-k[i-1] for i in range(1, len(k) , 2)]
-            valleys_len = [k[i]-k[i-1] for i in range(2, len(k), 2)]
-        else:
-            peaks_len = [k[i]-k[i-1] for i in range(2, len(k) , 2)]
-            valleys_len = [k[i]-k[i-1] for i in range(1, len(k), 2)]
+            k = np.concatenate([k, [envelope_len-1]])
 
-        indicator = np.asarray([0] * envelope_len)
-        if (peaks[0] == k[1]):
-            for i in range(1, len(k), 2):
-                indicator[k[i-1]:k[i]] = 1
-        else:
-            for i in range(2, len(k), 2):
-                indicator[k[i-1]:k[i]] = 1
+        # 第一个极值点为波峰时, 偶数段(k[0]->k[1], k[2]->k[3], ...)为上行段
+        up_first = len(peaks) > 0 and peaks[0] == k[1]
+        offset = 0 if up_first else 1
 
+        #计算波峰的周期长度
+        peaks_len = np.diff(k)[offset::2]
+
+        # 上行段指示序列: 段起点+1、段终点-1后累加
+        starts = k[offset:-1:2]
+        ends = k[offset+1::2]
+        delta = np.zeros(envelope_len + 1, dtype=int)
+        delta[starts] += 1
+        delta[ends] -= 1
+        indicator = np.cumsum(delta[:envelope_len])
+
+        # 各年份的成长性分数由累加和直接得到
+        indicator_cumsum = np.concatenate([[0], np.cumsum(indicator)])
         growth_scores = []
         for years in years_list:
-            period_indicator = indicator[-52*years:]
-            if len(period_indicator) < 52*years:
+            period = 52*years
+            if envelope_len < period:
                 break
-            growth_scores.append((years,np.sum(period_indicator) / len(period_indicator)))
+            growth_scores.append((years, (indicator_cumsum[-1] - indicator_cumsum[-1-period]) / period))
 
-        
-        # 计算波峰和波谷的价格值
-        peaks_values = envelope[peaks]
-        valleys_values = envelope[valleys]
+        return GrowthScoreResult(
+            envelope, peaks, valleys,
+            growth_score=(np.sum(peaks_len) / envelope_len) * 100,
+            growth_scores=growth_scores,
+            lastvalue=envelope[-1],
+            lastchange=lastchange,
+            last_extrema_value=last_extrema_value,
+            bounds=k,
+            up_first=bool(up_first),
+        )
 
-        # 计算波峰和波谷的涨跌幅       
-        if peaks[0] > valleys[0]:   #波谷在前面
-            peaks_rate = np.asarray([envelope[peaks[i]]/envelope[valleys[i]]-1 for i in range(len(peaks))])
-            valleys_rate = np.append(np.asarray([envelope[valleys[0]] / np.max(envelope[:valleys[0]])-1]), 
-                np.asarray([envelope[valleys[i]]/envelope[peaks[i-1]]-1 for i in range(1, len(valleys))]))
-        else:
-            peaks_rate = np.append(np.asarray([envelope[peaks[0]] / np.min(envelope[:peaks[0]])-1]), 
-                np.asarray([envelope[peaks[i]]/envelope[valleys[i-1]]-1 for i in range(1, len(peaks))]))
-            valleys_rate = np.asarray([envelope[valleys[i]]/envelope[peaks[i]]-1 for i in range(len(valleys))])
+    def calculate_growth_score_batch(self, envelopes, extrema_list, years_list):
+        """
+        批量计算成长性分数 (calculate_growth_score_v2的批量版本)
+
+        参数:
+            envelopes: 包络线矩阵 (行数×时间), NaN为无效位置, 每行有效数据连续
+            extrema_list: 每行的极值点 {'peaks', 'valleys'}, 索引相对于该行有效数据的起点
+            years_list: 年份列表
+
+        返回:
+            dict, 每个值为按行排列的数组; growth_scores为 (行数×年份数) 矩阵, 数据不足处为NaN.
+            逐段涨跌幅等不等长的结果请使用calculate_growth_score_v2
+        """
+        envelopes = np.asarray(envelopes, dtype=float)
+        rows, width = envelopes.shape
+        valid = ~np.isnan(envelopes)
+        lengths = valid.sum(axis=1)
+        starts = np.argmax(valid, axis=1)
+        lasts = starts + lengths - 1
+
+        # 展平所有极值点: 行号、行内索引、类型(1=波峰, -1=波谷)
+        peaks_list = [np.asarray(e['peaks'], dtype=int) for e in extrema_list]
+        valleys_list = [np.asarray(e['valleys'], dtype=int) for e in extrema_list]
+        peak_counts = np.array([len(p) for p in peaks_list], dtype=int)
+        valley_counts = np.array([len(v) for v in valleys_list], dtype=int)
+        extrema_counts = peak_counts + valley_counts
+        ext_row = np.concatenate([np.repeat(np.arange(rows), peak_counts),
+                                  np.repeat(np.arange(rows), valley_counts)])
+        ext_idx = np.concatenate(peaks_list + valleys_list) if rows > 0 else np.zeros(0, dtype=int)
+        ext_type = np.concatenate([np.ones(peak_counts.sum(), dtype=int),
+                                   -np.ones(valley_counts.sum(), dtype=int)])
+        order = np.lexsort((ext_idx, ext_row))
+        ext_row, ext_idx, ext_type = ext_row[order], ext_idx[order], ext_type[order]
+
+        # 最后一个极值点
+        has_extrema = extrema_counts > 0
+        group_end = np.cumsum(extrema_counts) - 1
+        last_ext_idx = np.zeros(rows, dtype=int)
+        last_ext_type = np.zeros(rows, dtype=int)
+        last_ext_idx[has_extrema] = ext_idx[group_end[has_extrema]]
+        last_ext_type[has_extrema] = ext_type[group_end[has_extrema]]
+
+        row_ids = np.arange(rows)
+        safe_lasts = np.maximum(lasts, 0)
+        lastvalue = np.where(lengths > 0, envelopes[row_ids, safe_lasts], np.nan)
+        last_extrema_value = np.where(has_extrema, envelopes[row_ids, starts + last_ext_idx], 0)
+        cols = np.arange(width)
+        tail = valid & (cols >= (starts + last_ext_idx)[:, None])
+        tail_min = np.min(np.where(tail, envelopes, np.inf), axis=1)
+        tail_max = np.max(np.where(tail, envelopes, -np.inf), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lastchange = np.where(last_ext_type == 1, (lastvalue - tail_min) / tail_min * 100,
+                         np.where(last_ext_type == -1, (lastvalue - tail_max) / tail_max * 100, 0))
+
+        # 加入每行的首尾边界点, 用行号编码后去重排序
+        scored = (extrema_counts >= 2) & (lengths > 0)
+        key = np.concatenate([ext_row * (width + 1) + ext_idx,
+                              row_ids[scored] * (width + 1),
+                              row_ids[scored] * (width + 1) + lengths[scored] - 1])
+        key = np.unique(key[np.isin(key // (width + 1), row_ids[scored])])
+        k_row = key // (width + 1)
+        k_idx = key % (width + 1)
+        row_first = np.searchsorted(k_row, row_ids)
+        k_pos = np.arange(len(key)) - row_first[k_row]
+
+        # 每行第二个点(第一个极值点)为波峰时偶数段为上行段
+        first_ext = np.zeros(rows, dtype=int)
+        first_ext[has_extrema] = ext_type[group_end[has_extrema] - extrema_counts[has_extrema] + 1]
+        offset = np.where(first_ext == 1, 0, 1)
+
+        same_row = k_row[:-1] == k_row[1:]
+        seg_row = k_row[:-1][same_row]
+        seg_start = k_idx[:-1][same_row]
+        seg_end = k_idx[1:][same_row]
+        seg_up = (k_pos[:-1][same_row] % 2) == offset[seg_row]
+        seg_len = seg_end - seg_start
+
+        delta = np.zeros((rows, width + 1), dtype=int)
+        base = seg_row * (width + 1) + starts[seg_row]
+        np.add.at(delta.ravel(), base[seg_up] + seg_start[seg_up], 1)
+        np.add.at(delta.ravel(), base[seg_up] + seg_end[seg_up], -1)
+        indicator = np.cumsum(delta[:, :width], axis=1)
+        indicator_cumsum = np.concatenate([np.zeros((rows, 1), dtype=int), np.cumsum(indicator, axis=1)], axis=1)
+
+        growth_scores = np.full((rows, len(years_list)), np.nan)
+        available = scored.copy()
+        for j, years in enumerate(years_list):
+            period = 52*years
+            available &= lengths >= period
+            end = lasts[available] + 1
+            growth_scores[available, j] = (indicator_cumsum[available, end]
+                                           - indicator_cumsum[available, end - period]) / period
+
+        # 上行/下行段长度的均值和标准差
+        def _len_stats(mask):
+            count = np.bincount(seg_row[mask], minlength=rows)
+            total = np.bincount(seg_row[mask], weights=seg_len[mask], minlength=rows)
+            total_sq = np.bincount(seg_row[mask], weights=seg_len[mask]**2, minlength=rows)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(count > 0, total / count, 0)
+                std = np.where(count > 0, np.sqrt(np.maximum(total_sq / count - mean**2, 0)), 0)
+            return total, mean, std
+
+        peaks_total, peaks_avg_len, peaks_std_len = _len_stats(seg_up)
+        _, valleys_avg_len, valleys_std_len = _len_stats(~seg_up)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth_score = np.where(scored, peaks_total / lengths * 100, 0)
 
         return {
-            'growth_score': (np.sum(peaks_len) / envelope_len) * 100,
-            'growth_scores':growth_scores,
-            'peaks_values':peaks_values,
-            'valleys_values':valleys_values,
-            'peaks_rate':peaks_rate,
-            'valleys_rate':valleys_rate,
-            'peaks_len':peaks_len,
-            'peaks_avg_len':np.mean(peaks_len),
-            'peaks_std_len':np.std(peaks_len),
-            'valleys_len':valleys_len,
-            'valleys_avg_len':np.mean(valleys_len),
-            'valleys_std_len':np.std(valleys_len),
-            'lastvalue':envelope[-1],
-            'lastchange':lastchange,
-            'last_extrema_value':last_extrema_value
+            'growth_score': growth_score,
+            'growth_scores': growth_scores,
+            'years': list(years_list),
+            'peaks_avg_len': peaks_avg_len,
+            'peaks_std_len': peaks_std_len,
+            'valleys_avg_len': valleys_avg_len,
+            'valleys_std_len': valleys_std_len,
+            'lastvalue': lastvalue,
+            'lastchange': lastchange,
+            'last_extrema_value': last_extrema_value,
+            'indicator': indicator,
         }
 
     def calculate_annualized_returns(self, prices, years_list):
@@ -212,6 +542,22 @@ class FeatureAnalyzer:
             returns.append((years,annualized_return))
         return returns
 
+    def calculate_annualized_returns_batch(self, price_matrix, years_list):
+        """
+        批量计算年化收益率, 每行的最后一列为期末价格
+
+        返回:
+            (行数×年份数) 矩阵, 数据不足处为NaN
+        """
+        prices = np.asarray(price_matrix, dtype=float)
+        returns = np.full((prices.shape[0], len(years_list)), np.nan)
+        for j, years in enumerate(years_list):
+            period = 52*years
+            if prices.shape[1] < period:
+                break
+            returns[:, j] = (prices[:, -1] / prices[:, -period])**(1/years) - 1
+        return returns
+
     def analyze_stability(self, price_data: np.ndarray, years_list, low_rate_type="low_rate") -> dict:
         '''稳定性分析算法'''
         envelope = self.extract_hilbert_envelope(price_data)
@@ -222,5 +568,17 @@ class FeatureAnalyzer:
         extreme_data = self.find_extrema_in_envelope(envelope, low_rate = low_rate)
         growth_data = self.calculate_growth_score_v2(envelope, extreme_data['peaks'], extreme_data['valleys'],years_list)
 
-        return extreme_data | growth_data, envelope
+        # growth_data已包含peaks/valleys
+        return growth_data, envelope
+
+    def analyze_stability_batch(self, price_matrix, years_list, low_rate_type="low_rate", mask=None):
+        '''稳定性分析算法的批量版本, 返回(成长性指标dict, 每行极值点列表, 包络线矩阵)'''
+        envelopes = self.extract_hilbert_envelope_batch(price_matrix, mask)
+        if low_rate_type == "low_rate":
+            low_rate = self.low_rate
+        elif low_rate_type == "low_rate2":
+            low_rate = self.low_rate2
+        extrema_list = self.find_extrema_batch(envelopes, low_rate=low_rate)
+        growth_data = self.calculate_growth_score_batch(envelopes, extrema_list, years_list)
 
+        return growth_data, extrema_list, envelopes
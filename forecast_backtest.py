@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from configparser import ConfigParser
+
+from analysis_engine import AnalysisEngine
+from backtest_kernel import simulate_positions, performance_metrics, win_rate
+from result_store import ResultStore, data_version
+
+
+class ForecastBackTest:
+    """
+    价格预测驱动的单股票滚动回测 (framework.txt中SingleBackTest的价格预测模式)
+
+    每隔step周用AnalysisEngine预测未来days_to_forecast周, 预测期末价格上涨则买入/持有, 下跌则卖出.
+    同一只股票的历史窗口只构造一次; 每一步的预测结果保存到ResultStore(键不含交易规则),
+    只修改交易规则重新回测时不会重新计算DTW. 每一步的数据版本只取分析日期及之前的K线,
+    新增K线后历史步骤仍然命中缓存.
+    """
+    ENGINE_NAME = 'dtw_forecast'
+
+    def __init__(self, engine=None, step=None, store=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.engine = engine or AnalysisEngine()
+        self.step = step or self.config.getint('Backtest', 'forecast_step', fallback=0) or self.engine.days_to_forecast
+        self.lookback = self.config.getint('Backtest', 'forecast_lookback', fallback=1000)
+        self.store = store or ResultStore()
+        self.data_manager = self.engine.data_mgr
+
+    def forecast_params(self, df, date):
+        """单步预测的参数: 引擎参数、使用的数据起点和K线数、分析日期"""
+        params = self.engine.get_params()
+        params.update({'first_date': df.index[0], 'analysis_date': date})
+        return params
+
+    def load_data(self, stock_code):
+        df = self.data_manager.get_stock_weekly_data(stock_code)
+        if df is None or df.empty:
+            raise ValueError(f"无法获取股票{stock_code}的数据")
+        df = self.data_manager.calculate_volume_ratio(df)
+        # 起点按52周对齐: 新增K线时数据起点不变(每年才前移一次), 历史步骤的输入和缓存键保持不变
+        start = max(0, len(df) - self.lookback)
+        return df.iloc[start - start % 52:]
+
+    def walk_forward(self, stock_code, market=None, start_date=None, end_date=None, df=None):
+        """
+        滚动预测
+
+        返回:
+            DataFrame, 每个分析日期一行: close, forecast_last(预测期末价格), forecast_prices, match_indices
+        """
+        if df is None:
+            df = self.load_data(stock_code)
+        min_bars = 2 * self.engine.window_size + self.engine.days_to_forecast + 2
+        if start_date is None:
+            start_date = df.index[min(len(df) - 1, max(min_bars, len(df) - 260))]
+        positions = np.flatnonzero((df.index >= pd.Timestamp(start_date)) &
+                                   (df.index <= pd.Timestamp(end_date or df.index[-1])))
+        positions = positions[positions + 1 >= min_bars][::self.step]
+
+        prepared = None
+        rows = []
+        for i in positions:
+            date = df.index[i]
+            params = self.forecast_params(df, date)
+            # 预测只用到第i根K线及之前的数据
+            version = data_version(df.iloc[:i + 1])
+            cached = self.store.get(stock_code, version, self.ENGINE_NAME, params)
+            if cached is not None:
+                forecast_prices, match_indices = cached['forecast_prices'], cached['match_indices']
+            else:
+                if prepared is None:
+                    prepared = self.engine.prepare_windows(df['Close'], market, volume=df['Volume'],
+                                                           volume_ratio=df['Volume_Ratio'])
+                best_matches, _, forecast_prices, _, _ = self.engine.find_patterns_and_forecast_prepared(
+                    prepared, df['Close'], i + 1)
+                forecast_prices = np.asarray(forecast_prices, dtype=float)
+                match_indices = np.array([index for _, index in best_matches])
+                # 各步骤的版本不同, 保存时不能清除其他版本
+                self.store.put(stock_code, version, self.ENGINE_NAME, params,
+                               {'forecast_prices': forecast_prices, 'match_indices': match_indices}, prune=False)
+            rows.append({
+                'date': date,
+                'close': df['Close'].iloc[i],
+                'forecast_last': forecast_prices[-1],
+                'forecast_prices': forecast_prices,
+                'match_indices': match_indices,
+            })
+        return pd.DataFrame(rows).set_index('date') if rows else pd.DataFrame()
+
+    def forecast_positions(self, forecasts, index, threshold=0.0):
+        """
+        交易规则: 预测期末价格高于当前价格(1+threshold)时满仓, 低于(1-threshold)时空仓, 否则维持
+
+        返回:
+            与index对齐的目标仓位序列
+        """
+        expected = forecasts['forecast_last'] / forecasts['close'] - 1
+        signal = pd.Series(np.where(expected > threshold, 1.0, np.where(expected < -threshold, 0.0, np.nan)),
+                           index=forecasts.index)
+        return signal.reindex(index).ffill().fillna(0.0)
+
+    def backtest(self, stock_code, market=None, start_date=None, end_date=None, threshold=0.0,
+                 initial_capital=100000):
+        """运行滚动预测回测, 返回与backtest_strategy相同口径的指标"""
+        df = self.load_data(stock_code)
+        forecasts = self.walk_forward(stock_code, market, start_date, end_date, df=df)
+        if forecasts.empty:
+            raise ValueError(f"股票{stock_code}的数据不足以进行滚动预测")
+        backtest_df = df[(df.index >= forecasts.index[0]) & (df.index <= pd.Timestamp(end_date or df.index[-1]))]
+        positions = self.forecast_positions(forecasts, backtest_df.index, threshold)
+
+        simulation = simulate_positions(backtest_df['Close'].values, positions.values, initial_capital)
+        results = {
+            'stock_code': stock_code,
+            'market': market,
+            'initial_capital': initial_capital,
+            'final_value': simulation['portfolio_value'][-1],
+            'num_trades': len(simulation['trades']),
+            'win_rate': win_rate(simulation['trades']),
+            'portfolio_value': simulation['portfolio_value'],
+            'position_history': simulation['position_history'],
+            'trades': pd.DataFrame(simulation['trades']),
+            'forecasts': forecasts,
+            'backtest_dates': backtest_df.index,
+            'backtest_prices': backtest_df['Close'].values,
+        }
+        results.update(performance_metrics(simulation['portfolio_value']))
+        results['buy_hold_cumulative_returns'] = backtest_df['Close'].iloc[-1] / backtest_df['Close'].iloc[0] - 1
+        return results
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+# 数据管理页的后台批量导入: 每只股票作为一个任务提交到线程池并发下载(下载主要在等网络),
+# 完成后通过Qt信号送回GUI线程写元数据库. 未完成和失败的股票保存在状态文件中,
+# 取消或程序退出后可以继续导入. 状态文件中每个批次单独保存, 开始新批次不会丢弃之前未完成的批次.
+
+STATE_NAME = 'import_job.json'
+
+# 单只股票的导入状态
+OK = 'ok'
+EMPTY = 'empty'
+FAILED = 'failed'
+
+
+class ImportJob(QObject):
+    """
+    批量导入的任务管理器
+
+    信号(均在GUI线程发出):
+        symbol_done(code, status, message): 一只股票结束, status为OK/EMPTY/FAILED
+        progress(done, total, per_minute): 已结束数量、总数和每分钟导入只数
+        finished(cancelled): 本批次全部股票结束或被取消
+    """
+    symbol_done = pyqtSignal(str, str, str)
+    progress = pyqtSignal(int, int, float)
+    finished = pyqtSignal(bool)
+    # 线程池回调线程 -> GUI线程的内部转发
+    _completed = pyqtSignal(int, str, object, str)
+
+    def __init__(self, data_manager, workers=None, state_path=None, parent=None):
+        super().__init__(parent)
+        self.data_manager = data_manager
+        if workers is None:
+            workers = data_manager.config.getint('Data', 'download_workers', fallback=4)
+        self.workers = max(workers, 1)
+        self.state_path = state_path or os.path.join(data_manager.storage_path, STATE_NAME)
+        self.executor = None
+        self.futures = []
+        self.generation = 0
+        self.state = None
+        self.others = []    # 当前批次以外未完成的批次
+        self.done = 0
+        self.total = 0
+        self.started_at = 0.0
+        self._completed.connect(self._on_completed)
+
+    @property
+    def running(self):
+        return self.state is not None
+
+    def pending_batches(self):
+        """未完成的批次列表[{'market', 'start_date', 'remaining'}]"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return []
+        # 旧版本的状态文件只有一个批次
+        batches = state.get('batches', [state]) if isinstance(state, dict) else []
+        return [batch for batch in batches if isinstance(batch, dict) and batch.get('remaining')]
+
+    def pending_state(self):
+        """最早的未完成批次{'market', 'start_date', 'remaining'}, 没有时返回None"""
+        batches = self.pending_batches()
+        return batches[0] if batches else None
+
+    def start(self, codes, market, start_date=None):
+        """开始导入一批股票, 会先取消尚未结束的批次(其未完成部分保留在状态文件中)"""
+        self.cancel()
+        self._start(codes, market, start_date, self.pending_batches())
+
+    def resume(self):
+        """继续最早的未完成批次, 没有时返回False"""
+        self.cancel()
+        batches = self.pending_batches()
+        if not batches:
+            return False
+        state = batches[0]
+        self._start(state['remaining'], state['market'], state.get('start_date'), batches[1:])
+        return True
+
+    def _start(self, codes, market, start_date, others):
+        codes = list(dict.fromkeys(codes))
+        self.generation += 1
+        self.state = {'market': market, 'start_date': start_date, 'remaining': list(codes)}
+        self.others = others
+        self.done = 0
+        self.total = len(codes)
+        self.started_at = time.perf_counter()
+        self._save_state()
+        if not codes:
+            self._finish(False)
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        generation = self.generation
+        for code in codes:
+            future = self.executor.submit(self.data_manager.fetch_symbol, code, market, start_date)
+            future.add_done_callback(lambda f, c=code: self._on_future_done(generation, c, f))
+            self.futures.append(future)
+
+    def _on_future_done(self, generation, code, future):
+        # 运行在线程池的回调线程, 只做转发
+        try:
+            record, error = future.result(), ''
+        except CancelledError:
+            return
+        except Exception as e:
+            record, error = None, str(e) or type(e).__name__
+        self._completed.emit(generation, code, record, error)
+
+    def _on_completed(self, generation, code, record, error):
+        if self.state is None or generation != self.generation:
+            return
+        if error:
+            # 失败的股票留在状态文件中, 继续导入时重试
+            status, message = FAILED, error
+        else:
+            if record is not None:
+                self.data_manager.record_download(record)
+            status, message = (OK, '') if record is not None else (EMPTY, '没有数据')
+            self.state['remaining'].remove(code)
+            # 其他未完成批次中的同一股票已经导入, 不必再导入
+            for batch in self.others:
+                if code in batch['remaining'] and batch['market'] == self.state['market']:
+                    batch['remaining'].remove(code)
+        self._save_state()
+        self.done += 1
+        elapsed = time.perf_counter() - self.started_at
+        self.symbol_done.emit(code, status, message)
+        self.progress.emit(self.done, self.total, self.done * 60 / elapsed if elapsed > 0 else 0.0)
+        if self.done == self.total:
+            self._finish(False)
+
+    def _save_state(self):
+        batches = [batch for batch in [self.state] + self.others if batch is not None and batch['remaining']]
+        if not batches:
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'batches': batches}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _finish(self, cancelled):
+        self.futures = []
+        self.state = None
+        self.others = []
+        self.finished.emit(cancelled)
+
+    def cancel(self):
+        """取消当前批次: 未开始的股票直接取消, 正在下载的股票结果丢弃; 状态文件保留用于继续导入"""
+        if self.state is None:
+            return
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self._finish(True)
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,184 @@
+import os
+import json
+import atexit
+import functools
+import threading
+from time import perf_counter_ns
+from configparser import ConfigParser
+
+
+# 热点路径计时: 用 with span('stage'): ... 或 @timed('stage') 标记阶段.
+# 关闭时span返回共享的空上下文, timed只多一次布尔判断; 开启方式为环境变量STOCK_PROFILE=1或config.ini中[Profiling] enabled = true.
+
+class _Stats:
+    """单个阶段的调用次数、耗时合计/最值和按2的幂分桶的耗时直方图(微秒)"""
+    __slots__ = ('count', 'total_ns', 'min_ns', 'max_ns', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = {}
+
+    def add(self, duration_ns):
+        self.count += 1
+        self.total_ns += duration_ns
+        self.min_ns = duration_ns if self.min_ns is None else min(self.min_ns, duration_ns)
+        self.max_ns = max(self.max_ns, duration_ns)
+        bucket = max(duration_ns // 1000, 1).bit_length() - 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ns / 1e6,
+            'mean_us': self.total_ns / self.count / 1e3 if self.count else 0,
+            'min_us': (self.min_ns or 0) / 1e3,
+            'max_us': self.max_ns / 1e3,
+            # 键为桶下界(微秒): 耗时落在[2^k, 2^(k+1))微秒
+            'histogram_us': {str(1 << k): n for k, n in sorted(self.buckets.items())},
+        }
+
+
+class Profiler:
+    """阶段耗时的汇总器, 进程内单例为module级的profiler"""
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.events = []
+        self.origin_ns = perf_counter_ns()
+
+    def record(self, name, start_ns, end_ns):
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = _Stats()
+            stats.add(end_ns - start_ns)
+            if self.trace:
+                self.events.append({
+                    'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': (start_ns - self.origin_ns) / 1e3, 'dur': (end_ns - start_ns) / 1e3,
+                })
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+            self.events = []
+            self.origin_ns = perf_counter_ns()
+
+    def report(self, fmt='text'):
+        """汇总报告: fmt为text(按总耗时排序的表格)或json"""
+        with self.lock:
+            data = {name: stats.to_dict() for name, stats in self.stats.items()}
+        if fmt == 'json':
+            return json.dumps(data, ensure_ascii=False, indent=2)
+        lines = [f"{'阶段':<40}{'次数':>10}{'总耗时ms':>14}{'平均us':>14}{'最大us':>14}"]
+        for name, item in sorted(data.items(), key=lambda kv: -kv[1]['total_ms']):
+            lines.append(f"{name:<40}{item['count']:>10}{item['total_ms']:>14.2f}"
+                         f"{item['mean_us']:>14.1f}{item['max_us']:>14.1f}")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """按扩展名写出报告: .json为JSON, 其余为文本"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report('json' if path.endswith('.json') else 'text'))
+
+    def write_chrome_trace(self, path):
+        """写出Chrome trace格式(chrome://tracing或Perfetto中打开)"""
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+profiler = Profiler()
+
+
+class _Span:
+    __slots__ = ('name', 'start_ns')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start_ns = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        profiler.record(self.name, self.start_ns, perf_counter_ns())
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """计时上下文: with span('dtw'): ..."""
+    return _Span(name) if profiler.enabled else _NULL_SPAN
+
+
+def timed(name=None):
+    """计时装饰器, name缺省为函数的限定名"""
+    def decorator(func):
+        stage = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start_ns = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(stage, start_ns, perf_counter_ns())
+        return wrapper
+    return decorator
+
+
+def enable(trace=False):
+    profiler.enabled = True
+    profiler.trace = trace
+
+
+def disable():
+    profiler.enabled = False
+    profiler.trace = False
+
+
+def _configure():
+    """根据环境变量和config.ini开启计时, 并在进程退出时写出报告"""
+    config = ConfigParser()
+    config.read('config.ini')
+    env = os.environ.get('STOCK_PROFILE', '').lower()
+    enabled = env in ('1', 'true', 'yes') or \
+        (env == '' and config.getboolean('Profiling', 'enabled', fallback=False))
+    if not enabled:
+        return
+    report_file = os.environ.get('STOCK_PROFILE_REPORT', config.get('Profiling', 'report_file', fallback=''))
+    trace_file = os.environ.get('STOCK_PROFILE_TRACE', config.get('Profiling', 'trace_file', fallback=''))
+    enable(trace=bool(trace_file))
+
+    def write_reports():
+        if report_file:
+            profiler.dump(report_file)
+        else:
+            print(profiler.report())
+        if trace_file:
+            profiler.write_chrome_trace(trace_file)
+    atexit.register(write_reports)
+
+
+_configure()
@@ -0,0 +1,123 @@
+import numpy as np
+import matplotlib.dates as mdates
+
+
+# 长序列绘图的多级降采样: 每条序列预先计算一组按2的幂分桶的最小/最大值索引(金字塔),
+# 绘制时按坐标轴像素宽度和可见范围选择层级, 每个像素约保留一对最小/最大值, 视觉上与原始曲线一致.
+# keep中的索引(极值点标记的位置)在每一层都保留, 标记始终落在曲线上.
+
+MIN_POINTS = 512   # 原始点数不超过该值时不降采样
+
+
+def to_numeric(x):
+    """x轴数据转为浮点数组, 日期转换为matplotlib日期数值; 返回(数组, 是否为日期)"""
+    values = np.asarray(x)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float), False
+    return np.asarray(mdates.date2num(x), dtype=float), True
+
+
+def minmax_indices(y, bucket):
+    """
+    每bucket个点取最小值和最大值的索引, 按索引顺序返回
+
+    NaN不参与比较; 全为NaN的桶保留第一个点, 曲线在此处断开
+    """
+    n = len(y)
+    n_buckets = -(-n // bucket)
+    padded = np.full(n_buckets * bucket, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(n_buckets, bucket)
+    offsets = np.arange(n_buckets) * bucket
+    low = np.argmin(np.where(np.isnan(blocks), np.inf, blocks), axis=1) + offsets
+    high = np.argmax(np.where(np.isnan(blocks), -np.inf, blocks), axis=1) + offsets
+    indices = np.unique(np.concatenate([low, high, [0, n - 1]]))
+    return indices[indices < n]
+
+
+class LodSeries:
+    """
+    一条序列的降采样金字塔
+
+    levels为[(桶大小, 保留的索引)], 第一层为全部点, 之后每层桶大小翻倍
+    """
+    def __init__(self, x, y, keep=None, min_points=MIN_POINTS):
+        self.x, self.is_date = to_numeric(x)
+        self.y = np.asarray(y, dtype=float)
+        self.min_points = min_points
+        keep = np.asarray([] if keep is None else keep, dtype=int)
+        self.levels = [(1, np.arange(len(self.y)))]
+        # 桶大小为2时最小/最大值就是全部点, 从4开始
+        bucket = 4
+        while len(self.levels[-1][1]) > min_points and bucket < len(self.y):
+            self.levels.append((bucket, np.union1d(minmax_indices(self.y, bucket), keep)))
+            bucket *= 2
+
+    def select(self, x0=None, x1=None, pixels=1000):
+        """
+        可见范围[x0, x1]在pixels像素宽度下应绘制的索引
+
+        范围两侧各多保留一个点, 线条在坐标轴边缘不会断开
+        """
+        n = len(self.x)
+        i0 = 0 if x0 is None else int(np.searchsorted(self.x, x0, side='left'))
+        i1 = n if x1 is None else int(np.searchsorted(self.x, x1, side='right'))
+        visible = max(i1 - i0, 1)
+        # 每个像素约一对最小/最大值: 取桶大小不超过 可见点数/像素数 的最粗一层
+        level = 0
+        while level + 1 < len(self.levels) and self.levels[level + 1][0] <= visible / pixels:
+            level += 1
+        if level == 0:
+            return np.arange(max(i0 - 1, 0), min(i1 + 1, n))
+        indices = self.levels[level][1]
+        start = max(int(np.searchsorted(indices, i0)) - 1, 0)
+        stop = min(int(np.searchsorted(indices, i1)) + 1, len(indices))
+        return indices[start:stop]
+
+    def data(self, x0=None, x1=None, pixels=1000):
+        indices = self.select(x0, x1, pixels)
+        return self.x[indices], self.y[indices]
+
+
+def axes_pixels(ax):
+    """坐标轴的像素宽度"""
+    return max(int(ax.get_window_extent().width), 1) if ax.figure is not None else 1000
+
+
+def _on_xlim_changed(ax):
+    """缩放或平移后按新的可见范围重新选择层级"""
+    x0, x1 = ax.get_xlim()
+    pixels = axes_pixels(ax)
+    for line in ax.lines:
+        series = getattr(line, '_lod_series', None)
+        if series is not None:
+            line.set_data(*series.data(x0, x1, pixels))
+
+
+def set_lod_data(line, x, y, keep=None):
+    """
+    用降采样金字塔更新线条数据, 缩放或平移时自动切换层级
+
+    每一层都包含最小/最大值和首尾点, 自动缩放得到的坐标范围与原始数据相同.
+
+    keep: 必须保留的索引, 如极值点标记的位置
+    """
+    series = LodSeries(x, y, keep)
+    line._lod_series = series
+    ax = line.axes
+    if series.is_date:
+        ax.xaxis_date()
+    if not getattr(ax, '_lod_connected', False):
+        ax.callbacks.connect('xlim_changed', _on_xlim_changed)
+        ax._lod_connected = True
+    line.set_data(*series.data(pixels=axes_pixels(ax)))
+    return line
+
+
+def plot_lod(ax, x, y, *args, keep=None, **kwargs):
+    """与ax.plot(x, y, ...)相同, 但长序列按坐标轴像素宽度降采样"""
+    line = ax.plot([], [], *args, **kwargs)[0]
+    set_lod_data(line, x, y, keep)
+    ax.relim()
+    ax.autoscale_view()
+    return line
@@ -1,9 +1,52 @@
-from ui_main import MainWindow
-from PyQt5.QtWidgets import QApplication
 import sys
+import time
+import argparse
+
+# 图形界面入口; 第一个参数是cli.COMMANDS中的子命令时运行无界面的批处理命令(不导入Qt)
+
+# 启动时不应加载的重模块, --profile-startup会报告其中已经被导入的
+HEAVY_MODULES = ('pandas', 'matplotlib', 'scipy', 'fastdtw', 'yfinance', 'data_manager', 'analysis_engine')
+
+
+def profile_startup(app):
+    """测量导入、构造主窗口和首次绘制的耗时, 打印后退出"""
+    t0 = time.perf_counter()
+    from ui_main import MainWindow
+    t1 = time.perf_counter()
+    window = MainWindow()
+    t2 = time.perf_counter()
+    timings = {}
+
+    def on_first_paint():
+        timings['paint'] = time.perf_counter()
+        app.quit()
+
+    window.first_painted.connect(on_first_paint)
+    window.show()
+    app.exec_()
+    print(f"导入ui_main: {(t1 - t0) * 1000:.0f} ms")
+    print(f"构造主窗口: {(t2 - t1) * 1000:.0f} ms")
+    print(f"首次绘制: {(timings['paint'] - t2) * 1000:.0f} ms")
+    print(f"合计: {(timings['paint'] - t0) * 1000:.0f} ms")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"首次绘制前已加载的重模块: {', '.join(loaded) or '无'}")
+    return 0
+
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    from cli import COMMANDS
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from PyQt5.QtWidgets import QApplication
+    parser = argparse.ArgumentParser(description='股票分析工具')
+    parser.add_argument('--profile-startup', action='store_true', help='测量启动各阶段耗时后退出')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.profile_startup:
+        sys.exit(profile_startup(app))
+    from ui_main import MainWindow
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())
@@ -0,0 +1,163 @@
+import os
+import json
+import tracemalloc
+import resource
+from configparser import ConfigParser
+
+
+# 内存分析: 在阶段边界记录tracemalloc快照, 统计每个阶段新增内存最多的代码位置、阶段内峰值和进程RSS.
+# 默认关闭, 环境变量STOCK_MEMPROFILE=1或config.ini中[Profiling] memory = true开启; 关闭时stage()为空上下文.
+
+class MemoryBudgetExceeded(RuntimeError):
+    """阶段内存峰值超过预算"""
+
+
+def current_rss_mb():
+    """当前进程常驻内存(MB), 无/proc时退化为历史峰值"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """进程历史峰值常驻内存(MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB, macOS为字节
+    return peak / 2**20 if peak > 2**32 else peak / 2**10
+
+
+class MemoryProfiler:
+    """按阶段汇总内存使用"""
+    def __init__(self, top=10, frames=1):
+        self.enabled = False
+        self.top = top
+        self.frames = frames
+        self.budget_mb = 0
+        self.stages = []
+        self.active = []    # 进行中的阶段(外层在前)
+
+    def start(self, budget_mb=0):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.enabled = True
+        self.budget_mb = budget_mb
+
+    def stop(self):
+        self.enabled = False
+        self.active = []
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def reset(self):
+        self.stages = []
+
+    def stage(self, name):
+        """阶段上下文: with memory_profiler.stage('load_closes'): ..."""
+        return _MemoryStage(self, name) if self.enabled else _NULL_STAGE
+
+    def record(self, name, before, after, peak_bytes):
+        stats = after.compare_to(before, 'lineno')
+        top = [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size_diff_kb': stat.size_diff / 1024, 'count_diff': stat.count_diff}
+               for stat in stats[:self.top] if stat.size_diff > 0]
+        entry = {
+            'stage': name,
+            'allocated_mb': sum(stat.size_diff for stat in stats) / 2**20,
+            'peak_mb': peak_bytes / 2**20,
+            'rss_mb': current_rss_mb(),
+            'peak_rss_mb': peak_rss_mb(),
+            'top': top,
+        }
+        self.stages.append(entry)
+        if self.budget_mb and entry['peak_mb'] > self.budget_mb:
+            raise MemoryBudgetExceeded(f"阶段{name}内存峰值{entry['peak_mb']:.1f}MB超过预算{self.budget_mb}MB")
+        return entry
+
+    def report(self, fmt='text'):
+        """各阶段内存报告: fmt为text或json"""
+        if fmt == 'json':
+            return json.dumps(self.stages, ensure_ascii=False, indent=2)
+        lines = []
+        for entry in self.stages:
+            lines.append(f"{entry['stage']}: 新增{entry['allocated_mb']:.2f}MB, 峰值{entry['peak_mb']:.2f}MB, "
+                         f"RSS {entry['rss_mb']:.1f}MB (历史峰值{entry['peak_rss_mb']:.1f}MB)")
+            for item in entry['top']:
+                lines.append(f"    {item['size_diff_kb']:>10.1f} KB {item['count_diff']:>8} {item['location']}")
+        return '\n'.join(lines)
+
+
+class _MemoryStage:
+    """
+    一个内存分析阶段
+
+    tracemalloc只有一个全局峰值, 进入内层阶段时重置峰值前先把已有峰值记到外层阶段,
+    内层阶段结束时再把其峰值并入外层, 外层阶段的峰值因此包含内层阶段之前和之中的分配.
+    """
+    __slots__ = ('profiler', 'name', 'before', 'baseline', 'peak', 'entry')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.entry = None
+
+    def __enter__(self):
+        self.before = tracemalloc.take_snapshot()
+        active = self.profiler.active
+        if active:
+            active[-1].peak = max(active[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        # 峰值按进入阶段时已分配的内存为基线, 只统计本阶段新增部分
+        self.baseline, self.peak = tracemalloc.get_traced_memory()
+        active.append(self)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        after = tracemalloc.take_snapshot()
+        active = self.profiler.active
+        if active and active[-1] is self:
+            active.pop()
+            if active:
+                active[-1].peak = max(active[-1].peak, self.peak)
+        if exc_type is None:
+            self.entry = self.profiler.record(self.name, self.before, after, max(self.peak - self.baseline, 0))
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+    entry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+memory_profiler = MemoryProfiler()
+
+
+def memory_stage(name):
+    """标记内存分析阶段, 未开启时为空上下文"""
+    return memory_profiler.stage(name)
+
+
+def _configure():
+    config = ConfigParser()
+    config.read('config.ini')
+    env = os.environ.get('STOCK_MEMPROFILE', '').lower()
+    enabled = env in ('1', 'true', 'yes') or \
+        (env == '' and config.getboolean('Profiling', 'memory', fallback=False))
+    if enabled:
+        memory_profiler.start(config.getfloat('Profiling', 'memory_budget_mb', fallback=0))
+        import atexit
+        atexit.register(lambda: print(memory_profiler.report()))
+
+
+_configure()
@@ -0,0 +1,342 @@
+"""
+参考实现与加速实现的数值一致性检查
+
+对stock_data中的股票和合成序列, 分别运行原始实现(AnalysisEngine/FeatureAnalyzer/EnvelopeStrategy)
+和对应的批量/预构造/向量化实现, 在声明的容差内比较匹配索引、预测序列、极值点和回测指标.
+不一致时给出可单独复现的命令.
+
+用法:
+    python parity.py [--check NAME ...] [--max-symbols N] [--synthetic N]
+    python parity.py --check envelope_batch --symbol AAPL --start 120     # 复现单个用例
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+from benchmark import synthetic_weekly, FrameSource, quiet
+
+
+# 各检查项的容差: 浮点结果按rtol/atol比较, 索引类结果要求完全一致
+TOLERANCES = {
+    'envelope_batch': {'rtol': 1e-9, 'atol': 1e-9},
+    'extrema_batch': {},
+    'growth_batch': {'rtol': 1e-9, 'atol': 1e-9},
+    'growth_v2': {'rtol': 1e-9, 'atol': 1e-9},
+    'dtw_prepared': {'rtol': 1e-9, 'atol': 1e-12},
+    'forecast_prepared': {'rtol': 1e-9, 'atol': 1e-9},
+    'backtest_kernel': {'rtol': 1e-9, 'atol': 1e-6},
+}
+
+WINDOW_SIZE = 260
+
+# 检查项注册表: name -> (func, heavy), func(df, label, case) 返回不一致列表;
+# case为None时检查默认抽样的全部用例, 否则只检查该用例(用于复现). heavy为True的检查只在前几只股票上运行
+CHECKS = {}
+
+
+def parity_check(name, heavy=False):
+    def decorator(func):
+        CHECKS[name] = (func, heavy)
+        return func
+    return decorator
+
+
+def compare_arrays(reference, accelerated, rtol=0.0, atol=0.0):
+    """比较两个数组, 一致时返回None, 否则返回差异描述"""
+    reference = np.asarray(reference, dtype=float)
+    accelerated = np.asarray(accelerated, dtype=float)
+    if reference.shape != accelerated.shape:
+        return f"形状不同: {reference.shape} vs {accelerated.shape}"
+    close = np.isclose(reference, accelerated, rtol=rtol, atol=atol, equal_nan=True)
+    if close.all():
+        return None
+    first = np.flatnonzero(~close.ravel())[0]
+    return (f"{int((~close).sum())}个元素不一致, 首个位置{first}: "
+            f"{reference.ravel()[first]!r} vs {accelerated.ravel()[first]!r}")
+
+
+def _mismatch(check, label, case, detail):
+    source = f"--synthetic {label.split(':')[1]}" if label.startswith('synthetic:') else f"--symbol {label}"
+    args = ' '.join(f"--{key} {value}" for key, value in case.items())
+    return {'check': check, 'label': label, 'case': case, 'detail': detail,
+            'repro': f"python parity.py --check {check} {source} {args}".strip()}
+
+
+def _window_starts(n_bars, case, samples=8):
+    if case is not None:
+        return [case['start']]
+    if n_bars < WINDOW_SIZE:
+        return []
+    return sorted(set(np.linspace(0, n_bars - WINDOW_SIZE, samples).astype(int)))
+
+
+@parity_check('envelope_batch')
+def check_envelope_batch(df, label, case=None):
+    """滑动窗口批量包络线 vs 逐窗口extract_hilbert_envelope"""
+    from feature_analysis import FeatureAnalyzer
+    analyzer = FeatureAnalyzer()
+    prices = df['Close'].values
+    if len(prices) < WINDOW_SIZE:
+        return []
+    envelopes = analyzer.extract_window_envelopes(prices, WINDOW_SIZE)
+    mismatches = []
+    for start in _window_starts(len(prices), case):
+        expected = analyzer.extract_hilbert_envelope(prices[start:start + WINDOW_SIZE])
+        detail = compare_arrays(expected, envelopes[start], **TOLERANCES['envelope_batch'])
+        if detail:
+            mismatches.append(_mismatch('envelope_batch', label, {'start': start}, detail))
+    return mismatches
+
+
+@parity_check('extrema_batch')
+def check_extrema_batch(df, label, case=None):
+    """find_extrema_batch_multi(共享find_peaks候选点) vs 逐阈值find_extrema_in_envelope"""
+    from feature_analysis import FeatureAnalyzer
+    analyzer = FeatureAnalyzer()
+    prices = df['Close'].values
+    starts = _window_starts(len(prices), case)
+    if not starts:
+        return []
+    envelopes = np.stack([analyzer.extract_hilbert_envelope(prices[s:s + WINDOW_SIZE]) for s in starts])
+    low_rates = [analyzer.low_rate, analyzer.low_rate2]
+    batch = analyzer.find_extrema_batch_multi(envelopes, low_rates)
+    mismatches = []
+    for i, start in enumerate(starts):
+        for low_rate, extrema_list in zip(low_rates, batch):
+            expected = analyzer.find_extrema_in_envelope(envelopes[i], low_rate=low_rate)
+            for key in ('peaks', 'valleys'):
+                if not np.array_equal(expected[key], extrema_list[i][key]):
+                    mismatches.append(_mismatch('extrema_batch', label, {'start': start},
+                                                f"low_rate={low_rate} {key}: {list(expected[key])} vs "
+                                                f"{list(extrema_list[i][key])}"))
+    return mismatches
+
+
+@parity_check('growth_batch')
+def check_growth_batch(df, label, case=None):
+    """calculate_growth_score_batch vs 逐窗口analyze_stability"""
+    from feature_analysis import FeatureAnalyzer
+    analyzer = FeatureAnalyzer()
+    prices = df['Close'].values
+    starts = _window_starts(len(prices), case)
+    if not starts:
+        return []
+    years_list = [1, 2, 3, 5]
+    matrix = np.stack([prices[s:s + WINDOW_SIZE] for s in starts])
+    growth, _, _ = analyzer.analyze_stability_batch(matrix, years_list)
+    mismatches = []
+    for i, start in enumerate(starts):
+        expected, _ = analyzer.analyze_stability(matrix[i], years_list)
+        scores = growth['growth_scores'][i]
+        pairs = [('growth_score', expected['growth_score'], growth['growth_score'][i]),
+                 ('lastchange', expected['lastchange'], growth['lastchange'][i]),
+                 ('growth_scores', [r for _, r in expected['growth_scores']], scores[~np.isnan(scores)])]
+        for key, reference, accelerated in pairs:
+            detail = compare_arrays(reference, accelerated, **TOLERANCES['growth_batch'])
+            if detail:
+                mismatches.append(_mismatch('growth_batch', label, {'start': start}, f"{key}: {detail}"))
+    return mismatches
+
+
+@parity_check('growth_v2')
+def check_growth_v2(df, label, case=None):
+    """向量化calculate_growth_score_v2 vs 原始calculate_growth_score (周期长度和成长性分数)"""
+    from feature_analysis import FeatureAnalyzer
+    analyzer = FeatureAnalyzer()
+    prices = df['Close'].values
+    mismatches = []
+    for start in _window_starts(len(prices), case):
+        envelope = analyzer.extract_hilbert_envelope(prices[start:start + WINDOW_SIZE])
+        extrema = analyzer.find_extrema_in_envelope(envelope)
+        if len(extrema['peaks']) == 0 or len(extrema['valleys']) == 0:
+            continue   # 原始实现要求同时存在波峰和波谷
+        reference = quiet(lambda: analyzer.calculate_growth_score(envelope, extrema['peaks'], extrema['valleys']))()
+        accelerated = analyzer.calculate_growth_score_v2(envelope, extrema['peaks'], extrema['valleys'], [])
+        for key in ('growth_score', 'peaks_len', 'valleys_len'):
+            detail = compare_arrays(reference[key], accelerated[key], **TOLERANCES['growth_v2'])
+            if detail:
+                mismatches.append(_mismatch('growth_v2', label, {'start': start}, f"{key}: {detail}"))
+    return mismatches
+
+
+def _dtw_ends(df, case, lookback=300):
+    if case is not None:
+        return [case['end']]
+    if len(df) < lookback:
+        return []
+    return [len(df), len(df) - 26]
+
+
+def _dtw_history(df, end, lookback=300):
+    return df.iloc[max(0, end - lookback):end]
+
+
+@parity_check('dtw_prepared', heavy=True)
+def check_dtw_prepared(df, label, case=None):
+    """retrieve_similar_patterns_prepared(预构造窗口) vs 原始retrieve_similar_patterns"""
+    from analysis_engine import AnalysisEngine
+    engine = AnalysisEngine()
+    mismatches = []
+    for end in _dtw_ends(df, case):
+        history = _dtw_history(df, end)
+        reference = engine.retrieve_similar_patterns(history['Close'])
+        prepared = engine.prepare_windows(history['Close'])
+        accelerated = engine.retrieve_similar_patterns_prepared(prepared, len(history))
+        ref_index = [index for _, index in reference]
+        acc_index = [index for _, index in accelerated]
+        if ref_index[:engine.topn * 4] != acc_index[:engine.topn * 4]:
+            mismatches.append(_mismatch('dtw_prepared', label, {'end': end},
+                                        f"匹配索引: {ref_index[:engine.topn]} vs {acc_index[:engine.topn]}"))
+            continue
+        detail = compare_arrays([d for d, _ in reference], [d for d, _ in accelerated], **TOLERANCES['dtw_prepared'])
+        if detail:
+            mismatches.append(_mismatch('dtw_prepared', label, {'end': end}, f"距离: {detail}"))
+    return mismatches
+
+
+@parity_check('forecast_prepared', heavy=True)
+def check_forecast_prepared(df, label, case=None):
+    """find_patterns_and_forecast_prepared vs find_patterns_and_forecast (历史中间日期)"""
+    from analysis_engine import AnalysisEngine
+    engine = AnalysisEngine()
+    mismatches = []
+    for end in _dtw_ends(df, case):
+        history = _dtw_history(df, len(df))
+        position = end - (len(df) - len(history))   # 分析日期在history中的K线数
+        analysis_date = history.index[position - 1]
+        reference = quiet(lambda: engine.find_patterns_and_forecast(history['Close'], analysis_date=analysis_date))()
+        prepared = engine.prepare_windows(history['Close'])
+        accelerated = quiet(lambda: engine.find_patterns_and_forecast_prepared(prepared, history['Close'], position))()
+        ref_index = [index for _, index in reference.best_matches]
+        acc_index = [index for _, index in accelerated.best_matches]
+        if ref_index != acc_index:
+            mismatches.append(_mismatch('forecast_prepared', label, {'end': end},
+                                        f"最佳匹配: {ref_index} vs {acc_index}"))
+            continue
+        detail = compare_arrays(reference.forecast_prices, accelerated.forecast_prices,
+                                **TOLERANCES['forecast_prepared'])
+        if detail:
+            mismatches.append(_mismatch('forecast_prepared', label, {'end': end}, f"预测价格: {detail}"))
+    return mismatches
+
+
+@parity_check('backtest_kernel', heavy=True)
+def check_backtest_kernel(df, label, case=None):
+    """backtest_kernel.simulate_positions(只处理仓位变化) vs backtest_strategy的逐K线循环"""
+    from envelope_strategy import EnvelopeStrategy
+    from backtest_kernel import simulate_positions, performance_metrics
+    if len(df) < 2 * WINDOW_SIZE:
+        return []
+    strategy = EnvelopeStrategy()
+    strategy.data_manager = FrameSource({label: df})
+    result = quiet(lambda: strategy.backtest_strategy(label, 'US'))()
+    signals = result['signals']
+    positions = pd.Series(np.nan, index=result['backtest_dates'])
+    if len(signals) > 0:
+        positions[pd.DatetimeIndex(signals['date'])] = signals['position'].values
+    positions = positions.ffill().fillna(0.0).values
+    simulation = simulate_positions(result['backtest_prices'], positions, result['initial_capital'])
+    metrics = performance_metrics(simulation['portfolio_value'])
+
+    mismatches = []
+    pairs = [('portfolio_value', result['portfolio_value'], simulation['portfolio_value']),
+             ('num_trades', result['num_trades'], len(simulation['trades'])),
+             ('cumulative_returns', result['cumulative_returns'], metrics['cumulative_returns']),
+             ('max_drawdown', result['max_drawdown'], metrics['max_drawdown']),
+             ('sharpe_ratio', result['sharpe_ratio'], metrics['sharpe_ratio'])]
+    for key, reference, accelerated in pairs:
+        detail = compare_arrays(reference, accelerated, **TOLERANCES['backtest_kernel'])
+        if detail:
+            mismatches.append(_mismatch('backtest_kernel', label, {}, f"{key}: {detail}"))
+    return mismatches
+
+
+def load_corpus(symbols=None, synthetic=3, weeks=520, max_symbols=None):
+    """
+    检查用的数据集: stock_data中的股票周线和若干条合成周线
+
+    返回:
+        [(label, DataFrame)], 合成序列的label为'synthetic:<seed>'
+    """
+    from data_manager import StockDataManager
+    data_mgr = StockDataManager()
+    if symbols is None:
+        symbols = [stock['code'] for stock in data_mgr.get_all_stocks()]
+    if max_symbols is not None:
+        symbols = symbols[:max_symbols]
+    corpus = []
+    for symbol in symbols:
+        df = data_mgr.get_stock_weekly_data(symbol)
+        if df is not None and len(df) > 0:
+            corpus.append((symbol, df))
+    corpus.extend((f"synthetic:{seed}", synthetic_weekly(weeks, seed)) for seed in range(synthetic))
+    return corpus
+
+
+def run_parity(checks=None, corpus=None, heavy_symbols=2, max_symbols=None, synthetic=3):
+    """
+    运行一致性检查
+
+    参数:
+        checks: 检查项名称列表, None为全部
+        heavy_symbols: 耗时较长的检查只在前heavy_symbols只股票和第一条合成序列上运行
+
+    返回:
+        不一致列表, 每项含check, label, case, detail, repro
+    """
+    if corpus is None:
+        corpus = load_corpus(synthetic=synthetic, max_symbols=max_symbols)
+    stocks = [item for item in corpus if not item[0].startswith('synthetic:')]
+    synthetics = [item for item in corpus if item[0].startswith('synthetic:')]
+    mismatches = []
+    for name, (func, heavy) in CHECKS.items():
+        if checks and name not in checks:
+            continue
+        items = stocks[:heavy_symbols] + synthetics[:1] if heavy else corpus
+        found = []
+        for label, df in items:
+            try:
+                found.extend(func(df, label))
+            except Exception as e:
+                found.append(_mismatch(name, label, {}, f"异常: {e!r}"))
+        print(f"{name:<20}{len(items):>6}个数据集{len(found):>6}处不一致")
+        mismatches.extend(found)
+    for mismatch in mismatches:
+        print(f"[{mismatch['check']}] {mismatch['label']} {mismatch['case']}: {mismatch['detail']}")
+        print(f"    复现: {mismatch['repro']}")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='参考实现与加速实现的数值一致性检查')
+    parser.add_argument('--check', action='append', choices=sorted(CHECKS), help='检查项, 可重复')
+    parser.add_argument('--symbol', help='只检查一只股票')
+    parser.add_argument('--synthetic', type=int, default=None, help='只检查指定种子的合成序列')
+    parser.add_argument('--start', type=int, help='复现: 窗口起点')
+    parser.add_argument('--end', type=int, help='复现: 分析位置')
+    parser.add_argument('--max-symbols', type=int, default=None)
+    parser.add_argument('--heavy-symbols', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    case = {key: value for key, value in (('start', args.start), ('end', args.end)) if value is not None}
+    if args.symbol or args.synthetic is not None:
+        if args.symbol:
+            corpus = load_corpus([args.symbol], synthetic=0)
+        else:
+            corpus = [(f"synthetic:{args.synthetic}", synthetic_weekly(520, args.synthetic))]
+        mismatches = []
+        for name in args.check or sorted(CHECKS):
+            func, _ = CHECKS[name]
+            for label, df in corpus:
+                mismatches.extend(func(df, label, case or None))
+        for mismatch in mismatches:
+            print(f"[{mismatch['check']}] {mismatch['label']} {mismatch['case']}: {mismatch['detail']}")
+    else:
+        mismatches = run_parity(args.check, heavy_symbols=args.heavy_symbols, max_symbols=args.max_symbols)
+    print('一致' if not mismatches else f"共{len(mismatches)}处不一致")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,431 @@
+import os
+import json
+import sqlite3
+import queue
+import hashlib
+from collections import Counter, deque
+from datetime import datetime
+from configparser import ConfigParser
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from cli import worker_object, jsonable, symbol_metrics, forecast_symbol, backtest_symbol
+
+
+# 夜间流水线: 按依赖关系调度各阶段, 只重算输入有变化的股票
+#
+#   update → resample → envelopes → screen
+#                     ↘ forecast
+#                     ↘ backtest
+#
+# 每个(阶段, 股票)记录其输入版本: 最后一根K线日期、上游输出的内容哈希、参数哈希. 三者都没变且上次成功时跳过,
+# 否则重算并立即写入状态库. 不同股票互不依赖, 一只股票的某阶段完成后其下游阶段即可开始, 无需等待其他股票.
+# 中途崩溃或中断后重新运行, 已完成的(阶段, 股票)输入未变, 直接跳过, 相当于从中断处继续.
+
+def digest(value):
+    """bytes或可JSON序列化对象的短哈希"""
+    if not isinstance(value, bytes):
+        value = json.dumps(jsonable(value), sort_keys=True).encode('utf-8')
+    return hashlib.sha1(value).hexdigest()[:16]
+
+
+def file_version(path):
+    """数据文件版本 '最后K线日期:内容哈希', 文件不存在时返回None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        content = f.read()
+    lines = content.rstrip().rsplit(b'\n', 1)
+    last_bar = lines[-1].split(b',', 1)[0].decode('utf-8')[:10] if len(lines) > 1 else ''
+    return f"{last_bar}:{digest(content)}"
+
+
+def data_path(code, freq):
+    from data_manager import StockDataManager
+    return os.path.join(worker_object('data_mgr', StockDataManager).storage_path, f"{code}_{freq}.csv")
+
+
+class Stage:
+    """
+    流水线的一个阶段
+
+    run: 每只股票的任务run(code, market) -> (结果, 输出版本), 在子进程中执行(threads为True时在线程中);
+         输出版本为None时由结果的哈希生成. 汇总阶段(per_symbol=False)为run(pipeline, inputs), 在主进程执行,
+         inputs为{code: 上游结果}
+    params: params(config) -> dict, 参数变化时该阶段全部重算
+    due / current: 没有上游的源阶段使用; due(pipeline, code)为False时跳过, 输出版本取current(pipeline, code)
+    commit: 在主进程中处理结果(如写入元数据库)
+    """
+    def __init__(self, name, run, deps=(), params=None, per_symbol=True, threads=False,
+                 due=None, current=None, commit=None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.params = params or (lambda config: {})
+        self.per_symbol = per_symbol
+        self.threads = threads
+        self.due = due
+        self.current = current
+        self.commit = commit
+
+
+# ---------------------------------------------------------------- 各阶段
+
+def _data_manager(pipeline):
+    if pipeline.data_mgr is None:
+        from data_manager import StockDataManager
+        pipeline.data_mgr = StockDataManager()
+    return pipeline.data_mgr
+
+
+def update_symbol(code, market):
+    from data_manager import StockDataManager
+    record = worker_object('data_mgr', StockDataManager).fetch_symbol(code, market)
+    if record is None:
+        raise ValueError(f"没有下载到{code}的数据")
+    return list(record), file_version(data_path(code, 'daily'))
+
+
+def update_due(pipeline, code):
+    return _data_manager(pipeline).needs_update(code)
+
+
+def daily_version(pipeline, code):
+    return file_version(data_path(code, 'daily'))
+
+
+def record_update(pipeline, code, record):
+    # 元数据库只在主线程写入
+    _data_manager(pipeline).record_download(tuple(record))
+
+
+def resample_symbol(code, market):
+    """由日线重新生成周线, 先写临时文件再替换, 中断时不会留下不完整的周线文件"""
+    from data_manager import StockDataManager
+    data_mgr = worker_object('data_mgr', StockDataManager)
+    daily = data_mgr.get_stock_data(code)
+    if daily is None or daily.empty:
+        raise ValueError(f"无法获取股票{code}的日线数据")
+    weekly = data_mgr.resample_weekly(daily)
+    path = data_path(code, 'weekly')
+    # 下载时已写入的周线与重新生成的只有浮点舍入差异时保留原文件, 避免下游无谓重算
+    current = data_mgr.get_stock_weekly_data(code)
+    if current is None or not _same_bars(current, weekly):
+        weekly.to_csv(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return {'bars': len(weekly)}, file_version(path)
+
+
+def _same_bars(a, b):
+    import numpy as np
+    return (a.shape == b.shape and a.index.equals(b.index) and list(a.columns) == list(b.columns)
+            and np.allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float), rtol=1e-9, equal_nan=True))
+
+
+def envelope_symbol(code, market):
+    return symbol_metrics(code), None
+
+
+def screen_table(pipeline, inputs):
+    """汇总各股票的筛选指标, 按默认年数的年化收益排序后写出"""
+    import pandas as pd
+    from cli import write_table
+    table = pd.DataFrame.from_dict(inputs, orient='index')
+    table.index.name = 'code'
+    sort_by = f"return_{pipeline.config.getint('Returns', 'default_years', fallback=3)}y"
+    if sort_by in table:
+        table = table.sort_values(sort_by, ascending=False, na_position='last')
+    path = os.path.join(pipeline.output_dir, 'screen.csv')
+    write_table(table, path)
+    return {'rows': len(table), 'path': path}, None
+
+
+# 流水线已根据周线内容判断需要重算, 不再使用ResultStore中按旧数据保存的结果
+
+def forecast_task(code, market):
+    row = forecast_symbol((code, market, None), refresh=True)
+    # 是否命中结果缓存不影响结果内容
+    row.pop('cached', None)
+    return row, None
+
+
+def backtest_task(code, market):
+    config = ConfigParser()
+    config.read('config.ini')
+    capital = config.getfloat('Pipeline', 'capital', fallback=100000)
+    return backtest_symbol(('envelope', code, market, None, None, capital), refresh=True), None
+
+
+def _sections(*names, **extra):
+    def params(config):
+        values = {name: dict(config[name]) if name in config else {} for name in names}
+        values.update({key: config.get(section, option, fallback=None) for key, (section, option) in extra.items()})
+        return values
+    return params
+
+
+STAGES = [
+    Stage('update', update_symbol, threads=True, due=update_due, current=daily_version, commit=record_update),
+    Stage('resample', resample_symbol, deps=['update']),
+    Stage('envelopes', envelope_symbol, deps=['resample'], params=_sections('envelope', 'Returns', 'Screener')),
+    Stage('screen', screen_table, deps=['envelopes'], per_symbol=False),
+    Stage('forecast', forecast_task, deps=['resample'], params=_sections('Analysis')),
+    Stage('backtest', backtest_task, deps=['resample'],
+          params=_sections('envelope', capital=('Pipeline', 'capital'))),
+]
+
+
+# ---------------------------------------------------------------- 调度
+
+class _Inline:
+    """workers为1时在当前进程中顺序执行"""
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class Pipeline:
+    """
+    依赖感知的增量流水线
+
+    状态库(SQLite)中每个(阶段, 股票)一行: 输入版本(last_bar, content_hash, params_hash)、输出版本、结果和状态.
+    """
+    def __init__(self, stages=None, db_path=None, workers=1, download_workers=4, output_dir=None, config=None):
+        if config is None:
+            config = ConfigParser()
+            config.read('config.ini')
+        self.config = config
+        self.stages = {stage.name: stage for stage in (stages or STAGES)}
+        if db_path is None:
+            storage_path = config.get('Data', 'storage_path', fallback='./stock_data')
+            db_path = os.path.join(storage_path, config.get('Pipeline', 'db_name', fallback='pipeline.db'))
+        self.output_dir = output_dir or config.get('Pipeline', 'output_dir', fallback='./pipeline_output')
+        self.workers = workers
+        self.download_workers = download_workers
+        self.data_mgr = None
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_conn = sqlite3.connect(db_path)
+        # WAL模式下每完成一项就提交的开销很小
+        self.db_conn.execute('PRAGMA journal_mode=WAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        self.db_conn.execute('''
+            CREATE TABLE IF NOT EXISTS stage_state (
+                stage TEXT NOT NULL,
+                code TEXT NOT NULL,
+                last_bar TEXT,
+                content_hash TEXT,
+                params_hash TEXT,
+                output_version TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                output TEXT,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (stage, code)
+            )
+        ''')
+        self.db_conn.execute('''
+            CREATE TABLE IF NOT EXISTS pipeline_runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started TEXT NOT NULL,
+                finished TEXT,
+                computed INTEGER,
+                skipped INTEGER,
+                failed INTEGER
+            )
+        ''')
+        self.db_conn.commit()
+
+    def plan(self, targets=None, skip=()):
+        """需要运行的阶段(按依赖顺序): targets及其全部上游, 缺省为全部阶段"""
+        for name in list(targets or []) + list(skip):
+            if name not in self.stages:
+                raise ValueError(f"未知阶段{name}, 可用: {', '.join(self.stages)}")
+        selected = set()
+        pending = list(targets or self.stages)
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self.stages[name].deps)
+        ordered, done = [], set()
+        while len(ordered) < len(selected):
+            for name in self.stages:
+                stage = self.stages[name]
+                if name in selected and name not in done and all(d in done for d in stage.deps):
+                    ordered.append(stage)
+                    done.add(name)
+        return ordered
+
+    def state(self, stage, code):
+        row = self.db_conn.execute('''
+            SELECT last_bar, content_hash, params_hash, output_version, status, output
+            FROM stage_state WHERE stage = ? AND code = ?
+        ''', (stage, code)).fetchone()
+        return row
+
+    def outputs(self, stage, codes):
+        """某阶段各股票最近一次成功的结果"""
+        rows = self.db_conn.execute('SELECT code, output FROM stage_state WHERE stage = ? AND status = ?',
+                                    (stage, 'done')).fetchall()
+        return {code: json.loads(output) for code, output in rows if code in codes}
+
+    def _save(self, stage, code, inputs, status, output_version=None, output=None, error=''):
+        self.db_conn.execute('INSERT OR REPLACE INTO stage_state VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (stage, code, *inputs, output_version, status, error,
+                              json.dumps(jsonable(output)), datetime.now().isoformat()))
+        self.db_conn.commit()
+
+    def last_run(self):
+        return self.db_conn.execute('SELECT run_id, started, finished FROM pipeline_runs '
+                                    'ORDER BY run_id DESC LIMIT 1').fetchone()
+
+    def run(self, universe, targets=None, force=(), skip=()):
+        """
+        运行流水线
+
+        参数:
+            universe: [(code, market)]
+            targets: 要产出的阶段, 其上游自动包含; 缺省为全部
+            force: 不论输入是否变化都重算的阶段
+            skip: 本次不运行的阶段, 沿用上次的结果
+        返回:
+            {阶段: Counter(computed/skipped/failed/blocked)}
+        """
+        stages = self.plan(targets, skip)
+        markets = dict(universe)
+        codes = list(markets)
+        last = self.last_run()
+        if last is not None and last[2] is None:
+            print(f"上次运行(开始于{last[1]})未完成, 已完成的部分不再重算")
+        run_id = self.db_conn.execute('INSERT INTO pipeline_runs (started) VALUES (?)',
+                                      (datetime.now().isoformat(),)).lastrowid
+        self.db_conn.commit()
+
+        names = {stage.name for stage in stages}
+        children = {stage.name: [self.stages[n] for n in names if stage.name in self.stages[n].deps]
+                    for stage in stages}
+
+        def keys(stage):
+            return codes if stage.per_symbol else ['*']
+
+        waiting = {}
+        for stage in stages:
+            for code in keys(stage):
+                waiting[stage.name, code] = sum(len(keys(self.stages[d])) if not stage.per_symbol else 1
+                                                for d in stage.deps)
+        versions = {}       # (阶段, 股票) -> 输出版本, 失败或被阻塞为None
+        counts = {stage.name: Counter() for stage in stages}
+        ready = deque(key for key, count in waiting.items() if count == 0)
+        running = {}
+        finished = queue.Queue()
+        executors = {}
+
+        def resolve(key, version, outcome):
+            versions[key] = version
+            counts[key[0]][outcome] += 1
+            for child in children[key[0]]:
+                child_codes = keys(child) if key[1] == '*' else [key[1] if child.per_symbol else '*']
+                for code in child_codes:
+                    waiting[child.name, code] -= 1
+                    if waiting[child.name, code] == 0:
+                        ready.append((child.name, code))
+
+        def executor(stage):
+            kind = 'inline' if self.workers <= 1 and not stage.threads else ('threads' if stage.threads else 'processes')
+            if kind not in executors:
+                executors[kind] = {
+                    'inline': _Inline,
+                    'threads': lambda: ThreadPoolExecutor(max_workers=max(1, self.download_workers)),
+                    'processes': lambda: ProcessPoolExecutor(max_workers=self.workers),
+                }[kind]()
+            return executors[kind]
+
+        def schedule(key):
+            stage, code = self.stages[key[0]], key[1]
+            if stage.per_symbol:
+                upstream = [versions[d, code] for d in stage.deps]
+                if any(version is None for version in upstream):
+                    self._save(stage.name, code, (None, None, None), 'blocked', error='上游阶段失败')
+                    return resolve(key, None, 'blocked')
+            else:
+                upstream = sorted((d, c, versions[d, c]) for d in stage.deps for c in keys(self.stages[d])
+                                  if versions[d, c] is not None)
+            last_bars = [v.split(':', 1)[0] for v in (upstream if stage.per_symbol else [u[2] for u in upstream])]
+            inputs = (max(last_bars, default=''), digest(upstream), digest(stage.params(self.config)))
+            state = self.state(stage.name, code)
+
+            if stage.name in skip:
+                if stage.current is not None:
+                    version = stage.current(self, code)
+                else:
+                    version = state[3] if state is not None and state[4] == 'done' else None
+                return resolve(key, version, 'skipped')
+            if stage.name not in force:
+                if stage.due is not None:
+                    if not stage.due(self, code):
+                        return resolve(key, stage.current(self, code), 'skipped')
+                elif state is not None and state[4] == 'done' and tuple(state[:3]) == inputs:
+                    return resolve(key, state[3], 'skipped')
+
+            if stage.per_symbol:
+                future = executor(stage).submit(stage.run, code, markets[code])
+            else:
+                future = _Inline().submit(stage.run, self, self.outputs(stage.deps[0], set(codes)))
+            running[future] = (key, inputs)
+            if future.done():
+                # 顺序执行时立即保存, 中断后不必重算
+                complete(future)
+            else:
+                future.add_done_callback(finished.put)
+
+        def complete(future):
+            key, inputs = running.pop(future)
+            stage, code = self.stages[key[0]], key[1]
+            try:
+                output, version = future.result()
+                if stage.commit is not None:
+                    stage.commit(self, code, output)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"{stage.name} {code} 失败: {error}")
+                self._save(stage.name, code, inputs, 'failed', error=error)
+                # 源阶段失败时(如下载失败)沿用已有数据继续
+                return resolve(key, stage.current(self, code) if stage.current else None, 'failed')
+            if version is None:
+                version = f"{inputs[0]}:{digest(output)}"
+            self._save(stage.name, code, inputs, 'done', version, output)
+            print(f"{stage.name} {code} ok")
+            resolve(key, version, 'computed')
+
+        try:
+            while ready or running:
+                while ready:
+                    schedule(ready.popleft())
+                if running:
+                    complete(finished.get())
+        finally:
+            for pool in executors.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        total = sum(counts.values(), Counter())
+        self.db_conn.execute('UPDATE pipeline_runs SET finished = ?, computed = ?, skipped = ?, failed = ? '
+                             'WHERE run_id = ?', (datetime.now().isoformat(), total['computed'], total['skipped'],
+                                                  total['failed'] + total['blocked'], run_id))
+        self.db_conn.commit()
+        return counts
+
+    def export(self, stage, codes):
+        """某阶段各股票的结果表"""
+        import pandas as pd
+        outputs = self.outputs(stage, set(codes))
+        table = pd.DataFrame.from_dict(outputs, orient='index')
+        table.index.name = 'code'
+        return table
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+from configparser import ConfigParser
+
+from data_manager import StockDataManager
+from feature_analysis import FeatureAnalyzer
+from backtest_kernel import performance_metrics
+from memory_profile import memory_stage
+
+
+# 打分函数: score_fn(prices, rebalance_idx) -> (调仓次数×股票数) 得分矩阵, 分数越高越优先, NaN表示不可选
+# prices为前向填充后的 (时间×股票) 价格矩阵, 第t行只能使用prices[:t+1]
+
+def momentum_scores(prices, rebalance_idx, lookback=26):
+    """动量得分: 最近lookback周的涨幅"""
+    rebalance_idx = np.asarray(rebalance_idx)
+    start = np.maximum(rebalance_idx - lookback, 0)
+    return prices[rebalance_idx] / prices[start] - 1
+
+
+def envelope_position_scores(prices, rebalance_idx, window_size=260, analyzer=None):
+    """包络线仓位得分: 用最近window_size周的包络线极值点按EnvelopeStrategy.get_position计算仓位"""
+    from envelope_strategy import EnvelopeStrategy
+    strategy = EnvelopeStrategy()
+    analyzer = analyzer or strategy.analyzer
+    scores = np.full((len(rebalance_idx), prices.shape[1]), np.nan)
+    for i, t in enumerate(rebalance_idx):
+        if t + 1 < window_size:
+            continue
+        # 同一调仓日所有股票的窗口一次滤波
+        windows = prices[t + 1 - window_size:t + 1].T
+        envelopes = analyzer.extract_hilbert_envelope_batch(windows)
+        extrema, extrema2 = analyzer.find_extrema_batch_multi(envelopes, [analyzer.low_rate, analyzer.low_rate2])
+        valid = ~np.isnan(envelopes).any(axis=1)
+        for j in np.flatnonzero(valid):
+            scores[i, j], _ = strategy.get_position(extrema[j], extrema2[j])
+    return scores
+
+
+def growth_scores(prices, rebalance_idx, window_size=260, years=3, analyzer=None):
+    """成长性得分: 最近window_size周包络线的years年成长性分数"""
+    analyzer = analyzer or FeatureAnalyzer()
+    scores = np.full((len(rebalance_idx), prices.shape[1]), np.nan)
+    for i, t in enumerate(rebalance_idx):
+        if t + 1 < window_size:
+            continue
+        windows = prices[t + 1 - window_size:t + 1].T
+        growth_data, _, _ = analyzer.analyze_stability_batch(windows, [years])
+        scores[i] = growth_data['growth_scores'][:, 0]
+    return scores
+
+
+def dtw_forecast_scores(prices, rebalance_idx, engine=None, dates=None):
+    """DTW预测得分: 预测期末价格相对当前价格的涨幅 (逐只股票调用AnalysisEngine, 较慢)"""
+    from analysis_engine import AnalysisEngine
+    engine = engine or AnalysisEngine()
+    scores = np.full((len(rebalance_idx), prices.shape[1]), np.nan)
+    index = pd.RangeIndex(len(prices)) if dates is None else dates
+    for i, t in enumerate(rebalance_idx):
+        for j in range(prices.shape[1]):
+            history = pd.Series(prices[:t + 1, j], index=index[:t + 1]).dropna()
+            if len(history) < 2 * engine.window_size + engine.days_to_forecast + 2:
+                continue
+            _, _, forecast_prices, _, _ = engine.find_patterns_and_forecast(history)
+            scores[i, j] = forecast_prices[-1] / history.iloc[-1] - 1
+    return scores
+
+
+class TopNBackTest:
+    """
+    TopN组合回测
+
+    每隔rebalance_period周按打分函数对股票池排序, 持有得分最高的topn只股票(等权).
+    每次调仓最多替换dropk只: 卖出持仓中得分最低的股票, 换入未持有股票中得分最高的股票.
+    """
+    def __init__(self, score_fn=momentum_scores, topn=None, dropk=None, rebalance_period=None,
+                 cost_rate=None, initial_capital=100000):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.score_fn = score_fn
+        self.topn = topn or self.config.getint('Portfolio', 'topn', fallback=5)
+        self.dropk = dropk if dropk is not None else self.config.getint('Portfolio', 'dropk', fallback=1)
+        self.rebalance_period = rebalance_period or self.config.getint('Portfolio', 'rebalance_period', fallback=4)
+        self.cost_rate = cost_rate if cost_rate is not None else self.config.getfloat('Portfolio', 'cost_rate', fallback=0.001)
+        self.initial_capital = initial_capital
+        self.data_manager = StockDataManager()
+
+    def load_panel(self, symbols):
+        """读取股票池的周线收盘价面板"""
+        return self.data_manager.get_weekly_close_panel(symbols)
+
+    def select(self, scores, eligible, holdings):
+        """根据得分和当前持仓确定新持仓(股票列序号列表)"""
+        scores = np.where(eligible & ~np.isnan(scores), scores, -np.inf)
+        holdings = [j for j in holdings if np.isfinite(scores[j])]
+        held = set(holdings)
+        candidates = [j for j in np.argsort(-scores, kind='stable') if np.isfinite(scores[j]) and j not in held]
+
+        if len(holdings) >= self.topn:
+            holdings = sorted(holdings, key=lambda j: -scores[j])
+            for _ in range(self.dropk):
+                if candidates and scores[candidates[0]] > scores[holdings[-1]]:
+                    holdings[-1] = candidates.pop(0)
+                    holdings = sorted(holdings, key=lambda j: -scores[j])
+        while len(holdings) < self.topn and candidates:
+            holdings.append(candidates.pop(0))
+        return holdings
+
+    def run(self, panel, start_date=None, end_date=None):
+        """
+        运行回测
+
+        参数:
+            panel: 对齐的收盘价面板 (日期×股票), 可由load_panel获得
+            start_date / end_date: 回测区间, 打分可使用start_date之前的历史数据
+
+        返回:
+            dict: dates, portfolio_value, benchmark_value, turnover, holdings, 以及各项指标
+        """
+        panel = panel.sort_index()
+        if end_date is not None:
+            panel = panel[panel.index <= pd.Timestamp(end_date)]
+        listed = panel.notna().to_numpy()
+        prices = panel.ffill().to_numpy(dtype=float)
+        symbols = np.asarray(panel.columns)
+
+        start = 0 if start_date is None else int(np.searchsorted(panel.index, pd.Timestamp(start_date)))
+        rebalance_idx = np.arange(start, len(panel) - 1, self.rebalance_period)
+        if len(rebalance_idx) == 0:
+            raise ValueError("回测区间内没有调仓日")
+        with memory_stage('score'):
+            score_matrix = np.asarray(self.score_fn(prices, rebalance_idx), dtype=float)
+
+        bounds = np.append(rebalance_idx, len(panel) - 1)
+        value = float(self.initial_capital)
+        values = [np.array([value])]
+        turnover = np.zeros(len(rebalance_idx))
+        holdings_history = []
+        holdings = []
+        drifted = np.zeros(len(symbols))
+
+        for i, t in enumerate(rebalance_idx):
+            holdings = self.select(score_matrix[i], listed[t], holdings)
+            weights = np.zeros(len(symbols))
+            if holdings:
+                weights[holdings] = 1 / len(holdings)
+            traded = np.abs(weights - drifted).sum()
+            turnover[i] = traded / 2
+            value *= 1 - self.cost_rate * traded
+            holdings_history.append((panel.index[t], list(symbols[holdings])))
+
+            # 区间内的组合价值: 各持仓相对调仓日的涨跌按权重加总
+            segment = slice(t + 1, bounds[i + 1] + 1)
+            if holdings:
+                relative = prices[segment][:, holdings] / prices[t, holdings]
+                growth = relative @ weights[holdings]
+                drifted = np.zeros(len(symbols))
+                drifted[holdings] = weights[holdings] * relative[-1] / growth[-1]
+            else:
+                growth = np.ones(bounds[i + 1] - t)
+                drifted = np.zeros(len(symbols))
+            values.append(value * growth)
+            value *= growth[-1]
+
+        portfolio_value = np.concatenate(values)
+        dates = panel.index[start:]
+
+        # 基准: 同期所有已上市股票等权持有
+        period_returns = prices[start + 1:] / prices[start:-1] - 1
+        period_returns = np.where(listed[start:-1] & listed[start + 1:], period_returns, np.nan)
+        # 没有已上市股票的周期收益记为0 (手动求均值, 避免nanmean对全NaN行发出RuntimeWarning)
+        counts = np.sum(~np.isnan(period_returns), axis=1)
+        mean_returns = np.nansum(period_returns, axis=1) / np.maximum(counts, 1)
+        benchmark_value = self.initial_capital * np.concatenate([[1], np.cumprod(1 + mean_returns)])
+
+        results = {
+            'dates': dates,
+            'portfolio_value': portfolio_value,
+            'benchmark_value': benchmark_value,
+            'rebalance_dates': panel.index[rebalance_idx],
+            'turnover': turnover,
+            'holdings': holdings_history,
+            'initial_capital': self.initial_capital,
+            'final_value': portfolio_value[-1],
+        }
+        results.update(performance_metrics(portfolio_value))
+        results['benchmark_cumulative_returns'] = benchmark_value[-1] / benchmark_value[0] - 1
+        return results
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class Prefetcher:
+    """
+    浏览股票列表时的后台预取
+
+    选中一只股票后, 在一个低优先级的后台线程中依次计算它在列表中前后相邻的若干只股票,
+    结果放入LRU缓存, 翻到这些股票时直接显示. 选择跳到别处时, 旧请求中尚未开始的股票被丢弃.
+
+    compute(code)在后台线程中运行, 不能访问Qt控件和sqlite连接.
+    """
+    def __init__(self, compute, capacity=16):
+        self.compute = compute
+        self.capacity = capacity
+        self._cond = threading.Condition()
+        self._cache = OrderedDict()
+        self._queue = []
+        self._running = None     # 正在计算的代码
+        self._thread = None
+
+    def get(self, code, wait_running=True):
+        """
+        取预计算结果, 没有时返回None
+
+        wait_running: 该股票正在后台计算时等待其完成, 避免重复计算
+        """
+        with self._cond:
+            while wait_running and self._running == code and code not in self._cache:
+                self._cond.wait()
+            if code not in self._cache:
+                return None
+            self._cache.move_to_end(code)
+            return self._cache[code]
+
+    def put(self, code, result):
+        with self._cond:
+            self._store(code, result)
+
+    def _store(self, code, result):
+        self._cache[code] = result
+        self._cache.move_to_end(code)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def request(self, codes):
+        """按给定顺序(先近后远)预取codes, 替换尚未开始的旧请求"""
+        with self._cond:
+            self._queue = [code for code in dict.fromkeys(codes) if code not in self._cache]
+            self._cond.notify_all()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def cancel(self):
+        """丢弃尚未开始的请求"""
+        with self._cond:
+            self._queue = []
+
+    def wait_idle(self, timeout=None):
+        """等待队列清空(测试用)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and self._running is None, timeout)
+
+    def _run(self):
+        _lower_thread_priority()
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                code = self._queue.pop(0)
+                if code in self._cache:
+                    continue
+                self._running = code
+            try:
+                result = self.compute(code)
+            except Exception as e:
+                print(f"预取{code}失败: {str(e)}")
+                result = None
+            with self._cond:
+                self._running = None
+                # 请求被替换时仍保留已算完的结果, 只丢弃尚未开始的
+                if result is not None:
+                    self._store(code, result)
+                self._cond.notify_all()
+
+
+def _lower_thread_priority():
+    # Linux下线程是独立的调度实体, 可以单独调低优先级; 其他平台忽略
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
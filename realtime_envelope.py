@@ -0,0 +1,169 @@
+import os
+import json
+from collections import deque
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+from configparser import ConfigParser
+
+from feature_analysis import FeatureAnalyzer, butter_sos
+
+
+class CausalEnvelopeFilter:
+    """
+    单只股票的因果包络线滤波器
+
+    携带IIR滤波器状态(SOS形式), 每追加一根K线的开销为O(1), 已输出的值不会再改变.
+    lag > 0 时额外提供固定滞后平滑: 对最近lag+1个因果输出做反向滤波, 得到lag根K线之前的平滑估计.
+    """
+    def __init__(self, filter_order, cutoff_freq, lag=0):
+        self.sos = butter_sos(filter_order, cutoff_freq)
+        self.lag = lag
+        self.zi = None
+        self.count = 0
+        self.history = deque(maxlen=lag + 1)
+
+    def update(self, price):
+        """追加一根K线, 返回该K线的因果包络线值"""
+        x = np.array([float(price)])
+        if self.zi is None:
+            # 以首个价格作为稳态初值, 与FeatureAnalyzer.extract_causal_envelope一致
+            self.zi = sosfilt_zi(self.sos) * x[0]
+        y, self.zi = sosfilt(self.sos, x, zi=self.zi)
+        self.count += 1
+        if self.lag > 0:
+            self.history.append(y[0])
+        return y[0]
+
+    def smoothed(self):
+        """
+        固定滞后平滑值
+
+        返回:
+            (索引, 平滑值), 索引为count-1-lag; 未启用平滑或数据不足时返回None
+        """
+        if self.lag == 0 or len(self.history) <= self.lag:
+            return None
+        buffer = np.asarray(self.history)[::-1]
+        y, _ = sosfilt(self.sos, buffer, zi=sosfilt_zi(self.sos) * buffer[0])
+        return self.count - 1 - self.lag, y[-1]
+
+    def get_state(self):
+        return {
+            'zi': None if self.zi is None else self.zi.tolist(),
+            'count': self.count,
+            'history': [float(v) for v in self.history],
+        }
+
+    def set_state(self, state):
+        self.zi = None if state['zi'] is None else np.asarray(state['zi'])
+        self.count = state['count']
+        self.history = deque(state['history'], maxlen=self.lag + 1)
+
+
+class EnvelopeStreamRegistry:
+    """
+    实时包络线状态登记表
+
+    按(股票代码, 滤波及极值参数)保存滤波器状态和两个阈值(low_rate/low_rate2)的流式极值点检测器,
+    可保存到存储目录下的JSON文件, 进程重启后继续追加.
+    """
+    def __init__(self, state_file=None, lag=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.analyzer = FeatureAnalyzer()
+        self.lag = lag if lag is not None else self.config.getint('envelope', 'realtime_lag', fallback=0)
+        self.distance = self.config.getint('envelope', 'distance', fallback=4)
+
+        storage_path = self.config.get('Data', 'storage_path', fallback='./stock_data')
+        self.state_file = state_file or os.path.join(storage_path, 'realtime_envelope_state.json')
+        self.streams = {}
+
+    def params(self):
+        """影响状态的参数, 参数变化后旧状态不再复用"""
+        return (self.analyzer.filter_order, self.analyzer.cutoff_freq, self.lag,
+                self.analyzer.low_rate, self.analyzer.low_rate2, self.distance)
+
+    def _key(self, symbol):
+        return '|'.join([symbol] + [str(p) for p in self.params()])
+
+    def _new_stream(self):
+        return {
+            'filter': CausalEnvelopeFilter(self.analyzer.filter_order, self.analyzer.cutoff_freq, self.lag),
+            'detector': self.analyzer.create_extrema_detector(self.analyzer.low_rate, self.distance),
+            'detector2': self.analyzer.create_extrema_detector(self.analyzer.low_rate2, self.distance),
+            'last_date': None,
+        }
+
+    def get_stream(self, symbol):
+        key = self._key(symbol)
+        if key not in self.streams:
+            self.streams[key] = self._new_stream()
+        return self.streams[key]
+
+    def reset(self, symbol):
+        self.streams.pop(self._key(symbol), None)
+
+    def append(self, symbol, price, date=None):
+        """
+        追加一根K线
+
+        返回:
+            dict: index, envelope(因果值), smoothed((索引, 值)或None),
+                  extrema / extrema2 (两个阈值下新确认的极值点);
+            date不晚于上一根K线时视为重复数据, 返回None
+        """
+        stream = self.get_stream(symbol)
+        if date is not None:
+            date = str(date)
+            if stream['last_date'] is not None and date <= stream['last_date']:
+                return None
+            stream['last_date'] = date
+
+        envelope = stream['filter'].update(price)
+        return {
+            'index': stream['filter'].count - 1,
+            'envelope': envelope,
+            'smoothed': stream['filter'].smoothed(),
+            'extrema': stream['detector'].update(envelope),
+            'extrema2': stream['detector2'].update(envelope),
+        }
+
+    def warm_up(self, symbol, prices, dates=None):
+        """用历史数据重建状态, 返回历史上确认的极值点 (extrema, extrema2)"""
+        self.reset(symbol)
+        extrema, extrema2 = [], []
+        for i, price in enumerate(prices):
+            result = self.append(symbol, price, None if dates is None else dates[i])
+            if result is not None:
+                extrema += result['extrema']
+                extrema2 += result['extrema2']
+        return extrema, extrema2
+
+    def save(self):
+        state = {
+            key: {
+                'filter': stream['filter'].get_state(),
+                'detector': stream['detector'].get_state(),
+                'detector2': stream['detector2'].get_state(),
+                'last_date': stream['last_date'],
+            } for key, stream in self.streams.items()
+        }
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def load(self):
+        """加载已保存的状态, 参数不同的条目会被忽略"""
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        suffix = self._key('')
+        for key, saved in state.items():
+            if not key.endswith(suffix):
+                continue
+            stream = self._new_stream()
+            stream['filter'].set_state(saved['filter'])
+            stream['detector'].set_state(saved['detector'])
+            stream['detector2'].set_state(saved['detector2'])
+            stream['last_date'] = saved['last_date']
+            self.streams[key] = stream
@@ -0,0 +1,213 @@
+import io
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from configparser import ConfigParser
+import numpy as np
+import pandas as pd
+
+from results import RESULT_TYPES
+
+
+def data_version(df):
+    """
+    数据版本: '最后K线日期:收盘价和日期的内容哈希'
+
+    复权重新下载会改写历史K线而最后一根不变, 因此对整列收盘价和索引取哈希, 日期前缀只为便于阅读
+    """
+    if df is None or len(df) == 0:
+        return 'empty'
+    close = df['Close'] if isinstance(df, pd.DataFrame) else df
+    digest = hashlib.sha1(np.ascontiguousarray(close.to_numpy(dtype=float)).tobytes())
+    digest.update(pd.DatetimeIndex(df.index).asi8.tobytes())
+    return f"{pd.Timestamp(df.index[-1]).strftime('%Y-%m-%d')}:{digest.hexdigest()[:16]}"
+
+
+def make_key(symbol, version, engine, params):
+    """结果的内容地址: (股票, 数据版本, 引擎名, 参数)的哈希"""
+    key = json.dumps([symbol, version, engine, params], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _encode(value, arrays):
+    """把结果对象转换为可JSON序列化的结构, numpy数组单独存放到arrays中"""
+    if type(value).__name__ in RESULT_TYPES:
+        return {'__result__': type(value).__name__, 'data': _encode(value.to_payload(), arrays)}
+    if isinstance(value, pd.DataFrame):
+        return {'__frame__': {
+            'index': _encode(value.index, arrays),
+            'columns': {str(column): _encode(value[column].values, arrays) for column in value.columns},
+        }}
+    if isinstance(value, pd.Series):
+        return {'__series__': {'index': _encode(value.index, arrays),
+                               'values': _encode(value.values, arrays), 'name': value.name}}
+    if isinstance(value, pd.DatetimeIndex):
+        return {'__dates__': _encode(value.asi8, arrays), 'freq': value.freqstr}
+    if isinstance(value, pd.Index):
+        return {'__index__': _encode(value.values, arrays)}
+    if isinstance(value, pd.Timestamp):
+        return {'__timestamp__': value.isoformat()}
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            value = value.astype(str)
+        name = f"a{len(arrays)}"
+        arrays[name] = value
+        return {'__array__': name}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {'__dict__': [[_encode(k, arrays), _encode(v, arrays)] for k, v in value.items()]}
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(v, arrays) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v, arrays) for v in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return {'__float__': str(value)}
+    return value
+
+
+def _decode(value, arrays):
+    if isinstance(value, list):
+        return [_decode(v, arrays) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if '__array__' in value:
+        return arrays[value['__array__']]
+    if '__result__' in value:
+        return RESULT_TYPES[value['__result__']].from_payload(_decode(value['data'], arrays))
+    if '__dict__' in value:
+        return {_decode(k, arrays): _decode(v, arrays) for k, v in value['__dict__']}
+    if '__tuple__' in value:
+        return tuple(_decode(v, arrays) for v in value['__tuple__'])
+    if '__float__' in value:
+        return float(value['__float__'])
+    if '__timestamp__' in value:
+        return pd.Timestamp(value['__timestamp__'])
+    if '__dates__' in value:
+        return pd.DatetimeIndex(_decode(value['__dates__'], arrays), freq=value.get('freq'))
+    if '__index__' in value:
+        return pd.Index(_decode(value['__index__'], arrays))
+    if '__series__' in value:
+        series = value['__series__']
+        return pd.Series(_decode(series['values'], arrays), index=_decode(series['index'], arrays),
+                         name=series['name'])
+    if '__frame__' in value:
+        frame = value['__frame__']
+        columns = {column: _decode(data, arrays) for column, data in frame['columns'].items()}
+        return pd.DataFrame(columns, index=_decode(frame['index'], arrays))
+    return value
+
+
+def pack(result):
+    """把结果序列化为bytes: 结构写入JSON, 数组以npz格式紧凑存储"""
+    arrays = {}
+    structure = _encode(result, arrays)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, __structure__=np.frombuffer(json.dumps(structure).encode('utf-8'), dtype=np.uint8),
+                        **arrays)
+    return buffer.getvalue()
+
+
+def unpack(payload):
+    """pack的逆操作"""
+    with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    structure = json.loads(arrays.pop('__structure__').tobytes().decode('utf-8'))
+    return _decode(structure, arrays)
+
+
+class ResultStore:
+    """
+    分析/回测结果的持久化存储 (SQLite)
+
+    结果按(股票, 数据版本, 引擎名, 参数)的哈希寻址, 跨进程、跨重启共享.
+    同一股票和引擎出现新的数据版本时, 旧版本的结果自动清除.
+    """
+    def __init__(self, db_path=None):
+        if db_path is None:
+            config = ConfigParser()
+            config.read('config.ini')
+            storage_path = config.get('Data', 'storage_path', fallback='./stock_data')
+            db_path = os.path.join(storage_path, config.get('ResultStore', 'db_name', fallback='result_store.db'))
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.db_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        cursor = self.db_conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                data_version TEXT NOT NULL,
+                params TEXT NOT NULL,
+                created TEXT NOT NULL,
+                payload BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS results_symbol ON results (symbol, engine)')
+        self.db_conn.commit()
+
+    def get(self, symbol, version, engine, params):
+        """读取结果, 不存在时返回None"""
+        key = make_key(symbol, version, engine, params)
+        with self.lock:
+            row = self.db_conn.execute('SELECT payload FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return unpack(row[0])
+        except ValueError as e:
+            # 按引用保存的数据已更新或无法读取, 视为未命中
+            print(f"结果缓存{symbol}/{engine}无法还原: {str(e)}")
+            return None
+
+    def put(self, symbol, version, engine, params, result, prune=True):
+        """
+        保存结果, 并清除同一股票和引擎的旧数据版本结果
+
+        prune为False时保留其他版本, 用于按分析日期取数据版本的引擎(同时存在多个有效版本)
+        """
+        key = make_key(symbol, version, engine, params)
+        payload = pack(result)
+        with self.lock:
+            if prune:
+                self.db_conn.execute('DELETE FROM results WHERE symbol = ? AND engine = ? AND data_version != ?',
+                                     (symbol, engine, version))
+            self.db_conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                 (key, symbol, engine, version, json.dumps(params, sort_keys=True, default=str),
+                                  datetime.now().isoformat(), sqlite3.Binary(payload)))
+            self.db_conn.commit()
+
+    def get_or_compute(self, symbol, version, engine, params, compute):
+        """命中时直接返回缓存结果, 否则调用compute()计算并保存"""
+        result = self.get(symbol, version, engine, params)
+        if result is None:
+            result = compute()
+            self.put(symbol, version, engine, params, result)
+        return result
+
+    def evict(self, symbol=None, engine=None):
+        """删除指定股票和/或引擎的全部结果, 均为None时清空"""
+        query, args = 'DELETE FROM results WHERE 1 = 1', []
+        if symbol is not None:
+            query += ' AND symbol = ?'
+            args.append(symbol)
+        if engine is not None:
+            query += ' AND engine = ?'
+            args.append(engine)
+        with self.lock:
+            self.db_conn.execute(query, args)
+            self.db_conn.commit()
+
+    def count(self, symbol=None):
+        with self.lock:
+            if symbol is None:
+                return self.db_conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            return self.db_conn.execute('SELECT COUNT(*) FROM results WHERE symbol = ?', (symbol,)).fetchone()[0]
@@ -0,0 +1,321 @@
+from dataclasses import dataclass, field, fields
+import numpy as np
+import pandas as pd
+
+
+# 结果对象: __slots__ dataclass, 只保存原始数据的引用/视图和极值点索引, 派生序列在首次访问时计算.
+# 兼容原来的dict/tuple用法 (result['key'], keys(), 解包), 并提供to_payload/from_payload用于ResultStore和进程间传递.
+
+RESULT_TYPES = {}
+_KEYS = {}   # 结果类 -> (键元组, 键集合)
+
+
+def register_result(cls):
+    RESULT_TYPES[cls.__name__] = cls
+    return cls
+
+
+class DictResultMixin:
+    """按dict方式访问的结果对象: 键为公开字段加上派生属性"""
+    __slots__ = ()
+    DERIVED = ()
+
+    @classmethod
+    def _keys(cls):
+        """键在每个类上只计算一次"""
+        if cls not in _KEYS:
+            names = tuple(f.name for f in fields(cls) if not f.name.startswith('_')) + tuple(cls.DERIVED)
+            _KEYS[cls] = (names, frozenset(names))
+        return _KEYS[cls]
+
+    def keys(self):
+        return list(self._keys()[0])
+
+    def __getitem__(self, key):
+        if key not in self._keys()[1]:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._keys()[1]
+
+    def __iter__(self):
+        return iter(self._keys()[0])
+
+    def __len__(self):
+        return len(self._keys()[0])
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._keys()[1] else default
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._keys()[0]]
+
+    def values(self):
+        return [getattr(self, key) for key in self._keys()[0]]
+
+    def to_dict(self):
+        """展开为普通dict (会计算全部派生属性)"""
+        return dict(self.items())
+
+    def _cached(self, name, compute):
+        if self._cache is None:
+            self._cache = {}
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    def to_payload(self):
+        """序列化用的最小内容: 只包含字段, 不包含派生属性和缓存"""
+        return {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith('_')}
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(**payload)
+
+    def __getstate__(self):
+        return self.to_payload()
+
+    def __setstate__(self, state):
+        for f in fields(self):
+            object.__setattr__(self, f.name, state.get(f.name, f.default))
+
+
+@register_result
+@dataclass(slots=True, eq=False)
+class GrowthScoreResult(DictResultMixin):
+    """
+    成长性分析结果 (calculate_growth_score_v2 / analyze_stability)
+
+    保存包络线引用、极值点索引和分段边界, 涨跌幅、周期长度等在访问时计算.
+    """
+    envelope: np.ndarray
+    peaks: np.ndarray
+    valleys: np.ndarray
+    growth_score: float = 0
+    growth_scores: list = field(default_factory=list)
+    lastvalue: float = 0
+    lastchange: float = 0
+    last_extrema_value: float = 0
+    bounds: np.ndarray = None   # 包含首尾的分段边界, 极值点不足2个时为None
+    up_first: bool = False      # 第一段是否为上行段
+    _cache: dict = field(default=None, repr=False)
+
+    DERIVED = ('peaks_values', 'valleys_values', 'peaks_rate', 'valleys_rate', 'peaks_len', 'peaks_avg_len',
+               'peaks_std_len', 'valleys_len', 'valleys_avg_len', 'valleys_std_len')
+
+    @property
+    def peaks_values(self):
+        return self.envelope[self.peaks] if self.bounds is not None else []
+
+    @property
+    def valleys_values(self):
+        return self.envelope[self.valleys] if self.bounds is not None else []
+
+    @property
+    def peaks_len(self):
+        if self.bounds is None:
+            return []
+        return np.diff(self.bounds)[0 if self.up_first else 1::2]
+
+    @property
+    def valleys_len(self):
+        if self.bounds is None:
+            return []
+        return np.diff(self.bounds)[1 if self.up_first else 0::2]
+
+    @property
+    def peaks_avg_len(self):
+        return np.mean(self.peaks_len) if len(self.peaks_len) > 0 else 0
+
+    @property
+    def peaks_std_len(self):
+        return np.std(self.peaks_len) if len(self.peaks_len) > 0 else 0
+
+    @property
+    def valleys_avg_len(self):
+        return np.mean(self.valleys_len) if len(self.valleys_len) > 0 else 0
+
+    @property
+    def valleys_std_len(self):
+        return np.std(self.valleys_len) if len(self.valleys_len) > 0 else 0
+
+    def _rates(self):
+        # 波峰和波谷的涨跌幅 (假设波峰波谷交替出现, 不成对的部分被截断)
+        envelope, peaks, valleys = self.envelope, self.peaks, self.valleys
+        if not self.up_first:   #波谷在前面
+            n = min(len(peaks), len(valleys))
+            peaks_rate = envelope[peaks[:n]] / envelope[valleys[:n]] - 1
+            n = min(len(valleys) - 1, len(peaks))
+            valleys_rate = np.concatenate([[envelope[valleys[0]] / np.max(envelope[:valleys[0]]) - 1],
+                envelope[valleys[1:n+1]] / envelope[peaks[:n]] - 1])
+        else:
+            n = min(len(peaks) - 1, len(valleys))
+            peaks_rate = np.concatenate([[envelope[peaks[0]] / np.min(envelope[:peaks[0]]) - 1],
+                envelope[peaks[1:n+1]] / envelope[valleys[:n]] - 1])
+            n = min(len(valleys), len(peaks))
+            valleys_rate = envelope[valleys[:n]] / envelope[peaks[:n]] - 1
+        return peaks_rate, valleys_rate
+
+    @property
+    def peaks_rate(self):
+        if self.bounds is None:
+            return []
+        return self._cached('rates', self._rates)[0]
+
+    @property
+    def valleys_rate(self):
+        if self.bounds is None:
+            return []
+        return self._cached('rates', self._rates)[1]
+
+
+def load_weekly_frame(symbol):
+    """默认的frame_loader: 读取本地周线数据"""
+    from cli import worker_object
+    from data_manager import StockDataManager
+    return worker_object('data_mgr', StockDataManager).get_stock_weekly_data(symbol)
+
+
+# 还原按引用序列化的df时读取周线数据的函数, 测试或其他数据源可以替换
+frame_loader = load_weekly_frame
+
+
+def load_frame(ref):
+    """
+    按引用还原df: 读取股票的周线数据并截取首尾日期之间的部分
+
+    数据已更新(数据版本不一致)或无法读取时抛出ValueError
+    """
+    if ref is None:
+        return None
+    from result_store import data_version
+    df = frame_loader(ref['symbol'])
+    if df is None or df.empty:
+        raise ValueError(f"无法获取股票{ref['symbol']}的数据")
+    df = df.loc[ref['first']:ref['last']]
+    if data_version(df) != ref['version']:
+        raise ValueError(f"股票{ref['symbol']}的数据已更新, 回测结果已过期")
+    return df
+
+
+@register_result
+@dataclass(slots=True, eq=False)
+class BacktestResult(DictResultMixin):
+    """
+    回测结果 (EnvelopeStrategy.backtest_strategy)
+
+    df为回测使用的周线数据(与调用方共享, 不复制), start为回测起点在df中的位置;
+    dates/prices/backtest_df/backtest_dates/backtest_prices均为df的视图.
+    序列化时df只保存引用(股票代码、首尾日期和数据版本), 还原时用frame_loader重新读取周线数据.
+    """
+    stock_code: str
+    market: str
+    initial_capital: float
+    final_value: float
+    cumulative_returns: float
+    annualized_returns: float
+    buy_hold_cumulative_returns: float
+    buy_hold_annualized_returns: float
+    max_drawdown: float
+    sharpe_ratio: float
+    num_trades: int
+    win_rate: float
+    portfolio_value: np.ndarray
+    position_history: np.ndarray
+    trades: pd.DataFrame
+    signals: pd.DataFrame
+    envelope: np.ndarray
+    extreme_data: dict
+    extreme_data2: dict
+    df: pd.DataFrame = field(repr=False, default=None)
+    start: int = 0
+    _cache: dict = field(default=None, repr=False)
+
+    DERIVED = ('dates', 'prices', 'backtest_df', 'backtest_dates', 'backtest_prices')
+
+    @property
+    def dates(self):
+        return self.df.index
+
+    @property
+    def prices(self):
+        return self.df['Close'].values
+
+    @property
+    def backtest_df(self):
+        return self.df.iloc[self.start:]
+
+    @property
+    def backtest_dates(self):
+        return self.df.index[self.start:]
+
+    @property
+    def backtest_prices(self):
+        return self.df['Close'].values[self.start:]
+
+    def to_payload(self):
+        payload = DictResultMixin.to_payload(self)
+        if self.df is not None:
+            from result_store import data_version
+            payload['df'] = {'symbol': self.stock_code, 'first': self.df.index[0], 'last': self.df.index[-1],
+                             'version': data_version(self.df)}
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(**dict(payload, df=load_frame(payload.get('df'))))
+
+    def __setstate__(self, state):
+        DictResultMixin.__setstate__(self, dict(state, df=load_frame(state.get('df'))))
+
+    @property
+    def returns(self):
+        """组合逐周收益率"""
+        return self._cached('returns', lambda: np.diff(self.portfolio_value) / self.portfolio_value[:-1])
+
+    @property
+    def drawdown(self):
+        """组合回撤序列"""
+        return self._cached('drawdown', lambda: self.portfolio_value / np.maximum.accumulate(self.portfolio_value) - 1)
+
+
+@register_result
+@dataclass(slots=True, eq=False)
+class ForecastResult:
+    """
+    DTW模式匹配预测结果 (AnalysisEngine.find_patterns_and_forecast)
+
+    兼容原来的5元组: best_matches, forecast_returns, forecast_prices, real_prices, before_prices = result
+    """
+    best_matches: list
+    forecast_returns: np.ndarray
+    forecast_prices: np.ndarray
+    real_prices: np.ndarray
+    before_prices: pd.Series
+
+    def __iter__(self):
+        return iter((self.best_matches, self.forecast_returns, self.forecast_prices, self.real_prices,
+                     self.before_prices))
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __len__(self):
+        return 5
+
+    @property
+    def match_indices(self):
+        return np.array([index for _, index in self.best_matches], dtype=int)
+
+    @property
+    def expected_return(self):
+        """预测期末价格相对分析日收盘价的涨幅"""
+        return self.forecast_prices[-1] / self.before_prices.iloc[-1] - 1
+
+    def to_payload(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(**payload)
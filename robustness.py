@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from configparser import ConfigParser
+from concurrent.futures import ProcessPoolExecutor
+
+from backtest_kernel import simulate_positions, performance_metrics
+
+
+def block_bootstrap(returns, n_paths, length, block_size=8, rng=None):
+    """
+    分块自助法重采样收益率序列
+
+    从原始收益率中随机抽取长度为block_size的连续块拼接, 保留块内的自相关.
+
+    返回:
+        (n_paths × length) 收益率矩阵
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    returns = np.asarray(returns, dtype=float)
+    n_blocks = -(-length // block_size)
+    starts = rng.integers(0, len(returns) - block_size + 1, size=(n_paths, n_blocks))
+    index = (starts[:, :, None] + np.arange(block_size)).reshape(n_paths, -1)[:, :length]
+    return returns[index]
+
+
+def make_paths(prices, n_paths, length, mode='bootstrap', block_size=8, rng=None):
+    """
+    生成扰动后的价格路径
+
+    mode:
+        bootstrap: 以原始序列的第一个价格为起点, 按分块自助法重采样的收益率生成路径
+        random_start: 从原始序列中随机截取长度为length的一段
+
+    返回:
+        (n_paths × length) 价格矩阵
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    prices = np.asarray(prices, dtype=float)
+    if len(prices) < length:
+        raise ValueError(f"历史数据长度{len(prices)}小于路径长度{length}")
+    if mode == 'random_start':
+        starts = rng.integers(0, len(prices) - length + 1, size=n_paths)
+        return prices[starts[:, None] + np.arange(length)]
+    if mode == 'bootstrap':
+        returns = prices[1:] / prices[:-1] - 1
+        sampled = block_bootstrap(returns, n_paths, length - 1, block_size, rng)
+        return prices[0] * np.concatenate([np.ones((n_paths, 1)), np.cumprod(1 + sampled, axis=1)], axis=1)
+    raise ValueError(f"未知的路径生成方式: {mode}")
+
+
+_worker_strategy = None
+
+
+def _run_paths(args):
+    """子进程任务: 对一批价格路径运行包络线策略, 返回每条路径的指标"""
+    global _worker_strategy
+    paths, low_rates, window_size, initial_capital = args
+    if _worker_strategy is None:
+        from combined_strategy import CombinedStrategy
+        _worker_strategy = CombinedStrategy(rule='envelope', window_size=window_size)
+    strategy = _worker_strategy
+    strategy.window_size = window_size
+    analyzer = strategy.analyzer
+    rows = []
+    for path, (low_rate, low_rate2) in zip(paths, low_rates):
+        analyzer.low_rate, analyzer.low_rate2 = low_rate, low_rate2
+        positions = np.nan_to_num(strategy.envelope_positions(path)[window_size - 1:], nan=0.0)
+        simulation = simulate_positions(path[window_size - 1:], positions, initial_capital)
+        row = {'low_rate': low_rate, 'low_rate2': low_rate2, 'num_trades': len(simulation['trades']),
+               'buy_hold_cumulative_returns': path[-1] / path[window_size - 1] - 1}
+        row.update(performance_metrics(simulation['portfolio_value']))
+        rows.append(row)
+    return rows
+
+
+class RobustnessTest:
+    """
+    包络线策略的蒙特卡洛稳健性检验
+
+    对同一只股票生成大量扰动后的历史(分块自助法重采样周收益率 / 随机起点截取),
+    并对low_rate、low_rate2做随机扰动, 在进程池中分批回测, 统计累计收益、最大回撤和夏普比率的分布.
+    """
+    METRICS = ['cumulative_returns', 'annualized_returns', 'max_drawdown', 'sharpe_ratio']
+
+    def __init__(self, runs=None, horizon=None, block_size=None, jitter=None, workers=None, seed=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.runs = runs or self.config.getint('Robustness', 'runs', fallback=1000)
+        self.horizon = horizon or self.config.getint('Robustness', 'horizon', fallback=260)
+        self.block_size = block_size or self.config.getint('Robustness', 'block_size', fallback=8)
+        self.jitter = jitter if jitter is not None else self.config.getfloat('Robustness', 'jitter', fallback=0.2)
+        self.workers = workers or self.config.getint('Robustness', 'workers', fallback=4)
+        self.seed = seed if seed is not None else self.config.getint('Robustness', 'seed', fallback=0)
+        self.window_size = self.config.getint('Combined', 'window_size', fallback=260)
+        self.low_rate = self.config.getfloat('envelope', 'low_rate', fallback=0.10)
+        self.low_rate2 = self.config.getfloat('envelope', 'low_rate2', fallback=0.05)
+
+    def jitter_params(self, n, rng):
+        """对low_rate/low_rate2按±jitter的比例均匀扰动"""
+        scale = 1 + rng.uniform(-self.jitter, self.jitter, size=(n, 2))
+        return np.column_stack([self.low_rate * scale[:, 0], self.low_rate2 * scale[:, 1]])
+
+    def run(self, prices, mode='bootstrap', initial_capital=100000, chunk_size=50):
+        """
+        运行稳健性检验
+
+        参数:
+            prices: 原始周线收盘价序列
+            mode: bootstrap 或 random_start
+
+        返回:
+            DataFrame, 每次运行一行: low_rate, low_rate2, num_trades 及各项回测指标
+        """
+        rng = np.random.default_rng(self.seed)
+        length = self.window_size - 1 + self.horizon
+        paths = make_paths(prices, self.runs, length, mode, self.block_size, rng)
+        low_rates = self.jitter_params(self.runs, rng)
+        tasks = [(paths[i:i + chunk_size], low_rates[i:i + chunk_size], self.window_size, initial_capital)
+                 for i in range(0, self.runs, chunk_size)]
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                chunks = list(executor.map(_run_paths, tasks))
+        else:
+            chunks = [_run_paths(task) for task in tasks]
+        return pd.DataFrame([row for chunk in chunks for row in chunk])
+
+    def run_stock(self, stock_code, mode='bootstrap', initial_capital=100000):
+        """读取股票周线数据后运行稳健性检验"""
+        from data_manager import StockDataManager
+        df = StockDataManager().get_stock_weekly_data(stock_code)
+        if df is None or df.empty:
+            raise ValueError(f"无法获取股票{stock_code}的数据")
+        return self.run(df['Close'].values, mode, initial_capital)
+
+    def summarize(self, results, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """各项指标的分布: 均值、标准差和分位数"""
+        summary = results[self.METRICS].quantile(list(quantiles)).T
+        summary.columns = [f"q{int(q * 100)}" for q in quantiles]
+        summary.insert(0, 'std', results[self.METRICS].std())
+        summary.insert(0, 'mean', results[self.METRICS].mean())
+        return summary
@@ -0,0 +1,191 @@
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+
+from data_manager import StockDataManager
+from feature_analysis import FeatureAnalyzer, align_series
+from envelope_strategy import EnvelopeStrategy
+from memory_profile import memory_stage
+
+
+class StockScreener:
+    """
+    全市场稳定性筛选引擎
+
+    对所有已存储股票(或指定代码列表)批量计算年化收益、成长性分数和包络线仓位,
+    并关联stocks_info中的名称、行业、市值、市盈率等元数据, 返回可过滤、可排序的结果表.
+    """
+    META_COLUMNS = ['shortName', 'sector', 'marketCap', 'trailingPE', 'dividendYield']
+
+    def __init__(self, data_mgr=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.lookback = self.config.getint('Screener', 'lookback', fallback=520)
+        self.workers = self.config.getint('Screener', 'workers', fallback=8)
+        self.batch_size = self.config.getint('Screener', 'batch_size', fallback=500)
+        self.top = self.config.getint('Screener', 'top', fallback=10)
+        self.default_years = self.config.getint('Returns', 'default_years', fallback=3)
+        self.years_list = [int(y) for y in self.config.get('Returns', 'years', fallback='1,2,3,5,10').split(',')]
+
+        self.data_mgr = data_mgr or StockDataManager()
+        self.analyzer = FeatureAnalyzer()
+        self.strategy = EnvelopeStrategy()
+
+    def get_codes(self, market=None, stock_list=None):
+        """
+        确定筛选范围
+
+        参数:
+            market: 只筛选该市场的已存储股票
+            stock_list: config.ini中StockLists的键(如 'HK' 或 'HK_自选'), 或代码列表
+        """
+        stocks = self.data_mgr.get_all_stocks()
+        if stock_list is not None:
+            if isinstance(stock_list, str):
+                stock_list = [c.strip() for c in self.config['StockLists'][stock_list].split(',') if c.strip()]
+            wanted = set(stock_list)
+            stocks = [s for s in stocks if s['code'] in wanted]
+        if market is not None:
+            stocks = [s for s in stocks if s['market'] == market]
+        return [s['code'] for s in stocks]
+
+    def load_metadata(self, codes):
+        """读取stocks_info中的元数据, 表中没有的列填充为N/A"""
+        cursor = self.data_mgr.db_conn.cursor()
+        cursor.execute('PRAGMA table_info(stocks_info)')
+        available = [row[1] for row in cursor.fetchall()]
+        columns = ['code', 'market'] + [c for c in self.META_COLUMNS if c in available]
+        cursor.execute(f"SELECT {', '.join(columns)} FROM stocks_info")
+        meta = pd.DataFrame(cursor.fetchall(), columns=columns)
+        meta = meta[meta['code'].isin(codes)].drop_duplicates('code').set_index('code')
+        for column in self.META_COLUMNS:
+            if column not in meta.columns:
+                meta[column] = 'N/A'
+        for column in ['marketCap', 'trailingPE', 'dividendYield']:
+            meta[column] = pd.to_numeric(meta[column], errors='coerce')
+        return meta
+
+    def load_closes(self, codes):
+        """并行读取周线收盘价, 返回{code: Series}"""
+        def _load(code):
+            df = self.data_mgr.get_stock_weekly_data(code)
+            if df is None or df.empty:
+                return code, None
+            return code, df['Close'].dropna()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(_load, codes)
+        return {code: close for code, close in results if close is not None}
+
+    def compute_metrics(self, closes):
+        """对{code: 收盘价序列}批量计算筛选指标, 返回以code为索引的DataFrame"""
+        codes = list(closes)
+        if not codes:
+            return pd.DataFrame()
+        matrix, mask = align_series([closes[c].values for c in codes], length=self.lookback)
+
+        returns = self.analyzer.calculate_annualized_returns_batch(matrix, self.years_list)
+        envelopes = self.analyzer.extract_hilbert_envelope_batch(matrix, mask)
+        extrema, extrema2 = self.analyzer.find_extrema_batch_multi(
+            envelopes, [self.analyzer.low_rate, self.analyzer.low_rate2])
+        growth = self.analyzer.calculate_growth_score_batch(envelopes, extrema, self.years_list)
+        growth2 = self.analyzer.calculate_growth_score_batch(envelopes, extrema2, self.years_list)
+
+        metrics = pd.DataFrame(index=pd.Index(codes, name='code'))
+        metrics['last_date'] = [closes[c].index[-1] for c in codes]
+        metrics['last_close'] = [closes[c].iloc[-1] for c in codes]
+        metrics['bars'] = mask.sum(axis=1)
+        for j, years in enumerate(self.years_list):
+            metrics[f'return_{years}y'] = returns[:, j]
+        for j, years in enumerate(self.years_list):
+            metrics[f'growth_{years}y'] = growth['growth_scores'][:, j]
+        metrics['growth_score'] = growth['growth_score']
+        metrics['lastchange'] = growth['lastchange']
+        metrics['lastchange2'] = growth2['lastchange']
+
+        positions = [self.strategy.get_position(e1, e2) for e1, e2 in zip(extrema, extrema2)]
+        metrics['position'] = [p for p, _ in positions]
+        metrics['signal_type'] = [t for _, t in positions]
+        return metrics
+
+    def screen(self, market=None, stock_list=None, filters=None, sort_by=None, ascending=False):
+        """
+        计算并筛选
+
+        参数:
+            market / stock_list: 筛选范围, 见get_codes
+            filters: {列名: (最小值, 最大值)}, 任一端为None表示不限制; 字符串列(如sector)传入取值列表
+            sort_by: 排序列, 默认为默认年数的年化收益
+        """
+        codes = self.get_codes(market, stock_list)
+        # 按批读取和计算, 同时只保留一批的收盘价和包络线; 内存分析时每批记录一个阶段
+        batches = []
+        for start in range(0, len(codes), self.batch_size):
+            batch = codes[start:start + self.batch_size]
+            with memory_stage(f"screen_batch[{start}:{start + len(batch)}]"):
+                with memory_stage('load_closes'):
+                    closes = self.load_closes(batch)
+                with memory_stage('compute_metrics'):
+                    metrics = self.compute_metrics(closes)
+            if not metrics.empty:
+                batches.append(metrics)
+        if not batches:
+            return pd.DataFrame()
+        metrics = pd.concat(batches)
+        table = self.load_metadata(codes).join(metrics, how='inner')
+        table = self.apply_filters(table, filters)
+        sort_by = sort_by or f'return_{self.default_years}y'
+        return table.sort_values(sort_by, ascending=ascending, na_position='last')
+
+    def apply_filters(self, table, filters):
+        if not filters:
+            return table
+        keep = pd.Series(True, index=table.index)
+        for column, condition in filters.items():
+            if isinstance(condition, (list, set)):
+                keep &= table[column].isin(condition)
+                continue
+            low, high = condition
+            if low is not None:
+                keep &= table[column] >= low
+            if high is not None:
+                keep &= table[column] <= high
+        return table[keep]
+
+    def _rank_score(self, table, columns, ascending_columns=()):
+        """按列的百分位排名求均值, 缺失值不参与"""
+        ranks = [table[c].rank(pct=True, ascending=c not in ascending_columns) for c in columns]
+        return pd.concat(ranks, axis=1).mean(axis=1, skipna=True)
+
+    def find_bellwether_stock(self, sector=None, market=None, stock_list=None, years=None, filters=None, top=None):
+        """
+        发现领头羊股票: 长期年化收益高、盈利稳定(成长性分数高)、股息率高、市盈率低、市值大
+        """
+        years = years or self.default_years
+        filters = dict(filters or {})
+        if sector is not None:
+            filters['sector'] = [sector]
+        table = self.screen(market, stock_list, filters)
+        if table.empty:
+            return table
+        table = table.assign(score=self._rank_score(
+            table, [f'return_{years}y', f'growth_{years}y', 'dividendYield', 'trailingPE', 'marketCap'],
+            ascending_columns=('trailingPE',)))
+        return table.sort_values('score', ascending=False).head(top or self.top)
+
+    def find_takeoff_stock(self, sector=None, market=None, stock_list=None, years=None, filters=None, top=None):
+        """
+        发现起飞股票: 包络线处于谷底上行阶段(仓位>0), 近1年表现强于长期表现, 且自最近极值点以来涨幅大
+        """
+        years = years or self.default_years
+        filters = dict(filters or {})
+        filters.setdefault('position', (0.3, None))
+        if sector is not None:
+            filters['sector'] = [sector]
+        table = self.screen(market, stock_list, filters)
+        if table.empty:
+            return table
+        short_years = min(self.years_list)
+        table = table.assign(acceleration=table[f'return_{short_years}y'] - table[f'return_{years}y'])
+        table = table.assign(score=self._rank_score(table, ['acceleration', 'lastchange2', 'position']))
+        return table.sort_values('score', ascending=False).head(top or self.top)
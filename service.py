@@ -0,0 +1,316 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+from urllib.parse import urlsplit, parse_qsl
+
+from cli import worker_object, jsonable, symbol_metrics, forecast_symbol, backtest_symbol
+
+
+# 本地HTTP JSON服务: 预测、稳定性、包络线信号和回测
+#
+#   GET /forecast?code=600036[&date=2024-06-28]
+#   GET /stability?code=600036
+#   GET /envelope?code=600036
+#   GET /backtest?code=600036[&strategy=envelope|forecast&start=&end=&capital=]
+#   GET /stats  /health
+#
+# 计算在进程池中进行, 子进程常驻并缓存分析引擎和周线数据(见cli.worker_object/load_weekly).
+# 相同的请求正在计算时合并为一次计算, 结果在TTL内直接返回. 参数也可以用POST的JSON body传入.
+#
+#   python service.py serve [--port 8765]
+#   python service.py loadtest --path "/forecast?code=600036" --requests 200 --concurrency 20
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class AnalysisService:
+    """
+    请求合并和TTL缓存
+
+    call(key, func, *args): key相同的请求在计算期间只提交一次, 结果缓存ttl秒; 出错的结果不缓存
+    """
+    def __init__(self, workers=None, ttl=None, max_entries=None, executor=None):
+        config = ConfigParser()
+        config.read('config.ini')
+        self.ttl = ttl if ttl is not None else config.getfloat('Service', 'ttl_seconds', fallback=300)
+        self.max_entries = max_entries or config.getint('Service', 'max_entries', fallback=2048)
+        workers = workers or config.getint('Service', 'workers', fallback=0) or None
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers)
+        self.cache = {}
+        self.inflight = {}
+        self.stats = Counter()
+        self.markets = {}
+
+    async def call(self, key, func, *args):
+        self.stats['requests'] += 1
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] > now:
+            self.stats['cache_hits'] += 1
+            return entry[1]
+        if key in self.inflight:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(self.inflight[key])
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        self.inflight[key] = future
+        self.stats['computed'] += 1
+        try:
+            value = await future
+        finally:
+            del self.inflight[key]
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        if len(self.cache) >= self.max_entries:
+            self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+            while len(self.cache) >= self.max_entries:
+                # dict按插入顺序, 删除最早写入的
+                del self.cache[next(iter(self.cache))]
+        self.cache[key] = (now + self.ttl, value)
+
+    def market(self, code):
+        """
+        股票所属市场, 元数据库只在事件循环线程中访问
+
+        元数据库中还没有的股票不缓存(get_stock_market对其返回默认市场), 导入后即可查到实际市场
+        """
+        if code not in self.markets:
+            data_mgr = worker_object('data_mgr', _data_manager)
+            info = data_mgr.get_stock_info(code)
+            if info is None or info.get('market') is None:
+                return data_mgr.get_stock_market(code)
+            self.markets[code] = info['market']
+        return self.markets[code]
+
+    # ---- 接口
+
+    async def forecast(self, params):
+        code = _require(params, 'code')
+        date = params.get('date')
+        return await self.call(('forecast', code, date), forecast_symbol, (code, self.market(code), date))
+
+    async def stability(self, params):
+        code = _require(params, 'code')
+        metrics = await self.call(('metrics', code), symbol_metrics, code)
+        keys = [k for k in metrics if k.startswith(('return_', 'growth_'))] + ['last_date', 'last_close', 'bars']
+        return dict({k: metrics[k] for k in keys}, code=code)
+
+    async def envelope(self, params):
+        code = _require(params, 'code')
+        metrics = await self.call(('metrics', code), symbol_metrics, code)
+        keys = ['position', 'signal_type', 'lastchange', 'lastchange2', 'last_date', 'last_close']
+        return dict({k: metrics[k] for k in keys}, code=code)
+
+    async def backtest(self, params):
+        code = _require(params, 'code')
+        strategy = params.get('strategy', 'envelope')
+        if strategy not in ('envelope', 'forecast'):
+            raise ValueError(f"不支持的策略: {strategy}")
+        task = (strategy, code, self.market(code), params.get('start'), params.get('end'),
+                float(params.get('capital', 100000)))
+        return dict(await self.call(('backtest',) + task, backtest_symbol, task), code=code)
+
+    async def status(self, params):
+        return dict(self.stats, cached=len(self.cache), inflight=len(self.inflight))
+
+    async def health(self, params):
+        return {'ok': True}
+
+    def routes(self):
+        return {'/forecast': self.forecast, '/stability': self.stability, '/envelope': self.envelope,
+                '/backtest': self.backtest, '/stats': self.status, '/health': self.health}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _data_manager():
+    from data_manager import StockDataManager
+    return StockDataManager()
+
+
+def _require(params, name):
+    if not params.get(name):
+        raise ValueError(f"缺少参数{name}")
+    return params[name]
+
+
+# ---------------------------------------------------------------- HTTP
+
+async def read_request(reader):
+    """读取一个HTTP请求, 连接关闭时返回None; 返回(method, path, params, keep_alive)"""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, version = line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    url = urlsplit(target)
+    params = dict(parse_qsl(url.query))
+    length = int(headers.get('content-length', 0))
+    if length:
+        body = json.loads(await reader.readexactly(length))
+        if not isinstance(body, dict):
+            raise ValueError('请求体必须是JSON对象')
+        params.update({k: str(v) for k, v in body.items()})
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    return method, url.path, params, keep_alive
+
+
+def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(jsonable(payload), ensure_ascii=False).encode('utf-8')
+    writer.write((f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                  f"Content-Type: application/json; charset=utf-8\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1') + body)
+
+
+async def dispatch(service, method, path, params):
+    """返回(状态码, JSON内容)"""
+    handler = service.routes().get(path)
+    if handler is None:
+        return 404, {'error': f"未知接口{path}"}
+    if method not in ('GET', 'POST'):
+        return 405, {'error': f"不支持{method}"}
+    try:
+        return 200, await handler(params)
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    except Exception as e:
+        print(f"{path} {params} 失败: {e!r}")
+        return 500, {'error': str(e) or type(e).__name__}
+
+
+async def start_server(service, host='127.0.0.1', port=8765):
+    """启动服务并返回asyncio.Server(port=0时由系统分配端口)"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    write_response(writer, 400, {'error': '无法解析请求'}, False)
+                    break
+                if request is None:
+                    break
+                method, path, params, keep_alive = request
+                status, payload = await dispatch(service, method, path, params)
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def serve(service, host='127.0.0.1', port=8765):
+    server = await start_server(service, host, port)
+    print(f"服务已启动: http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------------------------------------------------- 压测
+
+async def load_test(host, port, paths, requests, concurrency):
+    """
+    用concurrency个长连接发送requests个请求(paths轮流使用)
+
+    返回: dict(吞吐量、延迟分位数、错误数, 以及服务端/stats)
+    """
+    latencies = []
+    errors = Counter()
+    counter = iter(range(requests))
+
+    async def request(reader, writer, path):
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await reader.readexactly(length))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                started = time.perf_counter()
+                status, _ = await request(reader, writer, paths[i % len(paths)])
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors[status] += 1
+            _, stats = await request(reader, writer, '/stats')
+            return stats
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    stats = await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(q):
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else float('nan')
+
+    return {'requests': len(latencies), 'seconds': elapsed, 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(0.5), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+            'errors': dict(errors), 'server': stats[-1]}
+
+
+def main(argv=None):
+    config = ConfigParser()
+    config.read('config.ini')
+    parser = argparse.ArgumentParser(description='本地分析服务')
+    parser.add_argument('--host', default=config.get('Service', 'host', fallback='127.0.0.1'))
+    parser.add_argument('--port', type=int, default=config.getint('Service', 'port', fallback=8765))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='启动服务')
+    serve_parser.add_argument('--workers', type=int, default=None, help='计算进程数')
+    serve_parser.add_argument('--ttl', type=float, default=None, help='结果缓存秒数')
+    load_parser = subparsers.add_parser('loadtest', help='对运行中的服务压测')
+    load_parser.add_argument('--path', action='append', required=True, help='请求路径(含参数), 可重复')
+    load_parser.add_argument('--requests', type=int, default=200)
+    load_parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == 'loadtest':
+        result = asyncio.run(load_test(args.host, args.port, args.path, args.requests, args.concurrency))
+        print(json.dumps(jsonable(result), ensure_ascii=False, indent=2))
+        return 1 if result['errors'] else 0
+
+    service = AnalysisService(args.workers, args.ttl)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+
+# 各页面共用的股票列表模型: 数据只保存一份, 刷新时按代码增量插入/更新/删除行,
+# 所有视图同步更新且保持选中状态. 行按批次提供给视图(canFetchMore/fetchMore),
+# 每个页面用StockFilterModel做自己的搜索过滤和显示格式.
+
+SEARCH_FIELDS = ('code', 'shortName', 'market', 'sector')
+
+
+class StockListModel(QAbstractListModel):
+    StockRole = Qt.UserRole + 1   # 整行股票信息(dict)
+    CodeRole = Qt.UserRole + 2
+
+    def __init__(self, batch_size=500, parent=None):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.stocks = []
+        self.keys = []      # 每行的搜索文本(小写)
+        self.rows = {}      # 代码 -> 行号
+        self.fetched = 0    # 已提供给视图的行数
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.fetched
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.fetched:
+            return None
+        stock = self.stocks[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{stock['code']} - {stock['market']}"
+        if role == self.StockRole:
+            return stock
+        if role == self.CodeRole:
+            return stock['code']
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.fetched < len(self.stocks)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.batch_size, len(self.stocks) - self.fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.fetched, self.fetched + count - 1)
+        self.fetched += count
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """搜索时需要全部行参与过滤"""
+        while self.canFetchMore():
+            self.fetchMore()
+
+    def stock(self, code):
+        row = self.rows.get(code)
+        return None if row is None else self.stocks[row]
+
+    def search_key(self, row):
+        return self.keys[row]
+
+    @staticmethod
+    def _search_key(stock):
+        return ' '.join(str(stock.get(field) or '') for field in SEARCH_FIELDS).lower()
+
+    def set_stocks(self, stocks):
+        """
+        用新的股票列表更新模型
+
+        不在新列表中的行删除, 已有的行原位更新, 新股票追加到末尾; 不重建整个模型
+        """
+        new_codes = {stock['code'] for stock in stocks}
+        for code in [code for code in self.rows if code not in new_codes]:
+            self.remove(code)
+        added = [stock for stock in stocks if not self._update(stock)]
+        self._append(added)
+
+    def upsert(self, stock):
+        """新增或更新一只股票"""
+        if not self._update(stock):
+            self._append([stock])
+
+    def _update(self, stock):
+        # 已有的行原位更新, 返回是否已存在
+        row = self.rows.get(stock['code'])
+        if row is None:
+            return False
+        if self.stocks[row] != stock:
+            self.stocks[row] = dict(stock)
+            self.keys[row] = self._search_key(stock)
+            if row < self.fetched:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+        return True
+
+    def _append(self, stocks):
+        if not stocks:
+            return
+        first = len(self.stocks)
+        for row, stock in enumerate(stocks, first):
+            self.stocks.append(dict(stock))
+            self.keys.append(self._search_key(stock))
+            self.rows[stock['code']] = row
+        # 视图已显示全部行时(包括空模型首次填充)新行立即可见, 最多一批, 其余等视图通过fetchMore拉取;
+        # 视图只拉取了部分行时, 新行排在未拉取的行之后, 不需要通知
+        if self.fetched == first:
+            count = min(self.batch_size, len(self.stocks) - first)
+            self.beginInsertRows(QModelIndex(), first, first + count - 1)
+            self.fetched += count
+            self.endInsertRows()
+
+    def remove(self, code):
+        row = self.rows.get(code)
+        if row is None:
+            return
+        visible = row < self.fetched
+        if visible:
+            self.beginRemoveRows(QModelIndex(), row, row)
+        del self.stocks[row]
+        del self.keys[row]
+        self.rows = {stock['code']: i for i, stock in enumerate(self.stocks)}
+        if visible:
+            self.fetched -= 1
+            self.endRemoveRows()
+
+
+class StockFilterModel(QSortFilterProxyModel):
+    """
+    一个视图的过滤和显示格式
+
+    fmt: 显示格式, 可用股票信息中的字段, 如 '{code}\t{market}\t{end_date}'
+    """
+    def __init__(self, source, fmt='{code} - {market}', parent=None):
+        super().__init__(parent)
+        self.fmt = fmt
+        self.terms = []
+        self.setSourceModel(source)
+
+    def set_query(self, text):
+        """按空格分隔的关键词过滤(代码、名称、市场、行业, 不区分大小写), 所有关键词都要匹配"""
+        terms = text.lower().split()
+        if terms == self.terms:
+            return
+        if terms:
+            self.sourceModel().fetch_all()
+        self.terms = terms
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.terms:
+            return True
+        key = self.sourceModel().search_key(source_row)
+        return all(term in key for term in self.terms)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            stock = super().data(index, StockListModel.StockRole)
+            if stock is not None:
+                return self.fmt.format_map(_Missing(stock))
+        return super().data(index, role)
+
+
+class _Missing(dict):
+    """格式化时缺少的字段显示为空"""
+    def __missing__(self, key):
+        return ''
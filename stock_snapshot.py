@@ -0,0 +1,36 @@
+import os
+import json
+from configparser import ConfigParser
+
+
+# 股票列表快照: 每次从元数据库读取股票列表后写入JSON, 启动时先用快照填充列表,
+# 不必等待导入pandas和打开数据库. 只依赖标准库.
+
+SNAPSHOT_NAME = 'stock_list.json'
+FIELDS = ('code', 'market', 'end_date', 'shortName', 'sector')
+
+
+def snapshot_path():
+    config = ConfigParser()
+    config.read('config.ini')
+    return os.path.join(config.get('Data', 'storage_path', fallback='./stock_data'), SNAPSHOT_NAME)
+
+
+def load_snapshot(path=None):
+    """读取快照, 不存在或损坏时返回空列表"""
+    try:
+        with open(path or snapshot_path(), encoding='utf-8') as f:
+            stocks = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [stock for stock in stocks if isinstance(stock, dict) and 'code' in stock]
+
+
+def save_snapshot(stocks, path=None):
+    """写入快照(只保留列表显示需要的字段), 先写临时文件再替换, 避免读到半个文件"""
+    path = path or snapshot_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump([{key: stock[key] for key in FIELDS if key in stock} for stock in stocks], f, ensure_ascii=False)
+    os.replace(tmp_path, path)
@@ -63,7 +63,7 @@ def test_envelope_strategy():
                 print(signals_df.tail(5).to_string())
             
             # 执行回测
-            backtest_results = strategy.backtest_strategy(stock_code, market)
+            backtest_results = strategy.backtest_strategy_cached(stock_code, market)
             
             # 显示回测结果
             print(f"\n回测结果:")
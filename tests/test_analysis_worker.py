@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import numpy as np
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from analysis_engine import AnalysisEngine
+from analysis_worker import ForecastExecutor
+from benchmark import synthetic_weekly
+from data_manager import StockDataManager
+from result_store import ResultStore
+
+class TestForecastExecutor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.tmp_dir, 'results.db'))
+        self.executor = ForecastExecutor(workers=1, store=self.store)
+        self.df = StockDataManager().calculate_volume_ratio(synthetic_weekly(300)).iloc[-200:]
+        self.dates = [d.strftime('%Y-%m-%d') for d in self.df.index[-12:-9]]
+        self.results = {}
+        self.finished = []
+        self.executor.result_ready.connect(lambda d, r: self.results.__setitem__(d, r))
+        self.executor.finished.connect(self.finished.append)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.store.db_conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def wait_finished(self, timeout_ms=120000):
+        loop = QEventLoop()
+        self.executor.finished.connect(loop.quit)
+        QTimer.singleShot(timeout_ms, loop.quit)
+        if self.executor.running:
+            loop.exec_()
+
+    def test_results_match_engine_and_cache(self):
+        self.executor.start('SYN', 'US', self.df, self.dates)
+        self.wait_finished()
+        self.assertEqual(self.finished, [False])
+        self.assertEqual(sorted(self.results), self.dates)
+        engine = AnalysisEngine()
+        for analysis_date in self.dates:
+            expected = engine.find_patterns_and_forecast(self.df['Close'], market='US', volume=self.df['Volume'],
+                                                         volume_ratio=self.df['Volume_Ratio'],
+                                                         analysis_date=analysis_date)
+            self.assertEqual(self.results[analysis_date].best_matches, expected.best_matches)
+            np.testing.assert_allclose(self.results[analysis_date].forecast_prices, expected.forecast_prices)
+
+        # 第二次运行全部命中结果缓存, 同步完成
+        self.results.clear()
+        self.executor.start('SYN', 'US', self.df, self.dates)
+        self.assertEqual(sorted(self.results), self.dates)
+        self.assertEqual(self.finished, [False, False])
+
+    def test_cancel(self):
+        self.executor.start('SYN', 'US', self.df, self.dates)
+        self.executor.cancel()
+        self.assertFalse(self.executor.running)
+        self.assertEqual(self.finished, [True])
+        # 已取消批次的迟到结果被丢弃
+        loop = QEventLoop()
+        QTimer.singleShot(500, loop.quit)
+        loop.exec_()
+        self.assertEqual(self.results, {})
+
+    def test_no_dates(self):
+        self.executor.start('SYN', 'US', self.df, [])
+        self.assertEqual(self.finished, [False])
+        self.assertFalse(self.executor.running)
+        self.assertIsNone(self.executor.job)
+        # 空批次已结束, 取消不再发出finished
+        self.executor.cancel()
+        self.assertEqual(self.finished, [False])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+import unittest
+from benchmark import BenchmarkStore, compare, synthetic_ohlcv, synthetic_weekly, run_benchmarks
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_ohlcv(self):
+        data = synthetic_ohlcv(1000, seed=1)
+        self.assertEqual(len(data), 1000)
+        self.assertTrue((data['High'] >= data[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((data['Low'] <= data[['Open', 'Close']].min(axis=1)).all())
+        self.assertTrue(data.equals(synthetic_ohlcv(1000, seed=1)))
+        self.assertEqual(len(synthetic_weekly(260)), 260)
+
+    def test_compare_flags_regression(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        store = BenchmarkStore(os.path.join(tmp_dir.name, 'bench.db'))
+        self.addCleanup(store.db_conn.close)
+        store.save('base', False, [{'case': 'a', 'size': 1, 'best': 1.0, 'mean': 1.0, 'repeats': 1},
+                                   {'case': 'b', 'size': 1, 'best': 1.0, 'mean': 1.0, 'repeats': 1}])
+        store.save('head', False, [{'case': 'a', 'size': 1, 'best': 1.1, 'mean': 1.1, 'repeats': 1},
+                                   {'case': 'b', 'size': 1, 'best': 1.5, 'mean': 1.5, 'repeats': 1}])
+        table, regressed = compare(store, 'base', 'head', threshold=0.2)
+        self.assertTrue(regressed)
+        self.assertEqual(list(table['regression']), [False, True])
+
+    def test_run_quick_case(self):
+        rows = run_benchmarks(['analyze_stability'], quick=True)
+        self.assertEqual(len(rows), 1)
+        self.assertGreater(rows[0]['best'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
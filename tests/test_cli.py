@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+from configparser import ConfigParser
+import pandas as pd
+import cli
+
+class FakeDataManager:
+    def get_all_stocks(self):
+        return [{'code': 'AAPL', 'market': 'US'}, {'code': '0700', 'market': 'HK'}, {'code': 'MSFT', 'market': 'US'}]
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config = ConfigParser()
+        self.config.read_dict({'StockLists': {'US': 'AAPL, MSFT', 'US_tech': 'MSFT,NVDA'}})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resolve_universe(self):
+        data_mgr = FakeDataManager()
+        self.assertEqual(cli.resolve_universe(data_mgr, self.config, market='US'), [('AAPL', 'US'), ('MSFT', 'US')])
+        self.assertEqual(cli.list_codes(self.config, 'tech', 'US'), ['MSFT', 'NVDA'])
+        self.assertEqual(cli.list_codes(self.config, 'AAPL,0700'), ['AAPL', '0700'])
+        # 未导入的股票只在下载时使用--market
+        self.assertEqual(cli.resolve_universe(data_mgr, self.config, 'US', 'tech'), [('MSFT', 'US')])
+        self.assertEqual(cli.resolve_universe(data_mgr, self.config, 'US', 'tech', stored_only=False),
+                         [('MSFT', 'US'), ('NVDA', 'US')])
+
+    def test_write_table(self):
+        table = pd.DataFrame({'value': [1.5, 2.5], 'date': pd.to_datetime(['2024-01-05', '2024-01-12'])},
+                             index=pd.Index(['A', 'B'], name='code'))
+        cli.write_table(table, os.path.join(self.tmp_dir, 'out.csv'))
+        self.assertEqual(list(pd.read_csv(os.path.join(self.tmp_dir, 'out.csv'), index_col=0)['value']), [1.5, 2.5])
+        cli.write_table(table, os.path.join(self.tmp_dir, 'sub', 'out.json'))
+        with open(os.path.join(self.tmp_dir, 'sub', 'out.json'), encoding='utf-8') as f:
+            records = json.load(f)
+        self.assertEqual(records[1]['code'], 'B')
+        self.assertTrue(records[0]['date'].startswith('2024-01-05'))
+        with self.assertRaises(ValueError):
+            cli.write_table(table, os.path.join(self.tmp_dir, 'out.xlsx'))
+
+    def test_jsonable(self):
+        import numpy as np
+        import pandas as pd
+        value = {'a': np.float64('nan'), 'b': np.int64(3), 'c': pd.Timestamp('2024-01-05'),
+                 'd': np.array([1.5, np.inf]), 'e': 'x'}
+        self.assertEqual(json.loads(json.dumps(cli.jsonable(value))),
+                         {'a': None, 'b': 3, 'c': '2024-01-05T00:00:00', 'd': [1.5, None], 'e': 'x'})
+
+    def test_run_tasks_collects_errors(self):
+        results = {task: (result, error) for task, result, error in cli.run_tasks(_square, [1, 2, -1], workers=2)}
+        self.assertEqual(results[2], (4, ''))
+        self.assertEqual(results[-1], (None, 'negative'))
+
+    def test_screen_without_qt(self):
+        output = os.path.join(self.tmp_dir, 'screen.json')
+        code = ('import sys, cli; rc = cli.main(["screen", "--market", "US", "--top", "3", "-o", sys.argv[1]]); '
+                'sys.exit(rc or int("PyQt5" in sys.modules or "matplotlib" in sys.modules) * 2)')
+        self.assertEqual(subprocess.call([sys.executable, '-c', code, output], stdout=subprocess.DEVNULL), 0)
+        with open(output, encoding='utf-8') as f:
+            records = json.load(f)
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(record['market'] == 'US' for record in records))
+
+def _square(x):
+    if x < 0:
+        raise ValueError('negative')
+    return x * x
+
+if __name__ == '__main__':
+    unittest.main()
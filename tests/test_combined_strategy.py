@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from backtest_kernel import simulate_positions, simulate_positions_batch, performance_metrics
+from combined_strategy import CombinedStrategy, COMBINE_RULES
+from feature_analysis import align_series
+
+class TestCombinedStrategy(unittest.TestCase):
+    def setUp(self):
+        self.strategy = CombinedStrategy(rule='regime_envelope', window_size=260)
+        self.prices = self.strategy.data_manager.get_stock_weekly_data('AAPL')['Close'].values[-300:]
+
+    def test_envelope_positions_match_single_window(self):
+        positions = self.strategy.envelope_positions(self.prices)
+        self.assertTrue(np.isnan(positions[:259]).all())
+        analyzer = self.strategy.analyzer
+        for end in [260, 280, 300]:
+            envelope = analyzer.extract_hilbert_envelope(self.prices[end - 260:end])
+            expected, _ = self.strategy.strategy.get_position(
+                analyzer.find_extrema_in_envelope(envelope, low_rate=analyzer.low_rate),
+                analyzer.find_extrema_in_envelope(envelope, low_rate=analyzer.low_rate2))
+            self.assertEqual(positions[end - 1], expected)
+
+    def test_envelope_positions_batch(self):
+        price_list = [self.prices, self.prices[:280] * 1.5]
+        batch = self.strategy.envelope_positions_batch(price_list, starts=[270, 0])
+        self.assertTrue(np.isnan(batch[0][:270]).all())
+        np.testing.assert_array_equal(batch[0][270:], self.strategy.envelope_positions(self.prices)[270:])
+        np.testing.assert_array_equal(batch[1], self.strategy.envelope_positions(price_list[1]))
+
+    def test_simulate_positions_batch(self):
+        rng = np.random.default_rng(0)
+        price_list = [50 + np.cumsum(rng.normal(size=n)) for n in (40, 25, 1)]
+        position_list = [rng.choice([0.0, 0.3, 0.7, 1.0], size=len(p)) for p in price_list]
+        prices, mask = align_series(price_list)
+        positions = np.where(mask, align_series(position_list, prices.shape[1])[0], 0.0)
+        result = simulate_positions_batch(prices, positions, initial_capital=1000)
+        for k, (p, pos) in enumerate(zip(price_list, position_list)):
+            expected = simulate_positions(p, pos, initial_capital=1000)
+            np.testing.assert_allclose(result['portfolio_value'][k][mask[k]], expected['portfolio_value'])
+            self.assertTrue(np.isnan(result['portfolio_value'][k][~mask[k]]).all())
+            self.assertEqual(len(result['trades'][k]), len(expected['trades']))
+            for trade, expected_trade in zip(result['trades'][k], expected['trades']):
+                self.assertEqual(trade['index'], expected_trade['index'])
+                self.assertEqual(trade['action'], expected_trade['action'])
+                self.assertAlmostEqual(trade['value'], expected_trade['value'])
+
+    def test_backtest_matches_per_stock(self):
+        strategy = CombinedStrategy(rule='envelope', window_size=260)
+        start_date = '2024-01-01'
+        results = strategy.backtest(['AAPL', 'MSFT'], start_date=start_date)
+        self.assertEqual(list(results.index), ['AAPL', 'MSFT'])
+        for code in results.index:
+            df = strategy.data_manager.get_stock_weekly_data(code)
+            positions = strategy.envelope_positions(df['Close'].values)
+            in_range = df.index >= start_date
+            simulation = simulate_positions(df['Close'].values[in_range], positions[in_range])
+            expected = performance_metrics(simulation['portfolio_value'])
+            self.assertAlmostEqual(results.loc[code, 'final_value'], simulation['portfolio_value'][-1])
+            self.assertAlmostEqual(results.loc[code, 'sharpe_ratio'], expected['sharpe_ratio'])
+            self.assertEqual(results.loc[code, 'num_trades'], len(simulation['trades']))
+
+    def test_regime_gate(self):
+        regime = np.array([0.0, 0.3, 1.0, np.nan])
+        envelope = np.array([1.0, 0.7, 0.3, 1.0])
+        positions = COMBINE_RULES['regime_envelope'](regime, envelope, None, 0.3)
+        np.testing.assert_allclose(positions, [0.0, 0.7, 0.3, 0.0])
+
+    def test_regime_shared_per_market(self):
+        first = self.strategy.regime_series('US')
+        self.assertIs(self.strategy.regime_series('US'), first)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import os
+import unittest
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PyQt5.QtCore import QCoreApplication
+from fast_chart import BlitCanvas, RedrawScheduler, EnvelopeCharts, autoscale, bar_verts, set_line
+
+class TestFastChart(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def make_canvas(self):
+        return FigureCanvasAgg(Figure(figsize=(4, 3)))
+
+    def test_blit_when_limits_unchanged(self):
+        canvas = self.make_canvas()
+        ax = canvas.figure.add_subplot(111)
+        blit = BlitCanvas(canvas)
+        line = blit.add(ax.plot([], [])[0])
+        blit.add(ax.title)
+        set_line(line, np.arange(10), np.arange(10.0))
+        autoscale(ax)
+        blit.update()
+        set_line(line, np.arange(10), np.arange(10.0)[::-1])
+        ax.set_title('changed')
+        autoscale(ax, keep=True)
+        blit.update()
+        self.assertEqual((blit.full_draws, blit.blits), (1, 1))
+        set_line(line, np.arange(10), np.arange(10.0) * 3)
+        autoscale(ax, keep=True)
+        blit.update()
+        self.assertEqual((blit.full_draws, blit.blits), (2, 1))
+        self.assertGreaterEqual(ax.get_ylim()[1], 27)
+        self.assertLessEqual(ax.get_ylim()[0], 0)
+        # 数据明显变小时重新计算范围, 不保留之前扩大的范围把数据压扁
+        set_line(line, np.arange(10), np.arange(10.0) / 3)
+        autoscale(ax, keep=True)
+        self.assertLess(ax.get_ylim()[1], 5)
+
+    def test_scheduler_coalesces(self):
+        calls = []
+        scheduler = RedrawScheduler(lambda: calls.append(1))
+        for _ in range(5):
+            scheduler.request()
+        self.assertEqual(calls, [])
+        QCoreApplication.processEvents()
+        self.assertEqual(calls, [1])
+
+    def test_bar_verts(self):
+        verts = bar_verts(np.array([1.0, 3.0]), np.array([2.0, np.nan]), width=1)
+        self.assertEqual(verts.shape, (2, 4, 2))
+        np.testing.assert_allclose(verts[0], [[0.5, 0], [0.5, 2], [1.5, 2], [1.5, 0]])
+        self.assertEqual(verts[1, 1, 1], 0)
+
+    def test_envelope_charts_reuse_artists(self):
+        canvases = [self.make_canvas() for _ in range(3)]
+        charts = EnvelopeCharts(canvases)
+        dates = pd.date_range('2020-01-03', periods=60, freq='W-FRI')
+        close = np.linspace(10, 20, 60)
+        window_df = pd.DataFrame({'Close': close}, index=dates)
+        volume_ratio = np.r_[np.nan, np.ones(59)]
+        stability = {'growth_scores': [(1, 0.5)], 'last_extrema_value': 1.0, 'lastvalue': 2.0, 'lastchange': 3.0,
+                     'peaks': np.array([10]), 'valleys': np.array([5, 20])}
+        charts.show(window_df, volume_ratio, ['1年: 10%'], [(stability, close), (stability, close)])
+        lines = list(canvases[1].figure.axes[0].lines)
+        charts.show(window_df, volume_ratio, ['1年: 10%'], [(stability, close), (stability, close)])
+        self.assertEqual(list(canvases[1].figure.axes[0].lines), lines)
+        self.assertEqual(charts.ax1_volume.get_ylim(), (0, 1.2))
+        self.assertEqual(len(charts.peak_markers[0].get_offsets()), 1)
+        self.assertEqual(len(charts.valley_markers[0].get_offsets()), 2)
+
+    def test_envelope_slide_blits(self):
+        canvases = [self.make_canvas() for _ in range(3)]
+        charts = EnvelopeCharts(canvases)
+        dates = pd.date_range('2020-01-03', periods=80, freq='W-FRI')
+        close = 15 + np.sin(np.arange(80) / 5)
+        stability = {'growth_scores': [(1, 0.5)], 'last_extrema_value': 1.0, 'lastvalue': 2.0, 'lastchange': 3.0,
+                     'peaks': np.array([10]), 'valleys': np.array([5, 20])}
+        for start in range(3):
+            # 窗口按周滑动: 日期变化, 长度不变
+            window = slice(start, start + 60)
+            window_df = pd.DataFrame({'Close': close[window]}, index=dates[window])
+            charts.show(window_df, np.ones(60), ['1年: 10%'],
+                        [(stability, close[window]), (stability, close[window])])
+        self.assertEqual([(c.full_draws, c.blits) for c in charts.canvases], [(1, 2)] * 3)
+        # 日期刻度标签随窗口变化
+        self.assertEqual(charts.axes[0].xaxis.get_major_formatter()(0), '2020-01-17')
+
+if __name__ == '__main__':
+    unittest.main()
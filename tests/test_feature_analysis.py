@@ -1,6 +1,6 @@
 import unittest
 import numpy as np
-from feature_analysis import FeatureAnalyzer
+from feature_analysis import FeatureAnalyzer, align_series
 from data_manager import StockDataManager
 
 class TestFeatureAnalyzer(unittest.TestCase):
@@ -20,5 +20,39 @@ class TestFeatureAnalyzer(unittest.TestCase):
         returns = self.analyzer.calculate_annualized_returns(self.test_data, years_list)
         print(returns)
 
+    def test_window_envelopes_batch(self):
+        # 批量滑动窗口包络线与逐窗口计算结果一致
+        window_size = 260
+        envelopes = self.analyzer.extract_window_envelopes(self.test_data, window_size)
+        self.assertEqual(envelopes.shape, (len(self.test_data) - window_size + 1, window_size))
+        for i in (0, 100, len(envelopes) - 1):
+            expected = self.analyzer.extract_hilbert_envelope(self.test_data[i:i + window_size])
+            np.testing.assert_allclose(envelopes[i], expected)
+
+    def test_envelope_batch_with_mask(self):
+        # 不等长序列右对齐后批量计算, 结果与单序列计算一致
+        series_list = [self.test_data, self.test_data[-300:], self.test_data[-10:]]
+        matrix, mask = align_series(series_list)
+        envelopes = self.analyzer.extract_hilbert_envelope_batch(matrix, mask)
+        np.testing.assert_allclose(envelopes[0], self.analyzer.extract_hilbert_envelope(self.test_data))
+        np.testing.assert_allclose(envelopes[1, -300:], self.analyzer.extract_hilbert_envelope(self.test_data[-300:]))
+        self.assertTrue(np.all(np.isnan(envelopes[1, :-300])))
+        # 长度不足以滤波的行返回NaN
+        self.assertTrue(np.all(np.isnan(envelopes[2])))
+
+    def test_growth_score_batch(self):
+        # 批量成长性分数与逐条计算结果一致
+        years_list = [1, 2, 3, 5]
+        series_list = [self.test_data, self.test_data[-260:], self.test_data[-400:-100]]
+        matrix, mask = align_series(series_list)
+        growth_data, extrema_list, envelopes = self.analyzer.analyze_stability_batch(matrix, years_list, mask=mask)
+        for i, series in enumerate(series_list):
+            expected, _ = self.analyzer.analyze_stability(series, years_list)
+            np.testing.assert_array_equal(extrema_list[i]['peaks'], expected['peaks'])
+            self.assertAlmostEqual(growth_data['growth_score'][i], expected['growth_score'])
+            self.assertAlmostEqual(growth_data['lastchange'][i], expected['lastchange'])
+            scores = growth_data['growth_scores'][i]
+            np.testing.assert_allclose(scores[~np.isnan(scores)], [r for _, r in expected['growth_scores']])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from backtest_kernel import simulate_positions, win_rate
+from forecast_backtest import ForecastBackTest
+from result_store import ResultStore
+
+class TestSimulatePositions(unittest.TestCase):
+    def test_full_position_tracks_price(self):
+        prices = np.array([10.0, 11.0, 12.0, 9.0, 10.0])
+        result = simulate_positions(prices, [0, 1, 1, 0, 0], initial_capital=1000)
+        np.testing.assert_allclose(result['portfolio_value'], [1000, 1000, 1000 * 12 / 11, 1000 * 9 / 11, 1000 * 9 / 11])
+        self.assertEqual([t['action'] for t in result['trades']], ['买入', '卖出'])
+        self.assertEqual(win_rate(result['trades']), 0)
+
+    def test_partial_sell(self):
+        result = simulate_positions(np.array([10.0, 10.0, 20.0]), [1, 0.5, 0.5], initial_capital=1000)
+        np.testing.assert_allclose(result['portfolio_value'], [1000, 1000, 1500])
+        self.assertEqual(win_rate(result['trades'][:1]), 0)
+
+class TestForecastBackTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.cache_dir, 'results.db'))
+        self.backtest = ForecastBackTest(step=4, store=self.store)
+        self.backtest.lookback = 200
+
+    def tearDown(self):
+        self.store.db_conn.close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_walk_forward_cached(self):
+        df = self.backtest.load_data('AAPL')
+        start_date = df.index[-10]
+        first = self.backtest.walk_forward('AAPL', 'US', start_date, df=df)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(self.store.count('AAPL'), 3)
+        # 第二次运行直接读取缓存
+        self.backtest.engine.find_patterns_and_forecast_prepared = None
+        second = self.backtest.walk_forward('AAPL', 'US', start_date, df=df)
+        np.testing.assert_allclose(first['forecast_last'].values, second['forecast_last'].values)
+
+        # 与逐日期的原始预测一致
+        end = df.index.get_loc(start_date) + 1
+        _, _, forecast_prices, _, _ = self.backtest.engine.find_patterns_and_forecast(
+            df['Close'], 'US', df['Volume'], df['Volume_Ratio'], analysis_date=start_date)
+        np.testing.assert_allclose(first['forecast_prices'].iloc[0], forecast_prices)
+        self.assertEqual(end, len(df) - 9)
+
+    def test_new_bar_keeps_cached_steps(self):
+        df = self.backtest.load_data('AAPL')
+        start_date = df.index[-16]
+        engine = self.backtest.engine
+        computed = []
+        forecast = engine.find_patterns_and_forecast_prepared
+        engine.find_patterns_and_forecast_prepared = lambda prepared, close, end: \
+            computed.append(close.index[end - 1]) or forecast(prepared, close, end)
+        # 截止到较早日期的数据(如CombinedStrategy按end_date截取)与新增K线后的完整数据共用缓存
+        before = self.backtest.walk_forward('AAPL', 'US', start_date, df=df.iloc[:-6])
+        self.assertEqual(len(computed), 3)
+        after = self.backtest.walk_forward('AAPL', 'US', start_date, df=df)
+        self.assertEqual(len(after), 4)
+        self.assertEqual(computed[3:], [after.index[-1]])
+        np.testing.assert_allclose(after['forecast_last'].values[:3], before['forecast_last'].values)
+        self.assertEqual(self.store.count('AAPL'), 4)
+        # 改写较早的K线后, 之后的步骤重新计算
+        changed = df.copy()
+        changed.iloc[-12, changed.columns.get_loc('Close')] *= 1.1
+        self.backtest.walk_forward('AAPL', 'US', start_date, df=changed)
+        self.assertEqual(computed[4:], list(after.index[1:]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from configparser import ConfigParser
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QTimer
+from import_job import ImportJob, OK, EMPTY, FAILED
+
+class FakeDataManager:
+    """按代码返回记录、None或抛出异常, 记录写入的元数据"""
+    def __init__(self, storage_path, gate=None):
+        self.config = ConfigParser()
+        self.storage_path = storage_path
+        self.gate = gate
+        self.records = []
+        self.fetched = []
+
+    def fetch_symbol(self, code, market, start_date=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.fetched.append(code)
+        if code.startswith('BAD'):
+            raise ValueError('network error')
+        if code.startswith('NONE'):
+            return None
+        return (code, market, '2005-01-01', '2025-01-01', 'now', code)
+
+    def record_download(self, record):
+        # 元数据库只能在GUI线程写
+        assert threading.current_thread() is threading.main_thread()
+        self.records.append(record)
+
+class TestImportJob(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.events = []
+        self.finished = []
+
+    def tearDown(self):
+        self.job.shutdown()
+        shutil.rmtree(self.tmp_dir)
+
+    def make_job(self, gate=None):
+        self.data_mgr = FakeDataManager(self.tmp_dir, gate)
+        self.job = ImportJob(self.data_mgr, workers=2)
+        self.job.symbol_done.connect(lambda *args: self.events.append(args))
+        self.job.finished.connect(self.finished.append)
+
+    def wait_finished(self, timeout_ms=10000):
+        loop = QEventLoop()
+        self.job.finished.connect(loop.quit)
+        QTimer.singleShot(timeout_ms, loop.quit)
+        if self.job.running:
+            loop.exec_()
+
+    def test_statuses_and_resume_failed(self):
+        self.make_job()
+        progress = []
+        self.job.progress.connect(lambda done, total, rate: progress.append((done, total)))
+        self.job.start(['AAA', 'NONE1', 'BAD1', 'BBB'], 'US')
+        self.wait_finished()
+        self.assertEqual(self.finished, [False])
+        statuses = {code: status for code, status, _ in self.events}
+        self.assertEqual(statuses, {'AAA': OK, 'NONE1': EMPTY, 'BAD1': FAILED, 'BBB': OK})
+        self.assertEqual(sorted(r[0] for r in self.data_mgr.records), ['AAA', 'BBB'])
+        self.assertEqual(progress[-1], (4, 4))
+        # 失败的股票留待继续导入
+        self.assertEqual(self.job.pending_state()['remaining'], ['BAD1'])
+        self.assertTrue(self.job.resume())
+        self.wait_finished()
+        self.assertEqual(self.data_mgr.fetched.count('BAD1'), 2)
+
+    def test_cancel_keeps_remaining(self):
+        gate = threading.Event()
+        self.make_job(gate)
+        self.job.start(['C1', 'C2', 'C3', 'C4', 'C5'], 'US')
+        self.job.cancel()
+        self.assertFalse(self.job.running)
+        self.assertEqual(self.finished, [True])
+        gate.set()
+        # 已取消批次的迟到结果被丢弃
+        loop = QEventLoop()
+        QTimer.singleShot(300, loop.quit)
+        loop.exec_()
+        self.assertEqual(self.data_mgr.records, [])
+        state = self.job.pending_state()
+        self.assertEqual(state['market'], 'US')
+        self.assertEqual(state['remaining'], ['C1', 'C2', 'C3', 'C4', 'C5'])
+
+        self.job.resume()
+        self.wait_finished()
+        self.assertEqual(self.finished, [True, False])
+        self.assertEqual(sorted(r[0] for r in self.data_mgr.records), ['C1', 'C2', 'C3', 'C4', 'C5'])
+        self.assertIsNone(self.job.pending_state())
+
+    def test_new_batch_keeps_pending_batch(self):
+        gate = threading.Event()
+        self.make_job(gate)
+        self.job.start(['C1', 'C2', 'C3'], 'US')
+        self.job.cancel()
+        gate.set()
+        # 取消批量导入后单独导入一只, 批量导入的未完成部分仍可继续
+        self.job.start(['HK1', 'C2'], 'HK')
+        self.wait_finished()
+        self.assertEqual(self.job.pending_state()['remaining'], ['C1', 'C2', 'C3'])
+        self.job.start(['C3'], 'US')
+        self.wait_finished()
+        # 同一市场已经导入的股票从未完成批次中移除
+        self.assertEqual(self.job.pending_state()['remaining'], ['C1', 'C2'])
+        self.assertTrue(self.job.resume())
+        self.wait_finished()
+        self.assertIsNone(self.job.pending_state())
+        self.assertEqual(sorted(r[0] for r in self.data_mgr.records if r[1] == 'US'), ['C1', 'C2', 'C3'])
+
+if __name__ == '__main__':
+    unittest.main()
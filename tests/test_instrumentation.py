@@ -0,0 +1,44 @@
+import os
+import json
+import tempfile
+import unittest
+import instrumentation
+from instrumentation import profiler, span, timed
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        profiler.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        profiler.reset()
+
+    def test_disabled_records_nothing(self):
+        instrumentation.disable()
+        with span('stage'):
+            pass
+        timed('func')(lambda: 1)()
+        self.assertEqual(profiler.stats, {})
+
+    def test_counts_and_trace(self):
+        instrumentation.enable(trace=True)
+        add = timed('add')(lambda a, b: a + b)
+        for i in range(3):
+            with span('outer'):
+                self.assertEqual(add(i, 1), i + 1)
+        report = json.loads(profiler.report('json'))
+        self.assertEqual(report['add']['count'], 3)
+        self.assertEqual(report['outer']['count'], 3)
+        self.assertEqual(sum(report['add']['histogram_us'].values()), 3)
+        self.assertIn('outer', profiler.report())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'trace.json')
+            profiler.write_chrome_trace(path)
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+        self.assertEqual(len(events), 6)
+        self.assertTrue(all(e['ph'] == 'X' for e in events))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from lod import LodSeries, minmax_indices, plot_lod
+
+class TestLod(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.y = np.cumsum(rng.normal(size=6000))
+        self.x = np.arange(6000.0)
+
+    def test_minmax_indices(self):
+        y = np.array([3.0, 1.0, 2.0, 5.0, np.nan, np.nan, 4.0])
+        self.assertEqual(list(minmax_indices(y, 2)), [0, 1, 2, 3, 4, 6])
+        self.assertEqual(list(minmax_indices(y, 4)), [0, 1, 3, 6])
+
+    def test_levels_preserve_extrema_and_keep(self):
+        keep = [17, 4001]
+        series = LodSeries(self.x, self.y, keep=keep)
+        for bucket, indices in series.levels[1:]:
+            selected = self.y[indices]
+            self.assertEqual(selected.max(), self.y.max())
+            self.assertEqual(selected.min(), self.y.min())
+            self.assertTrue(set(keep) <= set(indices))
+            self.assertEqual(indices[0], 0)
+            self.assertEqual(indices[-1], len(self.y) - 1)
+            # 每个桶内的最小/最大值都保留
+            for start in range(0, len(self.y), bucket * 97):
+                block = self.y[start:start + bucket]
+                self.assertIn(block.max(), selected)
+
+    def test_select_by_pixels_and_range(self):
+        series = LodSeries(self.x, self.y)
+        full = series.select(pixels=700)
+        self.assertLessEqual(len(full), 4 * 700)
+        self.assertGreaterEqual(len(full), 700)
+        # 放大到小范围时回到原始数据
+        zoomed = series.select(1000, 1300, pixels=700)
+        np.testing.assert_array_equal(zoomed, np.arange(999, 1302))
+        # 短序列不降采样
+        short = LodSeries(self.x[:300], self.y[:300])
+        self.assertEqual(len(short.select(pixels=100)), 300)
+
+    def test_plot_lod_dates_and_zoom(self):
+        fig = Figure(figsize=(6, 3), dpi=100)
+        ax = fig.add_subplot(111)
+        dates = pd.date_range('2000-01-03', periods=len(self.y), freq='B')
+        line = plot_lod(ax, dates, self.y, label='收盘价')
+        self.assertLess(len(line.get_xdata()), len(self.y))
+        ylim = ax.get_ylim()
+        self.assertLessEqual(ylim[0], self.y.min())
+        self.assertGreaterEqual(ylim[1], self.y.max())
+        # 缩放后按可见范围重新选择, 可见部分为原始数据
+        x = line._lod_series.x
+        ax.set_xlim(x[100], x[200])
+        np.testing.assert_array_equal(line.get_ydata(), self.y[99:202])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import unittest
+import numpy as np
+import pandas as pd
+from memory_profile import MemoryProfiler, MemoryBudgetExceeded, memory_profiler, memory_stage
+from envelope_strategy import EnvelopeStrategy
+
+class TestMemoryProfile(unittest.TestCase):
+    def setUp(self):
+        self.profiler = MemoryProfiler(top=5)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_disabled_is_noop(self):
+        with self.profiler.stage('idle') as stage:
+            data = np.ones(100000)
+        del data
+        self.assertIsNone(stage.entry)
+        self.assertEqual(self.profiler.stages, [])
+        self.assertFalse(memory_profiler.enabled)
+        with memory_stage('idle'):
+            pass
+        self.assertEqual(memory_profiler.stages, [])
+
+    def test_stage_records_allocation(self):
+        self.profiler.start()
+        with self.profiler.stage('alloc') as stage:
+            data = np.ones(2**20)
+        self.assertGreaterEqual(stage.entry['peak_mb'], 7.9)
+        self.assertGreaterEqual(stage.entry['allocated_mb'], 7.9)
+        self.assertGreater(stage.entry['top'][0]['size_diff_kb'], 8000)
+        self.assertEqual(json.loads(self.profiler.report('json'))[0]['stage'], 'alloc')
+        self.assertIn('alloc', self.profiler.report())
+        del data
+
+    def test_budget_exceeded(self):
+        self.profiler.start(budget_mb=1)
+        with self.assertRaises(MemoryBudgetExceeded):
+            with self.profiler.stage('big'):
+                data = np.ones(2**20)
+        del data
+        with self.profiler.stage('small'):
+            small = np.ones(10)
+        self.assertEqual(small.sum(), 10)
+        self.assertEqual([entry['stage'] for entry in self.profiler.stages], ['big', 'small'])
+
+    def test_nested_stage_keeps_outer_peak(self):
+        self.profiler.start()
+        with self.profiler.stage('outer') as outer:
+            # 外层阶段先有32MB的临时分配, 随后进入内层阶段
+            data = np.ones(2**22)
+            del data
+            with self.profiler.stage('inner') as inner:
+                small = np.ones(2**17)
+            with self.profiler.stage('inner2') as inner2:
+                data = np.ones(2**21)
+                del data
+        self.assertEqual([entry['stage'] for entry in self.profiler.stages], ['inner', 'inner2', 'outer'])
+        self.assertGreaterEqual(outer.entry['peak_mb'], 31.9)
+        self.assertLess(inner.entry['peak_mb'], 2)
+        self.assertGreaterEqual(inner2.entry['peak_mb'], 15.9)
+        self.assertLess(inner2.entry['peak_mb'], 31.9)
+        self.assertEqual(self.profiler.active, [])
+        del small
+
+    def test_nested_stage_budget(self):
+        # 超出预算的分配发生在内层阶段之前, 外层阶段仍然失败
+        self.profiler.start(budget_mb=16)
+        with self.assertRaises(MemoryBudgetExceeded):
+            with self.profiler.stage('outer'):
+                data = np.ones(2**22)
+                del data
+                with self.profiler.stage('inner'):
+                    pass
+        self.assertEqual(self.profiler.stages[-1]['stage'], 'outer')
+
+    def test_signals_without_history(self):
+        """keep_history=False只保留最后一组包络和极值, 信号与完整历史一致"""
+        rng = np.random.default_rng(0)
+        dates = pd.date_range('2015-01-02', periods=560, freq='W-FRI')
+        df = pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.03, 560)))}, index=dates)
+        strategy = EnvelopeStrategy()
+        full = strategy.generate_signals('SYN', 'US', df=df)
+        compact = strategy.generate_signals('SYN', 'US', df=df, keep_history=False)
+        pd.testing.assert_frame_equal(full[0], compact[0])
+        self.assertEqual(len(compact[1]), 1)
+        self.assertEqual(len(compact[2]), 1)
+        np.testing.assert_array_equal(full[1][-1], compact[1][0])
+
+if __name__ == '__main__':
+    unittest.main()
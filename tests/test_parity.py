@@ -0,0 +1,21 @@
+import unittest
+import numpy as np
+from benchmark import synthetic_weekly
+from parity import compare_arrays, run_parity, check_extrema_batch
+
+class TestParity(unittest.TestCase):
+    def test_compare_arrays(self):
+        self.assertIsNone(compare_arrays([1.0, np.nan], [1.0 + 1e-12, np.nan], rtol=1e-9))
+        self.assertIn('首个位置1', compare_arrays([1.0, 2.0], [1.0, 2.1], rtol=1e-9))
+        self.assertIn('形状不同', compare_arrays([1.0], [1.0, 2.0]))
+
+    def test_synthetic_corpus_matches(self):
+        corpus = [('synthetic:0', synthetic_weekly(520, 0))]
+        self.assertEqual(run_parity(['envelope_batch', 'extrema_batch', 'growth_batch'], corpus=corpus), [])
+
+    def test_repro_case(self):
+        df = synthetic_weekly(520, 1)
+        self.assertEqual(check_extrema_batch(df, 'synthetic:1', {'start': 17}), [])
+
+if __name__ == '__main__':
+    unittest.main()
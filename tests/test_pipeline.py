@@ -0,0 +1,179 @@
+import os
+import shutil
+import tempfile
+import unittest
+from configparser import ConfigParser
+import cli
+import pandas as pd
+from pipeline import Pipeline, Stage, STAGES, file_version
+
+data_dir = None
+calls = []
+crash_after = [None]
+
+def source_version(pipeline, code):
+    return file_version(os.path.join(data_dir, f'{code}.csv'))
+
+def double(code, market):
+    calls.append(('double', code))
+    if crash_after[0] is not None and len(calls) > crash_after[0]:
+        raise KeyboardInterrupt
+    with open(os.path.join(data_dir, f'{code}.csv')) as f:
+        value = float(f.read().splitlines()[-1].split(',')[1])
+    if value < 0:
+        raise ValueError('negative')
+    return {'value': value * 2}, None
+
+def square(code, market):
+    return {'value': float(os.path.basename(code)[1:]) ** 2}, None
+
+def total(pipeline, inputs):
+    calls.append(('total', '*'))
+    return {'sum': sum(row['value'] for row in inputs.values())}, None
+
+def make_stages():
+    return [
+        Stage('load', None, due=lambda pipeline, code: False, current=source_version),
+        Stage('double', double, deps=['load'], params=lambda config: dict(config['Double'])),
+        Stage('total', total, deps=['double'], per_symbol=False),
+        Stage('square', square, deps=['load']),
+    ]
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        global data_dir
+        data_dir = tempfile.mkdtemp()
+        calls.clear()
+        crash_after[0] = None
+        self.config = ConfigParser()
+        self.config.read_dict({'Double': {'factor': '2'}})
+        self.codes = [(f'S{i}', 'US') for i in range(4)]
+        for code, _ in self.codes:
+            self.write(code, int(code[1:]) + 1)
+
+    def tearDown(self):
+        shutil.rmtree(data_dir)
+
+    def write(self, code, value, date='2024-01-05'):
+        with open(os.path.join(data_dir, f'{code}.csv'), 'w') as f:
+            f.write(f'Date,Close\n2024-01-01,1\n{date},{value}\n')
+
+    def pipeline(self, workers=1):
+        return Pipeline(make_stages(), os.path.join(data_dir, 'state.db'), workers=workers, config=self.config)
+
+    def test_incremental(self):
+        counts = self.pipeline().run(self.codes)
+        self.assertEqual(counts['double']['computed'], 4)
+        self.assertEqual(counts['total']['computed'], 1)
+        self.assertEqual(self.pipeline().outputs('total', {'*'})['*']['sum'], (1 + 2 + 3 + 4) * 2)
+
+        # 输入未变: 全部跳过
+        calls.clear()
+        counts = self.pipeline().run(self.codes)
+        self.assertEqual(calls, [])
+        self.assertEqual(counts['double']['skipped'], 4)
+
+        # 只有一只股票的数据变化: 只重算该股票和汇总
+        self.write('S2', 10, '2024-01-12')
+        counts = self.pipeline().run(self.codes)
+        self.assertEqual(calls, [('double', 'S2'), ('total', '*')])
+        self.assertEqual(self.pipeline().state('double', 'S2')[0], '2024-01-12')
+        self.assertEqual(self.pipeline().outputs('total', {'*'})['*']['sum'], (1 + 2 + 10 + 4) * 2)
+
+        # 参数变化: 该阶段及下游全部重算, 不依赖它的阶段不受影响
+        calls.clear()
+        self.config['Double']['factor'] = '3'
+        counts = self.pipeline().run(self.codes)
+        self.assertEqual(counts['double']['computed'], 4)
+        self.assertEqual(counts['square']['skipped'], 4)
+        # 结果与之前相同时汇总不必重算
+        self.assertEqual(counts['total']['skipped'], 1)
+
+    def test_failure_blocks_only_that_symbol(self):
+        self.write('S1', -1)
+        counts = self.pipeline().run(self.codes)
+        self.assertEqual(counts['double']['failed'], 1)
+        self.assertEqual(counts['double']['computed'], 3)
+        self.assertEqual(self.pipeline().state('double', 'S1')[4], 'failed')
+        self.write('S1', 5)
+        calls.clear()
+        self.pipeline().run(self.codes)
+        self.assertEqual(calls, [('double', 'S1'), ('total', '*')])
+
+    def test_resume_after_crash(self):
+        crash_after[0] = 2
+        with self.assertRaises(KeyboardInterrupt):
+            self.pipeline().run(self.codes)
+        self.assertIsNone(self.pipeline().last_run()[2])
+        crash_after[0] = None
+        calls.clear()
+        counts = self.pipeline().run(self.codes)
+        # 崩溃前完成的两只不再重算
+        self.assertEqual(counts['double']['computed'], 2)
+        self.assertEqual(counts['double']['skipped'], 2)
+        self.assertIsNotNone(self.pipeline().last_run()[2])
+
+    def test_parallel_processes(self):
+        counts = self.pipeline(workers=2).run(self.codes)
+        self.assertEqual(counts['double']['computed'], 4)
+        self.assertEqual(self.pipeline().outputs('total', {'*'})['*']['sum'], (1 + 2 + 3 + 4) * 2)
+
+    def test_plan(self):
+        pipeline = self.pipeline()
+        self.assertEqual([stage.name for stage in pipeline.plan(['total'])], ['load', 'double', 'total'])
+        with self.assertRaises(ValueError):
+            pipeline.plan(['missing'])
+        counts = pipeline.run(self.codes, targets=['square'])
+        self.assertEqual(set(counts), {'load', 'square'})
+
+class TestPipelineStages(unittest.TestCase):
+    """真实的resample/forecast/backtest阶段: 历史K线被改写(复权)后必须重新计算, 不能取回旧缓存"""
+    def setUp(self):
+        from data_manager import StockDataManager
+        from envelope_strategy import EnvelopeStrategy
+        from result_store import ResultStore
+        self.tmp_dir = tempfile.mkdtemp()
+        self.saved = dict(cli._worker_objects)
+        data_mgr = StockDataManager()
+        # 最近8年的数据, 缩短测试时间
+        daily = data_mgr.get_stock_data('600036').iloc[-2000:]
+        data_mgr.storage_path = self.tmp_dir
+        daily.to_csv(os.path.join(self.tmp_dir, '600036_daily.csv'))
+        data_mgr.resample_weekly(daily).to_csv(os.path.join(self.tmp_dir, '600036_weekly.csv'))
+        strategy = EnvelopeStrategy()
+        strategy.data_manager = data_mgr
+        cli._worker_objects.clear()
+        cli._worker_objects.update({'data_mgr': data_mgr, 'envelope': strategy,
+                                    'store': ResultStore(os.path.join(self.tmp_dir, 'results.db'))})
+
+    def tearDown(self):
+        cli._worker_objects['store'].db_conn.close()
+        cli._worker_objects.clear()
+        cli._worker_objects.update(self.saved)
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pipeline(self):
+        pipeline = Pipeline(STAGES, os.path.join(self.tmp_dir, 'state.db'), output_dir=self.tmp_dir)
+        counts = pipeline.run([('600036', 'A-SH')], targets=['forecast', 'backtest'], skip=['update'])
+        return counts, pipeline.outputs('forecast', {'600036'}), pipeline.outputs('backtest', {'600036'})
+
+    def test_past_bar_change_recomputes(self):
+        _, forecast, backtest = self.run_pipeline()
+        # 复权: 一年前之前的日线全部按比例调整, 最后一根不变
+        path = os.path.join(self.tmp_dir, '600036_daily.csv')
+        daily = pd.read_csv(path, index_col=0, parse_dates=True)
+        past = daily.index < daily.index[-1] - pd.Timedelta(days=730)
+        daily.loc[past, ['Open', 'High', 'Low', 'Close']] *= 0.7
+        daily.to_csv(path)
+
+        counts, new_forecast, new_backtest = self.run_pipeline()
+        self.assertEqual(counts['forecast']['computed'], 1)
+        self.assertEqual(counts['backtest']['computed'], 1)
+        self.assertNotEqual(new_backtest['600036'], backtest['600036'])
+        # 与不使用缓存直接计算的结果一致
+        expected = cli.backtest_symbol(('envelope', '600036', 'A-SH', None, None, 100000), refresh=True)
+        self.assertAlmostEqual(new_backtest['600036']['final_value'], expected['final_value'])
+        self.assertEqual(new_forecast['600036']['last_close'], forecast['600036']['last_close'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import warnings
+import numpy as np
+import pandas as pd
+from portfolio_backtest import TopNBackTest, momentum_scores
+
+class TestTopNBackTest(unittest.TestCase):
+    def setUp(self):
+        dates = pd.date_range('2020-01-03', periods=120, freq='W-FRI')
+        t = np.arange(120)
+        self.panel = pd.DataFrame({
+            'UP': 10 * 1.01 ** t,
+            'FLAT': np.full(120, 10.0),
+            'DOWN': 10 * 0.99 ** t,
+        }, index=dates)
+
+    def test_single_holding_tracks_price(self):
+        # topn=1时组合价值与持有的股票同比例变化
+        backtest = TopNBackTest(momentum_scores, topn=1, dropk=1, rebalance_period=4, cost_rate=0)
+        results = backtest.run(self.panel, start_date='2020-07-03')
+        start = self.panel.index.get_loc(pd.Timestamp('2020-07-03'))
+        expected = 100000 * self.panel['UP'].values[start:] / self.panel['UP'].values[start]
+        np.testing.assert_allclose(results['portfolio_value'], expected)
+        self.assertTrue(all(codes == ['UP'] for _, codes in results['holdings']))
+        # 只有首次建仓产生换手
+        self.assertAlmostEqual(results['turnover'][0], 0.5)
+        self.assertTrue(np.allclose(results['turnover'][1:], 0))
+
+    def test_dropk_limits_replacements(self):
+        backtest = TopNBackTest(lambda prices, idx: -momentum_scores(prices, idx), topn=2, dropk=1,
+                                rebalance_period=4, cost_rate=0.001)
+        results = backtest.run(self.panel, start_date='2020-07-03')
+        self.assertEqual(sorted(results['holdings'][-1][1]), ['DOWN', 'FLAT'])
+        self.assertEqual(len(results['portfolio_value']), len(results['dates']))
+
+    def test_benchmark_before_listing(self):
+        # 回测开始时还没有股票上市: 基准保持不变, 不产生RuntimeWarning
+        panel = self.panel.copy()
+        panel.iloc[:40] = np.nan
+        backtest = TopNBackTest(momentum_scores, topn=1, dropk=1, rebalance_period=4, cost_rate=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            results = backtest.run(panel, start_date='2020-03-06')
+        start = panel.index.get_loc(pd.Timestamp('2020-03-06'))
+        self.assertTrue(np.all(results['benchmark_value'][:40 - start] == 100000))
+        # 上市后按等权每周再平衡
+        expected = 100000 * np.prod(1 + panel.pct_change().iloc[41:].mean(axis=1).values)
+        self.assertAlmostEqual(results['benchmark_value'][-1], expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import threading
+import unittest
+from prefetch import Prefetcher
+
+class TestPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def compute(self, code):
+        self.gate.wait(5)
+        self.calls.append(code)
+        if code == 'BAD':
+            raise ValueError('no data')
+        return code.lower()
+
+    def test_prefetch_and_lru(self):
+        prefetcher = Prefetcher(self.compute, capacity=3)
+        prefetcher.request(['A', 'B', 'BAD', 'C', 'A'])
+        self.assertTrue(prefetcher.wait_idle(5))
+        self.assertEqual(self.calls, ['A', 'B', 'BAD', 'C'])
+        self.assertEqual(prefetcher.get('B'), 'b')
+        self.assertIsNone(prefetcher.get('BAD'))
+        # 已缓存的不重复计算, 超出容量时淘汰最久未用的
+        prefetcher.request(['B', 'D'])
+        self.assertTrue(prefetcher.wait_idle(5))
+        self.assertEqual(self.calls[-1], 'D')
+        self.assertIsNone(prefetcher.get('A'))
+        self.assertEqual(prefetcher.get('C'), 'c')
+
+    def test_new_request_replaces_queue(self):
+        prefetcher = Prefetcher(self.compute)
+        self.gate.clear()
+        prefetcher.request(['A', 'B', 'C'])
+        # A正在计算时选择跳到别处, B和C不再计算
+        while prefetcher.get('A', wait_running=False) is None and not prefetcher._running:
+            pass
+        prefetcher.request(['X'])
+        self.gate.set()
+        # 等待正在计算的A完成后取得结果
+        self.assertEqual(prefetcher.get('A'), 'a')
+        self.assertTrue(prefetcher.wait_idle(5))
+        self.assertEqual(self.calls, ['A', 'X'])
+
+if __name__ == '__main__':
+    unittest.main()
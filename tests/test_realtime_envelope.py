@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from feature_analysis import FeatureAnalyzer
+from realtime_envelope import EnvelopeStreamRegistry
+from data_manager import StockDataManager
+
+class TestRealtimeEnvelope(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = FeatureAnalyzer()
+        self.data_mgr = StockDataManager()
+        self.test_data = self.data_mgr.get_stock_weekly_data('AAPL').iloc[-520:]['Close'].values
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.state_file = os.path.join(self.tmp_dir, 'state.json')
+
+    def test_incremental_matches_batch(self):
+        # 逐根追加的因果包络线与整段计算一致
+        registry = EnvelopeStreamRegistry(state_file=self.state_file, lag=0)
+        values = [registry.append('AAPL', p)['envelope'] for p in self.test_data]
+        np.testing.assert_allclose(values, self.analyzer.extract_causal_envelope(self.test_data))
+
+    def test_state_persistence(self):
+        # 保存状态后在新实例中继续追加, 结果与不中断一致
+        registry = EnvelopeStreamRegistry(state_file=self.state_file, lag=4)
+        registry.warm_up('AAPL', self.test_data[:300])
+        registry.save()
+        restored = EnvelopeStreamRegistry(state_file=self.state_file, lag=4)
+        restored.load()
+        expected = EnvelopeStreamRegistry(state_file=self.state_file, lag=4)
+        expected.warm_up('AAPL', self.test_data[:300])
+        for price in self.test_data[300:]:
+            a = restored.append('AAPL', price)
+            b = expected.append('AAPL', price)
+            self.assertAlmostEqual(a['envelope'], b['envelope'])
+            self.assertEqual(a['smoothed'], b['smoothed'])
+            self.assertEqual(a['extrema'], b['extrema'])
+
+    def test_streaming_extrema(self):
+        # 流式检测器在清晰的周期信号上找到与find_extrema_in_envelope相同的极值点
+        t = np.arange(400)
+        envelope = 100 + 30 * np.sin(2 * np.pi * t / 52)
+        expected = self.analyzer.find_extrema_in_envelope(envelope)
+        events = self.analyzer.create_extrema_detector().update_many(envelope)
+        peaks = [i for kind, i, _ in events if kind == 'peak']
+        valleys = [i for kind, i, _ in events if kind == 'valley']
+        np.testing.assert_array_equal(peaks, expected['peaks'])
+        np.testing.assert_array_equal(valleys, expected['valleys'][:len(valleys)])
+
+if __name__ == '__main__':
+    unittest.main()
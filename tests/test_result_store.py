@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from result_store import ResultStore, data_version, pack, unpack
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = ResultStore(os.path.join(self.tmp_dir, 'results.db'))
+        dates = pd.date_range('2024-01-05', periods=10, freq='W-FRI')
+        self.df = pd.DataFrame({'Close': np.arange(10, 20, dtype=float)}, index=dates)
+
+    def tearDown(self):
+        self.store.db_conn.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        result = {
+            'prices': self.df['Close'],
+            'best_matches': [(1.5, 3), (float('inf'), -1)],
+            'trades': pd.DataFrame({'action': ['买入', '卖出'], 'value': [1.0, 2.0]}),
+            'dates': self.df.index,
+            'win_rate': np.float64(0.5),
+        }
+        restored = unpack(pack(result))
+        pd.testing.assert_series_equal(restored['prices'], result['prices'])
+        self.assertEqual(restored['best_matches'], result['best_matches'])
+        pd.testing.assert_frame_equal(restored['trades'], result['trades'])
+        self.assertTrue(restored['dates'].equals(result['dates']))
+        self.assertEqual(restored['win_rate'], 0.5)
+
+    def test_get_or_compute_and_evict_stale(self):
+        version = data_version(self.df)
+        calls = []
+        compute = lambda: calls.append(1) or {'value': np.arange(3)}
+        self.store.get_or_compute('AAPL', version, 'test', {'a': 1}, compute)
+        cached = self.store.get_or_compute('AAPL', version, 'test', {'a': 1}, compute)
+        self.assertEqual(len(calls), 1)
+        np.testing.assert_array_equal(cached['value'], np.arange(3))
+
+        # 数据更新后旧版本结果被清除
+        new_df = pd.concat([self.df, pd.DataFrame({'Close': [21.0]}, index=[self.df.index[-1] + pd.Timedelta(weeks=1)])])
+        self.store.put('AAPL', data_version(new_df), 'test', {'a': 1}, {'value': 1})
+        self.assertIsNone(self.store.get('AAPL', version, 'test', {'a': 1}))
+        self.assertEqual(self.store.count('AAPL'), 1)
+
+    def test_version_changes_with_past_bars(self):
+        version = data_version(self.df)
+        self.store.put('AAPL', version, 'test', {'a': 1}, {'value': 1})
+        # 复权后历史K线改变, 最后一根不变
+        adjusted = self.df.copy()
+        adjusted.iloc[2, 0] *= 0.98
+        new_version = data_version(adjusted)
+        self.assertNotEqual(new_version, version)
+        self.assertTrue(new_version.startswith(self.df.index[-1].strftime('%Y-%m-%d')))
+        self.assertIsNone(self.store.get('AAPL', new_version, 'test', {'a': 1}))
+        self.assertEqual(data_version(self.df['Close']), version)
+
+if __name__ == '__main__':
+    unittest.main()
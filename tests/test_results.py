@@ -0,0 +1,65 @@
+import pickle
+import unittest
+import numpy as np
+import pandas as pd
+import results
+from feature_analysis import FeatureAnalyzer
+from results import BacktestResult, ForecastResult
+from result_store import pack, unpack
+
+class TestResults(unittest.TestCase):
+    def test_growth_result_dict_compat(self):
+        t = np.arange(520)
+        prices = 100 * np.exp(0.002 * t) * (1 + 0.2 * np.sin(2 * np.pi * t / 52))
+        result, envelope = FeatureAnalyzer().analyze_stability(prices, [1, 2, 5])
+        self.assertIn('peaks_rate', result)
+        self.assertEqual(len(result['peaks_len']) + len(result['valleys_len']), len(result.bounds) - 1)
+        self.assertIs(result['envelope'], envelope)
+        # 派生结果缓存不参与序列化
+        result['peaks_rate']
+        restored = pickle.loads(pickle.dumps(result))
+        self.assertIsNone(restored._cache)
+        np.testing.assert_allclose(restored['peaks_rate'], result['peaks_rate'])
+
+    def test_backtest_result_views(self):
+        dates = pd.date_range('2024-01-05', periods=12, freq='W-FRI')
+        weekly = pd.DataFrame({'Close': np.arange(10, 22, dtype=float)}, index=dates)
+        df = weekly.iloc[:10]
+        result = BacktestResult('T', 'US', 100, 110, 0.1, 0.1, 0.9, 0.9, -0.1, 1.0, 2, 1.0,
+                                np.linspace(100, 110, 6), np.ones(6), pd.DataFrame(), pd.DataFrame(),
+                                np.zeros(10), {}, {}, df=df, start=4)
+        self.assertTrue(np.shares_memory(result['backtest_prices'], df['Close'].values))
+        self.assertTrue(result['backtest_dates'].equals(dates[4:10]))
+        self.assertEqual(result.keys()[-1], 'backtest_prices')
+        self.assertNotIn('_cache', result)
+
+        # df按引用序列化, 还原时重新读取周线数据并截取回测使用的区间
+        loaded = []
+        def loader(symbol):
+            loaded.append(symbol)
+            return weekly
+        self.addCleanup(setattr, results, 'frame_loader', results.frame_loader)
+        results.frame_loader = loader
+        self.assertNotIsInstance(result.to_payload()['df'], pd.DataFrame)
+        for restored in (unpack(pack(result)), pickle.loads(pickle.dumps(result))):
+            np.testing.assert_array_equal(restored['backtest_prices'], np.arange(14, 20))
+            self.assertTrue(restored['dates'].equals(dates[:10]))
+        self.assertEqual(loaded, ['T', 'T'])
+
+        # 历史K线被改写后不能还原为过期的结果
+        payload = pack(result)
+        weekly = weekly.copy()
+        weekly.iloc[2, 0] = 0.5
+        with self.assertRaises(ValueError):
+            unpack(payload)
+
+    def test_forecast_result_unpacks_like_tuple(self):
+        before = pd.Series([1.0, 2.0])
+        result = ForecastResult([(0.5, 3)], np.array([0.1]), np.array([2.2]), np.array([]), before)
+        best_matches, forecast_returns, forecast_prices, real_prices, before_prices = result
+        self.assertEqual(best_matches, [(0.5, 3)])
+        self.assertIs(result[4], before)
+        self.assertAlmostEqual(result.expected_return, 0.1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+import numpy as np
+import pandas as pd
+from robustness import RobustnessTest, block_bootstrap, make_paths
+
+class TestRobustness(unittest.TestCase):
+    def test_block_bootstrap_keeps_blocks(self):
+        returns = np.arange(100, dtype=float)
+        sampled = block_bootstrap(returns, 5, 30, block_size=8, rng=np.random.default_rng(1))
+        self.assertEqual(sampled.shape, (5, 30))
+        # 块内连续
+        self.assertTrue((np.diff(sampled[:, :8], axis=1) == 1).all())
+
+    def test_random_start_paths(self):
+        prices = np.arange(1, 201, dtype=float)
+        paths = make_paths(prices, 10, 50, mode='random_start', rng=np.random.default_rng(2))
+        self.assertTrue((np.diff(paths, axis=1) == 1).all())
+
+    def test_pool_matches_serial(self):
+        t = np.arange(600)
+        prices = 100 * np.exp(0.002 * t) * (1 + 0.2 * np.sin(2 * np.pi * t / 52))
+        serial = RobustnessTest(runs=8, horizon=60, workers=1, seed=3).run(prices, chunk_size=4)
+        pooled = RobustnessTest(runs=8, horizon=60, workers=2, seed=3).run(prices, chunk_size=4)
+        self.assertEqual(len(serial), 8)
+        pd.testing.assert_frame_equal(serial, pooled)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+import pandas as pd
+from screener import StockScreener
+from feature_analysis import FeatureAnalyzer
+from memory_profile import memory_profiler
+
+class TestStockScreener(unittest.TestCase):
+    def setUp(self):
+        self.screener = StockScreener()
+        self.analyzer = FeatureAnalyzer()
+
+    def test_metrics_match_single_stock(self):
+        table = self.screener.screen(market='US')
+        self.assertIn('AAPL', table.index)
+        close = self.screener.data_mgr.get_stock_weekly_data('AAPL')['Close'].values[-self.screener.lookback:]
+        years_list = self.screener.years_list
+        returns = dict(self.analyzer.calculate_annualized_returns(close, years_list))
+        stability, _ = self.analyzer.analyze_stability(close, years_list)
+        row = table.loc['AAPL']
+        for years, value in returns.items():
+            self.assertAlmostEqual(row[f'return_{years}y'], value)
+        for years, value in stability['growth_scores']:
+            self.assertAlmostEqual(row[f'growth_{years}y'], value)
+
+    def test_filters(self):
+        table = self.screener.screen(filters={'return_1y': (0, None), 'market': ['HK', 'US']})
+        self.assertTrue((table['return_1y'] >= 0).all())
+        self.assertTrue(table['market'].isin(['HK', 'US']).all())
+
+    def test_batches(self):
+        table = self.screener.screen(market='US')
+        self.screener.batch_size = 3
+        memory_profiler.start()
+        self.addCleanup(memory_profiler.stop)
+        self.addCleanup(memory_profiler.reset)
+        batched = self.screener.screen(market='US')
+        pd.testing.assert_frame_equal(batched, table)
+        # 每批记录一个阶段, 读取和计算阶段嵌套在其中
+        stages = [entry['stage'] for entry in memory_profiler.stages]
+        batch_stages = [name for name in stages if name.startswith('screen_batch')]
+        self.assertEqual(len(batch_stages), -(-len(self.screener.get_codes('US')) // 3))
+        self.assertEqual(stages[:3], ['load_closes', 'compute_metrics', 'screen_batch[0:3]'])
+
+    def test_bellwether_stock(self):
+        table = self.screener.screen(market='US')
+        bellwether = self.screener.find_bellwether_stock(market='US', years=3, top=5)
+        self.assertEqual(len(bellwether), min(5, len(table)))
+        self.assertTrue(set(bellwether.index) <= set(table.index))
+        self.assertEqual(list(bellwether.columns), list(table.columns) + ['score'])
+        self.assertTrue((bellwether['market'] == 'US').all())
+        self.assertTrue(bellwether['score'].is_monotonic_decreasing)
+        # 得分最高的股票不在结果之外
+        self.assertGreaterEqual(bellwether['score'].min(), self.screener._rank_score(
+            table, ['return_3y', 'growth_3y', 'dividendYield', 'trailingPE', 'marketCap'],
+            ascending_columns=('trailingPE',)).drop(bellwether.index).max())
+
+    def test_takeoff_stock(self):
+        takeoff = self.screener.find_takeoff_stock(years=3)
+        self.assertFalse(takeoff.empty)
+        self.assertLessEqual(len(takeoff), self.screener.top)
+        self.assertIn('acceleration', takeoff.columns)
+        self.assertIn('score', takeoff.columns)
+        self.assertTrue((takeoff['position'] >= 0.3).all())
+        np.testing.assert_allclose(takeoff['acceleration'], takeoff['return_1y'] - takeoff['return_3y'])
+        self.assertTrue(takeoff['score'].is_monotonic_decreasing)
+        screened = self.screener.screen(filters={'position': (0.3, None)})
+        self.assertTrue(set(takeoff.index) <= set(screened.index))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import cli
+from service import AnalysisService, dispatch, start_server, load_test
+
+calls = []
+
+def slow_square(x):
+    calls.append(x)
+    time.sleep(0.05)
+    return x * x
+
+def fail(x):
+    calls.append(x)
+    raise RuntimeError('boom')
+
+class EchoService(AnalysisService):
+    async def echo(self, params):
+        if 'x' not in params:
+            raise ValueError('缺少参数x')
+        return {'square': await self.call(('square', params['x']), slow_square, int(params['x']))}
+
+    def routes(self):
+        return dict(super().routes(), **{'/echo': self.echo})
+
+class FakeDataManager:
+    """元数据库中只有stocks里的股票, 与StockDataManager一样对未知股票返回默认市场"""
+    def __init__(self):
+        self.stocks = {}
+
+    def get_stock_info(self, code):
+        return {'code': code, 'market': self.stocks[code]} if code in self.stocks else None
+
+    def get_stock_market(self, code):
+        return self.stocks.get(code, 'US')
+
+class TestAnalysisService(unittest.TestCase):
+    def setUp(self):
+        calls.clear()
+        self.executor = ThreadPoolExecutor(4)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_coalesce_and_ttl(self):
+        service = AnalysisService(ttl=0.2, executor=self.executor)
+
+        async def run():
+            first = await asyncio.gather(*[service.call('k', slow_square, 3) for _ in range(10)])
+            cached = await service.call('k', slow_square, 3)
+            await asyncio.sleep(0.25)
+            expired = await service.call('k', slow_square, 3)
+            return first, cached, expired
+
+        first, cached, expired = asyncio.run(run())
+        self.assertEqual(first, [9] * 10)
+        self.assertEqual((cached, expired), (9, 9))
+        # 10个并发请求合并为一次, TTL过期后重新计算
+        self.assertEqual(calls, [3, 3])
+        self.assertEqual(service.stats['coalesced'], 9)
+        self.assertEqual(service.stats['cache_hits'], 1)
+
+    def test_errors_not_cached(self):
+        service = AnalysisService(executor=self.executor)
+
+        async def run():
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    await service.call('k', fail, 1)
+
+        asyncio.run(run())
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(service.cache, {})
+
+    def test_max_entries(self):
+        service = AnalysisService(max_entries=2, executor=self.executor)
+
+        async def run():
+            for x in range(3):
+                await service.call(x, slow_square, x)
+
+        asyncio.run(run())
+        self.assertEqual(list(service.cache), [1, 2])
+
+    def test_status_codes(self):
+        service = EchoService(executor=self.executor)
+
+        async def run():
+            return [await dispatch(service, 'GET', '/echo', {'x': '4'}),
+                    await dispatch(service, 'GET', '/echo', {}),
+                    await dispatch(service, 'GET', '/missing', {}),
+                    await dispatch(service, 'DELETE', '/echo', {'x': '4'})]
+
+        results = asyncio.run(run())
+        self.assertEqual([status for status, _ in results], [200, 400, 404, 405])
+        self.assertEqual(results[0][1], {'square': 16})
+
+    def test_http_round_trip(self):
+        service = EchoService(executor=self.executor)
+
+        async def run():
+            server = await start_server(service, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await load_test('127.0.0.1', port, ['/echo?x=5', '/echo?x=6'], 40, 4)
+
+        result = asyncio.run(run())
+        self.assertEqual(result['requests'], 40)
+        self.assertEqual(result['errors'], {})
+        self.assertEqual(sorted(calls), [5, 6])
+        self.assertEqual(result['server']['computed'], 2)
+
+    def test_non_object_body(self):
+        service = EchoService(executor=self.executor)
+
+        async def post(body):
+            server = await start_server(service, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(f"POST /echo HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                writer.close()
+                return status
+
+        # JSON数组等非对象的请求体返回400, 而不是断开连接
+        self.assertEqual(asyncio.run(post(b'[1, 2]')), 400)
+        self.assertEqual(asyncio.run(post(b'{"x": 3}')), 200)
+
+    def test_unknown_market_not_cached(self):
+        data_mgr = FakeDataManager()
+        saved = cli._worker_objects.get('data_mgr')
+        cli._worker_objects['data_mgr'] = data_mgr
+        self.addCleanup(lambda: cli._worker_objects.pop('data_mgr') if saved is None
+                        else cli._worker_objects.update(data_mgr=saved))
+        service = AnalysisService(executor=self.executor)
+        self.assertEqual(service.market('600036'), 'US')
+        # 导入后查到实际市场
+        data_mgr.stocks['600036'] = 'A-SH'
+        self.assertEqual(service.market('600036'), 'A-SH')
+        self.assertEqual(service.markets, {'600036': 'A-SH'})
+
+if __name__ == '__main__':
+    unittest.main()
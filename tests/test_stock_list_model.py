@@ -0,0 +1,99 @@
+import os
+import sys
+import unittest
+import subprocess
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5.QtCore import QCoreApplication, Qt
+from stock_list_model import StockListModel, StockFilterModel
+
+def make_stocks(n, market='US'):
+    return [{'code': f'C{i:04d}', 'market': market, 'end_date': '2025-01-01'} for i in range(n)]
+
+class TestStockListModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def test_lazy_fetch(self):
+        model = StockListModel(batch_size=100)
+        inserted = []
+        model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        model.set_stocks(make_stocks(250))
+        # 首次填充只暴露第一批, 其余由视图按需分批拉取
+        self.assertEqual(inserted, [(0, 99)])
+        self.assertEqual(model.rowCount(), 100)
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), 200)
+        # 未拉取的行有新增时不通知视图
+        model.upsert({'code': 'NEW', 'market': 'HK'})
+        self.assertEqual(model.rowCount(), 200)
+        model.fetch_all()
+        self.assertEqual(model.rowCount(), 251)
+
+    def test_incremental_update_keeps_rows(self):
+        model = StockListModel()
+        model.set_stocks(make_stocks(5))
+        model.fetch_all()
+        events = []
+        model.modelReset.connect(lambda: events.append('reset'))
+        model.rowsRemoved.connect(lambda parent, first, last: events.append(('removed', first)))
+        model.rowsInserted.connect(lambda parent, first, last: events.append(('inserted', first)))
+        model.dataChanged.connect(lambda top, bottom: events.append(('changed', top.row())))
+
+        stocks = make_stocks(5)
+        del stocks[1]
+        stocks[2]['end_date'] = '2025-02-01'
+        stocks.append({'code': 'NEW', 'market': 'HK', 'end_date': '2025-01-01'})
+        model.set_stocks(stocks)
+        self.assertEqual(events, [('removed', 1), ('changed', 2), ('inserted', 4)])
+        self.assertEqual([model.index(r).data(StockListModel.CodeRole) for r in range(model.rowCount())],
+                         ['C0000', 'C0002', 'C0003', 'C0004', 'NEW'])
+        self.assertEqual(model.stock('C0003')['end_date'], '2025-02-01')
+
+    def test_filter_and_format(self):
+        model = StockListModel(batch_size=10)
+        stocks = make_stocks(30)
+        stocks[25].update({'shortName': 'Apple Inc.', 'sector': 'Technology'})
+        model.set_stocks(stocks)
+        proxy = StockFilterModel(model, '{code}|{shortName}')
+        proxy.set_query('apple tech')
+        # 搜索覆盖尚未拉取的行
+        self.assertEqual(proxy.rowCount(), 1)
+        self.assertEqual(proxy.index(0, 0).data(Qt.DisplayRole), 'C0025|Apple Inc.')
+        proxy.set_query('us c001')
+        self.assertEqual(proxy.rowCount(), 10)
+        self.assertEqual(proxy.index(0, 0).data(Qt.DisplayRole), 'C0010|')
+        proxy.set_query('')
+        self.assertEqual(proxy.rowCount(), 30)
+
+    def test_empty_model_append_visible(self):
+        model = StockListModel()
+        model.upsert({'code': 'FIRST', 'market': 'US'})
+        self.assertEqual(model.rowCount(), 1)
+        model.upsert({'code': 'SECOND', 'market': 'US'})
+        self.assertEqual(model.rowCount(), 2)
+
+    def test_view_attached_before_fill(self):
+        # 需要QApplication, 其他测试已创建QCoreApplication, 在子进程中运行
+        code = '''
+import sys
+from PyQt5.QtCore import QPoint
+from PyQt5.QtWidgets import QApplication, QListView
+from stock_list_model import StockListModel
+app = QApplication([])
+model = StockListModel()
+view = QListView()
+view.setModel(model)
+view.resize(200, 200)
+view.show()
+app.processEvents()
+model.set_stocks([{'code': 'FIRST', 'market': 'US'}])
+app.processEvents()
+sys.exit(0 if view.indexAt(QPoint(5, 5)).data() == 'FIRST - US' else 1)
+'''
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        self.assertEqual(subprocess.call([sys.executable, '-c', code], env=env), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from stock_snapshot import load_snapshot, save_snapshot
+
+class TestStockSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'stock_list.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip_keeps_display_fields(self):
+        stocks = [{'code': '600036', 'market': 'A-SH', 'start_date': '2010-01-04',
+                   'end_date': '2025-11-21', 'data_path': '/tmp/x'}]
+        save_snapshot(stocks, self.path)
+        self.assertEqual(load_snapshot(self.path),
+                         [{'code': '600036', 'market': 'A-SH', 'end_date': '2025-11-21'}])
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_missing_or_corrupt_snapshot(self):
+        self.assertEqual(load_snapshot(self.path), [])
+        with open(self.path, 'w') as f:
+            f.write('[{"code": "6000')
+        self.assertEqual(load_snapshot(self.path), [])
+        with open(self.path, 'w') as f:
+            json.dump([{'market': 'A-SH'}, 'x', {'code': 'AAPL', 'market': 'US'}], f)
+        self.assertEqual(load_snapshot(self.path), [{'code': 'AAPL', 'market': 'US'}])
+
+    def test_snapshot_does_not_import_pandas(self):
+        # 快照模块只依赖标准库, 启动时不会触发pandas导入
+        import subprocess
+        code = 'import sys, stock_snapshot; sys.exit("pandas" in sys.modules)'
+        self.assertEqual(subprocess.call([sys.executable, '-c', code]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+from window_cache import EnvelopeWindowCache
+
+class TestEnvelopeWindowCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = EnvelopeWindowCache(window_size=260)
+        self.cache.years_list = [1, 2, 3, 5]
+        rng = np.random.default_rng(0)
+        self.prices = 100 * np.exp(np.cumsum(rng.normal(0.002, 0.03, 300)))
+
+    def start(self, code, prices):
+        self.cache.start(code, prices)
+        self.cache.wait(30)
+        self.assertTrue(self.cache.is_ready(code))
+
+    def assert_pairs_close(self, result, expected):
+        """[(years, value), ...]: 年份一致, 数值允许浮点误差"""
+        self.assertEqual([y for y, _ in result], [y for y, _ in expected])
+        np.testing.assert_allclose([r for _, r in result], [r for _, r in expected], rtol=1e-9)
+
+    def test_matches_single_window_analysis(self):
+        self.start('AAA', self.prices)
+        analyzer = self.cache.analyzer
+        years_list = self.cache.years_list
+        for start in (0, 17, 40):
+            window = self.prices[start:start + 260]
+            cached = self.cache.get('AAA', start)
+            self.assert_pairs_close(cached['annual_returns'], analyzer.calculate_annualized_returns(window, years_list))
+            for low_rate_type in ('low_rate', 'low_rate2'):
+                expected, envelope = analyzer.analyze_stability(window, years_list, low_rate_type)
+                result = cached[low_rate_type]
+                np.testing.assert_allclose(cached['envelope'], envelope, rtol=1e-5)
+                np.testing.assert_array_equal(result['peaks'], expected['peaks'])
+                np.testing.assert_array_equal(result['valleys'], expected['valleys'])
+                self.assert_pairs_close(result['growth_scores'], expected['growth_scores'])
+                for key in ('lastvalue', 'lastchange', 'last_extrema_value'):
+                    np.testing.assert_allclose(result[key], expected[key])
+        self.assertIsNone(self.cache.get('AAA', 41))
+        self.assertIsNone(self.cache.get('BBB', 0))
+
+    def test_new_symbol_and_evict_discard_old_results(self):
+        self.start('AAA', self.prices)
+        # 选择其他股票后旧股票的结果不再返回, 旧计算完成也不会覆盖新缓存
+        self.cache.start('BBB', self.prices[:280])
+        self.cache._precompute(1, self.prices)
+        self.assertIsNone(self.cache.get('AAA', 0))
+        self.cache.wait(30)
+        self.assertTrue(self.cache.is_ready('BBB'))
+        self.assertEqual(len(self.cache._data['envelopes']), 21)
+
+        self.cache.start('CCC', self.prices)
+        self.cache.evict()
+        self.cache.wait(30)
+        self.assertFalse(self.cache.is_ready('CCC'))
+        self.assertIsNone(self.cache.get('CCC', 0))
+        self.assertIsNone(self.cache.get('BBB', 0))
+
+    def test_put(self):
+        data = self.cache.compute(self.prices)
+        self.cache.put('AAA', data)
+        self.assertTrue(self.cache.is_ready('AAA'))
+        cached = self.cache.get('AAA', 5)
+        np.testing.assert_array_equal(cached['envelope'], data['envelopes'][5])
+        offsets = data['low_rate']['peaks_offsets']
+        np.testing.assert_array_equal(cached['low_rate']['peaks'], data['low_rate']['peaks'][offsets[5]:offsets[6]])
+        # 后台计算中途put的结果不会被旧计算覆盖
+        self.cache.start('BBB', self.prices)
+        self.cache.put('AAA', data)
+        self.cache.wait(30)
+        self.assertTrue(self.cache.is_ready('AAA'))
+        self.assertFalse(self.cache.is_ready('BBB'))
+
+if __name__ == '__main__':
+    unittest.main()
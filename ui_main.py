@@ -1,29 +1,137 @@
+import os
 import sys
-import numpy as np
-from PyQt5.QtCore import Qt, QDate, QDateTime
+import time
+import bisect
+from PyQt5.QtCore import Qt, QDate, QDateTime, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QTabWidget, QVBoxLayout,
                             QLabel, QPushButton, QFileDialog, QHBoxLayout,QListWidget,QInputDialog,QMessageBox,QListWidgetItem,
-                            QLineEdit,QComboBox,QSplitter,QDateEdit)
-from data_manager import StockDataManager
-from feature_analysis import FeatureAnalyzer
-from analysis_engine import AnalysisEngine
-import matplotlib
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-import time
-
+                            QLineEdit,QComboBox,QSplitter,QDateEdit,QDialog,QProgressBar,QListView)
 from configparser import ConfigParser
 
-# 设置全局字体为支持中文的字体
-matplotlib.rcParams['font.family'] = ['Songti SC', 'Heiti TC', 'sans-serif']
-matplotlib.rcParams['font.size'] = 8  # 字体大小
-matplotlib.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+from stock_snapshot import load_snapshot, save_snapshot
+
+# matplotlib、pandas、scipy、fastdtw等较重的模块在首次用到时才导入(见setup_plotting和各页面方法),
+# 启动时只需要PyQt和标准库, 股票列表先用快照填充.
+
+_plotting_ready = False
+_data_manager = None
+_stock_model = None
+
+
+def setup_plotting():
+    """首次创建图表页时导入matplotlib并设置中文字体和样式, 返回(Figure, FigureCanvasQTAgg)"""
+    global _plotting_ready
+    import matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+    if not _plotting_ready:
+        # 设置全局字体为支持中文的字体
+        matplotlib.rcParams['font.family'] = ['Songti SC', 'Heiti TC', 'sans-serif']
+        matplotlib.rcParams['font.size'] = 8  # 字体大小
+        matplotlib.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+
+        plt.style.use('ggplot')
+        plt.rcParams['axes.prop_cycle'] = plt.cycler(color=plt.cm.cividis.colors)
+        _plotting_ready = True
+    return Figure, FigureCanvasQTAgg
+
+
+def shared_data_manager():
+    """各页面共用一个StockDataManager(一个元数据库连接), 首次调用时创建"""
+    global _data_manager
+    if _data_manager is None:
+        from data_manager import StockDataManager
+        _data_manager = StockDataManager()
+    return _data_manager
+
+
+def load_stocks(from_snapshot=False):
+    """
+    股票列表
+
+    from_snapshot为True时优先读快照(启动时用, 不打开数据库), 否则读元数据库并更新快照
+    """
+    if from_snapshot:
+        stocks = load_snapshot()
+        if stocks:
+            return stocks
+    stocks = shared_data_manager().get_all_stocks()
+    save_snapshot(stocks)
+    return stocks
+
+
+def shared_stock_model():
+    """各页面共用的股票列表模型, 首次调用时用快照填充"""
+    global _stock_model
+    if _stock_model is None:
+        from stock_list_model import StockListModel
+        _stock_model = StockListModel()
+        _stock_model.set_stocks(load_stocks(from_snapshot=True))
+    return _stock_model
+
+
+def refresh_stocks():
+    """从元数据库重新读取股票列表, 增量更新共享模型(所有页面同步)"""
+    shared_stock_model().set_stocks(load_stocks())
+
+
+class StockListView(QWidget):
+    """带搜索框的股票列表, 数据来自共享模型, 只绘制可见的行"""
+    stock_clicked = pyqtSignal(object)
+    stock_double_clicked = pyqtSignal(object)
+    # 当前行变化(点击或上下键)
+    current_stock_changed = pyqtSignal(object)
+
+    def __init__(self, fmt='{code} - {market}', parent=None):
+        super().__init__(parent)
+        from stock_list_model import StockFilterModel
+        self.proxy = StockFilterModel(shared_stock_model(), fmt, self)
+        self.search_input = QLineEdit(placeholderText='搜索代码/名称/市场/行业')
+        self.search_input.textChanged.connect(self.proxy.set_query)
+        self.view = QListView()
+        self.view.setUniformItemSizes(True)
+        self.view.setModel(self.proxy)
+        self.view.clicked.connect(lambda index: self.stock_clicked.emit(self._stock(index)))
+        self.view.doubleClicked.connect(lambda index: self.stock_double_clicked.emit(self._stock(index)))
+        self.view.selectionModel().currentChanged.connect(self._on_current_changed)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.search_input)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+    def _stock(self, index):
+        from stock_list_model import StockListModel
+        return index.data(StockListModel.StockRole)
+
+    def _on_current_changed(self, current, previous):
+        if current.isValid():
+            self.current_stock_changed.emit(self._stock(current))
+
+    def neighbour_codes(self, count):
+        """列表中当前行前后各count只股票的代码, 由近及远, 同样距离时下一只在前"""
+        from stock_list_model import StockListModel
+        row = self.view.currentIndex().row()
+        if row < 0:
+            return []
+        codes = []
+        for step in range(1, count + 1):
+            for neighbour in (row + step, row - step):
+                if 0 <= neighbour < self.proxy.rowCount():
+                    codes.append(self.proxy.index(neighbour, 0).data(StockListModel.CodeRole))
+        return codes
+
+    def selected_stock(self):
+        """当前选中的股票信息, 没有选中时返回None"""
+        indexes = self.view.selectionModel().selectedIndexes()
+        return self._stock(indexes[0]) if indexes else None
 
-plt.style.use('ggplot')
-plt.rcParams['axes.prop_cycle'] = plt.cycler(color=plt.cm.cividis.colors)
 
 class MainWindow(QMainWindow):
+    # 窗口首次绘制完成
+    first_painted = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
@@ -45,19 +153,47 @@ class MainWindow(QMainWindow):
         self.tabs = QTabWidget()
         main_layout.addWidget(self.tabs)
         
-        # 初始化四个功能页
-        self.data_page = DataManagementPage()
-        self.trend_page = TrendAnalysisPage()
-        self.feature_page = FeatureAnalysisPage()
-        self.envelope_page = EnvelopeAnalysisPage()
-        
-        self.tabs.addTab(self.data_page, "数据管理")
-        self.tabs.addTab(self.trend_page, "趋势预测")
-        self.tabs.addTab(self.feature_page, "特征分析")
-        self.tabs.addTab(self.envelope_page, "包络线分析")
+        # 四个功能页先放空容器, 首次切换到该标签页时才创建
+        self.page_specs = [
+            ('data_page', DataManagementPage, "数据管理"),
+            ('trend_page', TrendAnalysisPage, "趋势预测"),
+            ('feature_page', FeatureAnalysisPage, "特征分析"),
+            ('envelope_page', EnvelopeAnalysisPage, "包络线分析"),
+        ]
+        for name, _, title in self.page_specs:
+            container = QWidget()
+            container_layout = QVBoxLayout(container)
+            container_layout.setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(container, title)
+            setattr(self, name, None)
+        self.tabs.currentChanged.connect(self.ensure_page)
+        self.ensure_page(self.tabs.currentIndex())
         
         # 应用样式
         self._apply_styles()
+        self._painted = False
+        self.first_painted.connect(self._on_first_painted)
+
+    def ensure_page(self, index):
+        """返回第index个功能页, 尚未创建时创建"""
+        name, page_class, _ = self.page_specs[index]
+        page = getattr(self, name)
+        if page is None:
+            page = page_class()
+            self.tabs.widget(index).layout().addWidget(page)
+            setattr(self, name, page)
+        return page
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            self.first_painted.emit()
+
+    def _on_first_painted(self):
+        # 首次绘制完成后再读元数据库刷新股票列表(需要导入pandas)
+        if self.data_page is not None:
+            QTimer.singleShot(0, self.data_page.refresh_stock_list)
 
     def _apply_styles(self):
         # MacOS风格样式
@@ -82,11 +218,12 @@ class DataManagementPage(QWidget):
         self.import_btn = QPushButton("导入数据")
         self.update_btn = QPushButton("批量导入")
         self.validate_btn = QPushButton("验证数据")
+        self.resume_btn = QPushButton("继续导入")
         
         # 连接信号槽
         self.import_btn.clicked.connect(self._handle_import)
         self.update_btn.clicked.connect(self._handle_bulk_update)
-        self.data_manager = StockDataManager()
+        self.resume_btn.clicked.connect(self._handle_resume)
         
         # 布局排列
         control_layout.addWidget(QLabel('代码:'))
@@ -97,25 +234,98 @@ class DataManagementPage(QWidget):
         control_layout.addWidget(self.import_btn)
         control_layout.addWidget(self.update_btn)
         control_layout.addWidget(self.validate_btn)
+        control_layout.addWidget(self.resume_btn)
         
         # 数据展示区域
-        self.stock_list = QListWidget()
+        self.stock_list = StockListView('{code}\t{market}\t{end_date}')
         
-        self.stock_list.itemDoubleClicked.connect(self._handle_delete)
+        self.stock_list.stock_double_clicked.connect(self._handle_delete)
         
         layout.addLayout(control_layout)
         layout.addWidget(self.stock_list)
         self.setLayout(layout)
-        self._refresh_stock_list()
+        # 列表先用快照显示, 窗口首次绘制后再从数据库刷新(见MainWindow._on_first_painted)
 
-    def _handle_delete(self, item):
+        # 导入在后台线程池中进行, 首次导入时创建
+        self._import_job = None
+        self.progress_dialog = None
+        self.resume_btn.setVisible(self._has_pending_import())
+
+    def _has_pending_import(self):
+        # 只检查状态文件是否存在, 不在启动时打开数据库
+        from stock_snapshot import snapshot_path
+        from import_job import STATE_NAME
+        return os.path.exists(os.path.join(os.path.dirname(snapshot_path()), STATE_NAME))
+
+    @property
+    def import_job(self):
+        if self._import_job is None:
+            from import_job import ImportJob
+            self._import_job = ImportJob(self.data_manager, parent=self)
+            self._import_job.symbol_done.connect(self._on_symbol_done)
+            self._import_job.finished.connect(self._on_import_finished)
+            QApplication.instance().aboutToQuit.connect(self._import_job.shutdown)
+        return self._import_job
+
+    def _start_import(self, codes, market=None):
+        """后台导入codes并显示进度对话框; codes为None时继续上次未完成的批次"""
+        if self.import_job.running:
+            QMessageBox.warning(self, '提示', '已有导入任务正在进行')
+            return
+        if codes is None:
+            state = self.import_job.pending_state()
+            if state is None:
+                self.resume_btn.setVisible(False)
+                return
+            codes = state['remaining']
+        self.import_btn.setEnabled(False)
+        self.update_btn.setEnabled(False)
+        self.resume_btn.setEnabled(False)
+        self.success_codes = []
+        self.progress_dialog = ImportProgressDialog(codes, self.import_job, self)
+        self.progress_dialog.show()
+        if market is None:
+            self.import_job.resume()
+        else:
+            self.import_job.start(codes, market)
+
+    def _on_symbol_done(self, code, status, message):
+        # 每导入一只就把这一行加入共享模型; 快照在导入结束时写一次
+        if status == 'ok':
+            self.success_codes.append(code)
+            stock = self.data_manager.get_stock_info(code)
+            if stock is not None:
+                shared_stock_model().upsert(stock)
+
+    def _on_import_finished(self, cancelled):
+        if self.success_codes:
+            save_snapshot(shared_stock_model().stocks)
+        self.import_btn.setEnabled(True)
+        self.update_btn.setEnabled(True)
+        self.resume_btn.setEnabled(True)
+        self.resume_btn.setVisible(self.import_job.pending_state() is not None)
+        if cancelled:
+            return
+        if self.success_codes:
+            QMessageBox.information(self, '成功', f'已成功导入{len(self.success_codes)}支股票数据')
+        else:
+            QMessageBox.warning(self, '警告', '没有成功导入任何股票数据')
+
+    def _handle_resume(self):
+        self._start_import(None)
+
+    @property
+    def data_manager(self):
+        return shared_data_manager()
+
+    def _handle_delete(self, stock):
         confirm = QMessageBox.question(self, "确认删除", 
-            f"确定要删除{item.stock_code} ({item.market}) 吗？",
+            f"确定要删除{stock['code']} ({stock['market']}) 吗？",
             QMessageBox.Yes | QMessageBox.No)
 
         if confirm == QMessageBox.Yes:
-            if self.data_manager.delete_stock_data(item.stock_code):
-                self.stock_list.takeItem(self.stock_list.row(item))
+            if self.data_manager.delete_stock_data(stock['code']):
+                self.refresh_stock_list()
             else:
                 QMessageBox.warning(self, "错误", "删除股票数据失败")
         
@@ -128,17 +338,8 @@ class DataManagementPage(QWidget):
             self.code_input.setFocus()
             return
         
-        try:
-            success_codes = self.data_manager.download_data([(code, market)])
-            self._refresh_stock_list()
-            self.code_input.clear()
-            if len(success_codes)>0:
-                QMessageBox.information(self, '成功', '数据导入成功')
-            else:
-                QMessageBox.warning(self, '错误', '数据导入失败') 
-
-        except Exception as e:
-            QMessageBox.critical(self, '错误', f'导入失败: {str(e)}')
+        self._start_import([code], market)
+        self.code_input.clear()
     
     def _handle_bulk_update(self):
         # 获取用户输入的配置名称和市场    
@@ -151,21 +352,22 @@ class DataManagementPage(QWidget):
             return
         
         # 从config.ini读取股票代码列表
+        config = self.data_manager.config
         try:
             
-            if 'StockLists' not in self.config:
+            if 'StockLists' not in config:
                 QMessageBox.warning(self, '错误', '配置文件中没有StockLists配置段')
                 return  
 
             stock_list_key = f"{market}_{config_name}"
-            if config_name.strip() == "" or stock_list_key not in self.config['StockLists']:
+            if config_name.strip() == "" or stock_list_key not in config['StockLists']:
                 # 尝试使用市场名称作为键
-                if market not in self.config['StockLists']:
+                if market not in config['StockLists']:
                     QMessageBox.warning(self, '错误', f'配置文件中没有找到{market}市场的股票代码列表')
                     return
-                stock_codes_str = self.config['StockLists'][market]
+                stock_codes_str = config['StockLists'][market]
             else:
-                stock_codes_str = self.config['StockLists'][stock_list_key]
+                stock_codes_str = config['StockLists'][stock_list_key]
             
             # 解析股票代码
             stock_codes = [code.strip() for code in stock_codes_str.split(',') if code.strip()]
@@ -181,28 +383,71 @@ class DataManagementPage(QWidget):
             if confirm != QMessageBox.Yes:
                 return
             print(f"要导入的股票代码列表: {stock_codes}")
-            # 批量导入数据
-            success_codes = self.data_manager.batch_download(stock_codes, market)
-            self._refresh_stock_list()
-            
-            if success_codes:
-                QMessageBox.information(self, '成功', f'已成功导入{len(success_codes)}支股票数据')
-            else:
-                QMessageBox.warning(self, '警告', '没有成功导入任何股票数据')
+            # 批量导入数据(后台进行)
+            self._start_import(stock_codes, market)
     
         except Exception as e:
             QMessageBox.critical(self, '错误', f'批量导入失败: {str(e)}')
     
-    def _refresh_stock_list(self):
-        stocks = self.data_manager.get_all_stocks()
-        self.stock_list.clear()
-        for stock in stocks:
-            item = QListWidgetItem(f"{stock['code']}\t{stock['market']}\t{stock['end_date']}")
-            item.stock_code = stock['code']
-            item.market = stock['market']
-            self.stock_list.addItem(item)
+    def refresh_stock_list(self):
+        refresh_stocks()
                
 
+class ImportProgressDialog(QDialog):
+    """批量导入进度: 总进度、导入速度和每只股票的状态"""
+    STATUS_TEXT = {'ok': '完成', 'empty': '没有数据', 'failed': '失败'}
+
+    def __init__(self, codes, job, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('批量导入')
+        self.job = job
+        layout = QVBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, len(codes))
+        self.progress_bar.setValue(0)
+        self.rate_label = QLabel(f'0/{len(codes)}')
+        self.symbol_list = QListWidget()
+        self.items = {}
+        for code in codes:
+            self.items[code] = QListWidgetItem(f'{code}\t等待中')
+            self.symbol_list.addItem(self.items[code])
+        self.cancel_btn = QPushButton('取消')
+        self.cancel_btn.clicked.connect(self._on_cancel)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.rate_label)
+        layout.addWidget(self.symbol_list)
+        layout.addWidget(self.cancel_btn)
+        self.setLayout(layout)
+
+        job.symbol_done.connect(self._on_symbol_done)
+        job.progress.connect(self._on_progress)
+        job.finished.connect(self._on_finished)
+
+    def _on_symbol_done(self, code, status, message):
+        item = self.items.get(code)
+        if item is not None:
+            text = self.STATUS_TEXT.get(status, status)
+            item.setText(f'{code}\t{text}' + (f': {message}' if message and status == 'failed' else ''))
+
+    def _on_progress(self, done, total, per_minute):
+        self.progress_bar.setValue(done)
+        self.rate_label.setText(f'{done}/{total}  {per_minute:.1f} 只/分钟')
+
+    def _on_finished(self, cancelled):
+        if cancelled:
+            self.rate_label.setText(self.rate_label.text() + '  已取消, 可点击"继续导入"完成剩余股票')
+        self.cancel_btn.setText('关闭')
+        self.cancel_btn.clicked.disconnect()
+        self.cancel_btn.clicked.connect(self.close)
+        for signal, slot in ((self.job.symbol_done, self._on_symbol_done),
+                             (self.job.progress, self._on_progress),
+                             (self.job.finished, self._on_finished)):
+            signal.disconnect(slot)
+
+    def _on_cancel(self):
+        self.job.cancel()
+
+
 class TrendAnalysisPage(QWidget):
     def __init__(self):
         super().__init__()
@@ -216,10 +461,10 @@ class TrendAnalysisPage(QWidget):
         # 左侧股票列表面板
         left_panel = QWidget()
         left_layout = QVBoxLayout()
-        self.stock_list = QListWidget()
+        self.stock_list = StockListView()
         left_layout.addWidget(QLabel("已导入股票列表"))
         self.refresh_btn = QPushButton("刷新列表")
-        self.refresh_btn.clicked.connect(self._load_stock_list)
+        self.refresh_btn.clicked.connect(refresh_stocks)
         left_layout.addWidget(self.refresh_btn)
 
  
@@ -253,6 +498,7 @@ class TrendAnalysisPage(QWidget):
         layout = QVBoxLayout(right_panel)
         
         # 图表区域
+        Figure, FigureCanvasQTAgg = setup_plotting()
         self.figure1 = Figure(figsize=(8, 4))
         self.canvas1 = FigureCanvasQTAgg(self.figure1)
 
@@ -281,80 +527,75 @@ class TrendAnalysisPage(QWidget):
         self.analyze_btn.clicked.connect(self.on_analyze_clicked)  # 原连接可能需要调
         
         # 初始化数据管理器
-        self.data_mgr = StockDataManager()
-        self._load_stock_list()
+        self.data_mgr = shared_data_manager()
+
+        # 分析结果持久化存储, 相同股票、数据和参数的分析直接读取
+        from result_store import ResultStore
+        from analysis_worker import ForecastExecutor
+        self.result_store = ResultStore()
+        # 后台分析执行器, 多个日期并行计算, 完成的日期可立即浏览
+        self.executor = ForecastExecutor(store=self.result_store, parent=self)
+        self.executor.result_ready.connect(self._on_result_ready)
+        self.executor.date_failed.connect(self._on_date_failed)
+        self.executor.finished.connect(self._on_analysis_finished)
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.executor.shutdown)
+        self.follow_latest = True
 
         # 新增缓存相关属性
         self.analysis_cache = []  # 存储元组 (date_str, before_prices, best_matches, forecast_returns, forecast_prices, real_prices)
         self.current_cache_index = -1
+        # 图表线条在首次显示时创建, 连续翻页合并为一次重绘
+        from fast_chart import RedrawScheduler
+        self.charts = None
+        self.redraw = RedrawScheduler(self._display_cached_result, self)
         
     
-    def _load_stock_list(self):
-        stocks = self.data_mgr.get_all_stocks()
-        self.stock_list.clear()
-        for stock in stocks:
-            item = QListWidgetItem(f"{stock['code']} - {stock['market']}")
-            item.stock_code = stock['code']
-            item.market = stock['market']
-            self.stock_list.addItem(item)
-
     def keyPressEvent(self, event):
         """处理左右箭头切换缓存结果"""
+        if event.key() in (Qt.Key_Left, Qt.Key_Right, Qt.Key_A, Qt.Key_D, Qt.Key_Q, Qt.Key_E):
+            # 翻页后新完成的日期不再抢占显示, 按E回到最新日期
+            self.follow_latest = event.key() == Qt.Key_E
         if event.key() == Qt.Key_Left:
             self.current_cache_index -= 1
             if self.current_cache_index <= -1:
                 self.current_cache_index = 0
-            self._display_cached_result()
+            self.redraw.request()
         elif event.key() == Qt.Key_Right:
             self.current_cache_index += 1
             if self.current_cache_index >= len(self.analysis_cache):
                 self.current_cache_index = len(self.analysis_cache)-1
-            self._display_cached_result()
+            self.redraw.request()
         elif event.key() == Qt.Key_A:
             self.current_cache_index -= 4
             if self.current_cache_index <= -1:
                 self.current_cache_index = 0
-            self._display_cached_result()
+            self.redraw.request()
         elif event.key() == Qt.Key_D:
             self.current_cache_index += 4
             if self.current_cache_index >= len(self.analysis_cache):
                 self.current_cache_index = len(self.analysis_cache)-1
+            self.redraw.request()
         elif event.key() == Qt.Key_Q:
             self.current_cache_index = 0
-            self._display_cached_result()
+            self.redraw.request()
         elif event.key() == Qt.Key_E:
             self.current_cache_index = len(self.analysis_cache)-1
-            self._display_cached_result()
+            self.redraw.request()
         
         else:
             super().keyPressEvent(event)
 
     def _display_cached_result(self):
-        """显示缓存中的分析结果"""
+        """显示缓存中的分析结果, 复用已创建的线条只更新数据"""
         if 0 <= self.current_cache_index < len(self.analysis_cache):
             date_str, before_prices, best_matches, forecast_returns, forecast_prices, real_prices = self.analysis_cache[self.current_cache_index]
-            
-            # 清除旧图表
-            self.figure1.clear()
-            self.figure2.clear()
-            self.figure3.clear()
-
-            # 重新绘制图表
-            engine = AnalysisEngine()
-            engine.plot_patterns_and_forecast(
-                [self.figure1, self.figure2, self.figure3],
-                before_prices,
-                best_matches,
-                forecast_returns,
-                forecast_prices,
-                real_prices,
-                date_str  # 添加日期参数用于标题显示
-            )
-
-            # 更新画布
-            self.canvas1.draw_idle()
-            self.canvas2.draw_idle()
-            self.canvas3.draw_idle()
+            if self.charts is None:
+                from analysis_engine import AnalysisEngine
+                from fast_chart import ForecastCharts
+                self.charts = ForecastCharts([self.canvas1, self.canvas2, self.canvas3], AnalysisEngine())
+            self.charts.show(date_str, before_prices, best_matches, forecast_returns, forecast_prices, real_prices)
 
 
     def on_analyze_clicked(self):
@@ -362,8 +603,8 @@ class TrendAnalysisPage(QWidget):
             QMessageBox.information(self, '提示', '已有分析正在进行')
             return
             
-        selected_items = self.stock_list.selectedItems()
-        if not selected_items:
+        stock = self.stock_list.selected_stock()
+        if stock is None:
             QMessageBox.warning(self, '警告', '请先选择股票')
             return
             
@@ -396,68 +637,58 @@ class TrendAnalysisPage(QWidget):
         self.analyze_btn.setText("停止分析")
         self.analyze_btn.clicked.disconnect()
         self.analyze_btn.clicked.connect(self.cancel_analysis)
-        
-        # 启动分析线程
-        import threading
-        self.analysis_thread = threading.Thread(target=self._run_weekly_analysis, args=(selected_items[0],))
-        self.analysis_thread.start()
-
 
-    def _run_weekly_analysis(self, item):
+        # 提交到后台进程池, 结果通过信号回到GUI线程, 完成一个日期显示一个
+        dt = self.data_mgr.get_stock_weekly_data(stock['code'])
+        dt = self.data_mgr.calculate_volume_ratio(dt)
+        dt = dt.iloc[-1000:]
         self.setFocus()  # 让窗口获得焦点
         self.analysis_cache = []  # 清空旧缓存
-        
-        for analysis_date in self.date_queue:
-            if not self.is_analyzing:
-                break
+        self.current_cache_index = -1
+        self.follow_latest = True
+        if self.charts is not None:
+            self.charts.reset()
+        print(f'开始分析{len(self.date_queue)}个日期...')
+        self.executor.start(stock['code'], stock['market'], dt, self.date_queue)
+
+    def _on_result_ready(self, analysis_date, analysis_result):
+        """某个日期的分析完成(运行在GUI线程), 按日期顺序插入缓存"""
+        # 解包结果
+        best_matches, forecast_returns, forecast_prices, real_prices, before_prices = analysis_result
+        dates = [entry[0] for entry in self.analysis_cache]
+        position = bisect.bisect(dates, analysis_date)
+        self.analysis_cache.insert(position, (
+            analysis_date,
+            before_prices,
+            best_matches,
+            forecast_returns,
+            forecast_prices,
+            real_prices
+        ))
+        self.current_analysis_date = analysis_date
+
+        if self.follow_latest:
+            # 用户未翻页时显示最新完成的日期
+            self.current_cache_index = position
+            self.redraw.request()
+        elif position <= self.current_cache_index:
+            # 用户正在浏览时保持当前日期不变
+            self.current_cache_index += 1
+
+    def _on_date_failed(self, analysis_date, message):
+        print(f'分析{analysis_date}失败: {message}')
+
+    def _on_analysis_finished(self, cancelled):
+        print('分析已取消' if cancelled else '分析完成')
+        self._reset_analyze_button()
 
-            print(f'开始分析{analysis_date}...')
-            self.current_analysis_date = analysis_date
-            
-            # 获取分析结果
-            stock_code = item.stock_code
-            market = item.market
-            dt = self.data_mgr.get_stock_weekly_data(stock_code)
-            dt = self.data_mgr.calculate_volume_ratio(dt)
-            dt = dt.iloc[-1000:]
-            close_prices = dt['Close']
-            volume = dt['Volume']
-            volume_ratio = dt['Volume_Ratio']
-            
-            engine = AnalysisEngine()
-            analysis_result = engine.find_patterns_and_forecast(
-                close_prices,
-                market=market,
-                volume=volume,
-                volume_ratio=volume_ratio,
-                analysis_date=analysis_date
-            )
-            
-            # 解包结果
-            best_matches, forecast_returns, forecast_prices, real_prices, before_prices = analysis_result
-            
-            # 缓存原始数据
-            self.analysis_cache.append((
-                analysis_date,
-                before_prices,
-                best_matches,
-                forecast_returns,
-                forecast_prices,
-                real_prices
-            ))
-
-            # 立即显示最新结果
-            self.current_cache_index = len(self.analysis_cache) - 1
-            self._display_cached_result()
-            QApplication.processEvents()
-
-        if self.analysis_cache:
-            self.current_cache_index = len(self.analysis_cache) - 1
-        
-        self.cancel_analysis()
-        #QMessageBox.information(self, '完成', '分析完成')
-        
     def cancel_analysis(self):
+        self.executor.cancel()
+        self._reset_analyze_button()
+
+    def _reset_analyze_button(self):
+        if not self.is_analyzing:
+            return
         self.is_analyzing = False
         self.analyze_btn.setText("开始趋势分析")
         self.analyze_btn.clicked.disconnect()
@@ -474,10 +705,10 @@ class FeatureAnalysisPage(QWidget):
         # 左侧股票列表面板
         left_panel = QWidget()
         left_layout = QVBoxLayout()
-        self.stock_list = QListWidget()
+        self.stock_list = StockListView()
         left_layout.addWidget(QLabel("已导入股票列表"))
         self.refresh_btn = QPushButton("刷新列表")
-        self.refresh_btn.clicked.connect(self.load_stock_list)
+        self.refresh_btn.clicked.connect(refresh_stocks)
         left_layout.addWidget(self.refresh_btn)
         left_layout.addWidget(self.stock_list)
         left_panel.setLayout(left_layout)
@@ -485,6 +716,7 @@ class FeatureAnalysisPage(QWidget):
         # 右侧图表区域
         right_panel = QWidget()
         right_layout = QVBoxLayout()
+        Figure, FigureCanvasQTAgg = setup_plotting()
         self.figure1 = Figure(figsize=(8, 4))
         self.canvas1 = FigureCanvasQTAgg(self.figure1)
         self.figure2 = Figure(figsize=(8, 4))
@@ -505,38 +737,42 @@ class FeatureAnalysisPage(QWidget):
         self.setLayout(main_layout)
         
         # 初始化数据
-        self.data_mgr = StockDataManager()
-        self.load_stock_list()
-        
-    def load_stock_list(self):
-        stocks = self.data_mgr.get_all_stocks()
-        self.stock_list.clear()
-        for stock in stocks:
-            item = QListWidgetItem(f"{stock['code']} - {stock['market']}")
-            item.stock_code = stock['code']
-            self.stock_list.addItem(item)
-        self.stock_list.itemClicked.connect(self.on_stock_selected)
-
-    def on_stock_selected(self, item):
-        # 获取股票代码
-        stock_code = item.stock_code
-        
+        from prefetch import Prefetcher
+        self.data_mgr = shared_data_manager()
+        # 获取配置的年数列表
+        self.years_list = [int(y) for y in self.data_mgr.config['Returns']['years'].split(',')]
+        # 点击或上下键切换股票; 相邻股票在后台预先计算
+        self.prefetch_neighbours = self.data_mgr.config.getint('Prefetch', 'neighbours', fallback=3)
+        self.prefetcher = Prefetcher(self._compute_features,
+                                     self.data_mgr.config.getint('Prefetch', 'capacity', fallback=16))
+        self.stock_list.current_stock_changed.connect(self.on_stock_selected)
+
+    def _compute_features(self, stock_code):
+        """读取数据并计算特征指标, 也在预取线程中运行"""
+        from feature_analysis import FeatureAnalyzer
         # 从DataManager获取完整数据
         df = self.data_mgr.get_stock_weekly_data(stock_code)
         df = self.data_mgr.calculate_volume_ratio(df)
         df = df.iloc[-520:]  # 取最近520周数据
 
-
-        # 调用特征分析方法
+        # 调用特征分析方法, 计算不同周期的年化收益和成长性
         analyzer = FeatureAnalyzer()
-        
-        # 获取配置的年数列表
-        years_list = [int(y) for y in self.data_mgr.config['Returns']['years'].split(',')]
-        
-        # 计算不同周期的年化收益
         close_prices = df['Close'].values
-        annual_returns = analyzer.calculate_annualized_returns(close_prices, years_list)
-        stability_data, envelope = analyzer.analyze_stability(close_prices, years_list)
+        annual_returns = analyzer.calculate_annualized_returns(close_prices, self.years_list)
+        stability_data, envelope = analyzer.analyze_stability(close_prices, self.years_list)
+        return df, annual_returns, stability_data, envelope
+
+    def on_stock_selected(self, stock):
+        import numpy as np
+        from lod import plot_lod
+        # 获取股票代码
+        stock_code = stock['code']
+        result = self.prefetcher.get(stock_code)
+        if result is None:
+            result = self._compute_features(stock_code)
+            self.prefetcher.put(stock_code, result)
+        df, annual_returns, stability_data, envelope = result
+        self.prefetcher.request(self.stock_list.neighbour_codes(self.prefetch_neighbours))
         
         # 在成长性图表标题显示年化率
         return_labels = [f'{y}年: {r*100:.1f}%' for y,r in annual_returns]
@@ -545,7 +781,8 @@ class FeatureAnalysisPage(QWidget):
         # 更新成长性图表
         self.figure1.clear()
         ax1 = self.figure1.add_subplot(111)
-        ax1.plot(df['Close'], label='收盘价')
+        # 日线数据很长, 按坐标轴像素宽度降采样绘制
+        plot_lod(ax1, df.index, df['Close'].values, label='收盘价')
         ax1.set_title(f'年化收益率: {return_labels}',fontsize=10)
         ax1.legend(fontsize=8)
         ax1.tick_params(axis='both', which='major', labelsize=8)
@@ -554,8 +791,9 @@ class FeatureAnalysisPage(QWidget):
         # 更新稳定性图表
         self.figure2.clear()
         ax2 = self.figure2.add_subplot(111)
-        ax2.plot(df['Close'], label='原始价格')
-        ax2.plot(df.index, envelope, 'g--', label='包络线')
+        extrema = np.r_[stability_data['peaks'], stability_data['valleys']]
+        plot_lod(ax2, df.index, df['Close'].values, keep=extrema, label='原始价格')
+        plot_lod(ax2, df.index, envelope, 'g--', keep=extrema, label='包络线')
         ax2.scatter(df.index[stability_data['peaks']],  # 使用日期索引
                    df['Close'].iloc[stability_data['peaks']], 
                    marker='^', color='b')
@@ -578,10 +816,10 @@ class EnvelopeAnalysisPage(QWidget):
         # 左侧股票列表面板
         left_panel = QWidget()
         left_layout = QVBoxLayout()
-        self.stock_list = QListWidget()
+        self.stock_list = StockListView()
         left_layout.addWidget(QLabel("已导入股票列表"))
         self.refresh_btn = QPushButton("刷新列表")
-        self.refresh_btn.clicked.connect(self.load_stock_list)
+        self.refresh_btn.clicked.connect(refresh_stocks)
         left_layout.addWidget(self.refresh_btn)
         left_layout.addWidget(self.stock_list)
         
@@ -601,6 +839,7 @@ class EnvelopeAnalysisPage(QWidget):
         # 右侧图表区域
         right_panel = QWidget()
         right_layout = QVBoxLayout()
+        Figure, FigureCanvasQTAgg = setup_plotting()
         self.figure1 = Figure(figsize=(8, 4))
         self.canvas1 = FigureCanvasQTAgg(self.figure1)
         self.figure2 = Figure(figsize=(8, 4))
@@ -624,12 +863,33 @@ class EnvelopeAnalysisPage(QWidget):
         self.setLayout(main_layout)
         
         # 初始化数据
-        self.data_mgr = StockDataManager()
+        from feature_analysis import FeatureAnalyzer
+        from window_cache import EnvelopeWindowCache
+        from fast_chart import EnvelopeCharts, RedrawScheduler
+        self.data_mgr = shared_data_manager()
         self.current_stock_data = None
         self.current_stock_code = None
         self.window_start_index = 0  # 当前520周窗口的起始索引
         self.window_size = int(self.data_mgr.config['envelope']['window_size'])  # 默认窗口长度
-        self.load_stock_list()
+        self.analyzer = FeatureAnalyzer()
+        self.years_list = [int(y) for y in self.data_mgr.config['Returns']['years'].split(',')]
+        # 所有窗口的分析结果在后台预计算, 翻页时直接查表
+        self.window_cache = EnvelopeWindowCache(self.window_size)
+        # 图表线条只创建一次, 翻页时更新数据; 连续按键合并为一次重绘
+        self.charts = EnvelopeCharts([self.canvas1, self.canvas2, self.canvas3])
+        self.redraw = RedrawScheduler(self.analyze_current_window, self)
+        # 相邻股票的数据和全部窗口结果在后台预先计算
+        from prefetch import Prefetcher
+        self.prefetch_neighbours = self.data_mgr.config.getint('Prefetch', 'neighbours', fallback=3)
+        self.prefetcher = Prefetcher(self._compute_windows,
+                                     self.data_mgr.config.getint('Prefetch', 'capacity', fallback=16))
+        self.stock_list.stock_clicked.connect(self.on_stock_selected)
+
+    def _compute_windows(self, stock_code):
+        """预取线程: 读取数据并计算所有窗口的分析结果"""
+        df = self.data_mgr.get_stock_weekly_data(stock_code)
+        df = self.data_mgr.calculate_volume_ratio(df)
+        return df, self.window_cache.compute(df['Close'].values)
     
     def keyPressEvent(self, event):
         """处理键盘事件，实现左右键控制"""
@@ -658,23 +918,22 @@ class EnvelopeAnalysisPage(QWidget):
             # 其他按键交给父类处理
             super().keyPressEvent(event)
         
-    def load_stock_list(self):
-        stocks = self.data_mgr.get_all_stocks()
-        self.stock_list.clear()
-        for stock in stocks:
-            item = QListWidgetItem(f"{stock['code']} - {stock['market']}")
-            item.stock_code = stock['code']
-            self.stock_list.addItem(item)
-        self.stock_list.itemClicked.connect(self.on_stock_selected)
         
-    def on_stock_selected(self, item):
+    def on_stock_selected(self, stock):
         # 获取股票代码
-        stock_code = item.stock_code
+        stock_code = stock['code']
         self.current_stock_code = stock_code
         
-        # 从DataManager获取完整数据
-        df = self.data_mgr.get_stock_weekly_data(stock_code)
-        df = self.data_mgr.calculate_volume_ratio(df)
+        # 预取命中时直接使用全部窗口结果, 否则从DataManager获取完整数据并在后台预计算窗口
+        prefetched = self.prefetcher.get(stock_code)
+        if prefetched is not None:
+            df, windows = prefetched
+            self.window_cache.put(stock_code, windows)
+        else:
+            df = self.data_mgr.get_stock_weekly_data(stock_code)
+            df = self.data_mgr.calculate_volume_ratio(df)
+            self.window_cache.start(stock_code, df['Close'].values)
+        self.prefetcher.request(self.stock_list.neighbour_codes(self.prefetch_neighbours))
 
         self.current_stock_data = df
         
@@ -693,7 +952,7 @@ class EnvelopeAnalysisPage(QWidget):
             
         # 前推指定周期，窗口起始索引减去periods
         self.window_start_index = 0
-        self.analyze_current_window()
+        self.redraw.request()
         
     def show_end_periods(self):
         """后推指定周期数"""
@@ -703,7 +962,7 @@ class EnvelopeAnalysisPage(QWidget):
         # 后推指定周期，窗口起始索引加上periods
         max_start_index = len(self.current_stock_data) - self.window_size
         self.window_start_index = max_start_index
-        self.analyze_current_window()
+        self.redraw.request()
         
     def show_previous_periods(self, periods=1):
         """前推指定周期数"""
@@ -712,7 +971,7 @@ class EnvelopeAnalysisPage(QWidget):
             
         # 前推指定周期，窗口起始索引减去periods
         self.window_start_index = max(0, self.window_start_index - periods)
-        self.analyze_current_window()
+        self.redraw.request()
         
     def show_next_periods(self, periods=1):
         """后推指定周期数"""
@@ -722,7 +981,7 @@ class EnvelopeAnalysisPage(QWidget):
         # 后推指定周期，窗口起始索引加上periods
         max_start_index = len(self.current_stock_data) - self.window_size
         self.window_start_index = min(max_start_index, self.window_start_index + periods)
-        self.analyze_current_window()
+        self.redraw.request()
         
     def analyze_current_window(self):
         if self.current_stock_data is None:
@@ -739,16 +998,17 @@ class EnvelopeAnalysisPage(QWidget):
         end_date = window_df.index[-1].strftime('%Y-%m-%d')
         
         
-        # 调用特征分析方法
-        analyzer = FeatureAnalyzer()
-        
-        # 获取配置的年数列表
-        years_list = [int(y) for y in self.data_mgr.config['Returns']['years'].split(',')]
-        
-        # 计算不同周期的年化收益
-        close_prices = window_df['Close'].values
-        annual_returns = analyzer.calculate_annualized_returns(close_prices, years_list)
-        
+        # 优先使用预计算缓存, 未就绪时直接计算
+        cached = self.window_cache.get(self.current_stock_code, start_idx)
+        if cached is not None:
+            annual_returns = cached['annual_returns']
+            stability_data1, envelope1 = cached['low_rate'], cached['envelope']
+            stability_data2, envelope2 = cached['low_rate2'], cached['envelope']
+        else:
+            close_prices = window_df['Close'].values
+            annual_returns = self.analyzer.calculate_annualized_returns(close_prices, self.years_list)
+            stability_data1, envelope1 = self.analyzer.analyze_stability(close_prices, self.years_list)
+            stability_data2, envelope2 = self.analyzer.analyze_stability(close_prices, self.years_list, "low_rate2")
         
         # 计算量比
         volume_ratio = window_df['Volume_Ratio'].values
@@ -757,84 +1017,8 @@ class EnvelopeAnalysisPage(QWidget):
         return_labels = [f'{y}年: {r*100:.1f}%' for y,r in annual_returns]
         return_labels.append(f'量比: {volume_ratio[-1]:.2f}')
 
-        # 更新成长性图表
-        self.figure1.clear()
-        ax1 = self.figure1.add_subplot(111)
-        
-        # 创建双Y轴图表
-        ax1_price = ax1
-        ax1_volume = ax1_price.twinx()
-        
-        # 绘制收盘价线
-        ax1_price.plot(window_df.index, window_df['Close'], 'b-', label='收盘价', linewidth=1.5)
-        ax1_price.set_ylabel('价格', color='b', fontsize=8)
-        ax1_price.tick_params(axis='y', labelcolor='b', labelsize=7)
-        
-        
-        
-        # 绘制量比柱状图
-        bars = ax1_volume.bar(window_df.index, volume_ratio, alpha=0.3, color='orange', width=5, label='量比')
-        ax1_volume.set_ylabel('量比', color='orange', fontsize=8)
-        ax1_volume.tick_params(axis='y', labelcolor='orange', labelsize=7)
-        
-        # 设置量比Y轴范围
-        max_volume_ratio = max(volume_ratio)
-        ax1_volume.set_ylim(0, max_volume_ratio * 1.2)
-        
-        # 添加图例
-        lines1, labels1 = ax1_price.get_legend_handles_labels()
-        lines2, labels2 = ax1_volume.get_legend_handles_labels()
-        ax1_price.legend(lines1 + lines2, labels1 + labels2, fontsize=7, loc='upper left')
-        
-        ax1_price.set_title(f'年化收益率: {return_labels}', fontsize=10)
-        ax1_price.tick_params(axis='both', which='major', labelsize=7)
-        
-        # 自动调整日期显示
-        plt.setp(ax1_price.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        
-        self.canvas1.draw()
-
-        stability_data, envelope = analyzer.analyze_stability(close_prices, years_list)
-        
-        # 更新稳定性图表
-        stability_labels = [f'{y}年: {r*100:.1f}' for y,r in stability_data['growth_scores']]
-        add_labels = [f'extrema: {stability_data["last_extrema_value"]:.1f}', f'value: {stability_data["lastvalue"]:.1f}',f'change: {stability_data["lastchange"]:.1f}%']
-        stability_labels.extend(add_labels)
-        self.figure2.clear()
-        ax2 = self.figure2.add_subplot(111)
-        #ax2.plot(window_df['Close'], label='原始价格')
-        ax2.plot(window_df.index, envelope, 'g--', label='包络线')
-        ax2.scatter(window_df.index[stability_data['peaks']],  # 使用日期索引
-                   envelope[stability_data['peaks']], 
-                   marker='^', color='b')
-        ax2.scatter(window_df.index[stability_data['valleys']],  # 使用日期索引
-                   envelope[stability_data['valleys']],
-                   marker='v', color='r')
-        ax2.set_title(f'成长性得分: {stability_labels}', fontsize=10)
-        ax2.tick_params(axis='both', which='major', labelsize=8)
-        ax2.legend(fontsize=8)
-        self.canvas2.draw()
-
-        stability_data, envelope = analyzer.analyze_stability(close_prices, years_list, "low_rate2")
-        
-        # 更新稳定性图表
-        stability_labels = [f'{y}年: {r*100:.1f}' for y,r in stability_data['growth_scores']]
-        add_labels = [f'extrema: {stability_data["last_extrema_value"]:.1f}', f'value: {stability_data["lastvalue"]:.1f}',f'change: {stability_data["lastchange"]:.1f}%']
-        stability_labels.extend(add_labels)
-        self.figure3.clear()
-        ax3 = self.figure3.add_subplot(111)
-        #ax2.plot(window_df['Close'], label='原始价格')
-        ax3.plot(window_df.index, envelope, 'g--', label='包络线')
-        ax3.scatter(window_df.index[stability_data['peaks']],  # 使用日期索引
-                   envelope[stability_data['peaks']], 
-                   marker='^', color='b')
-        ax3.scatter(window_df.index[stability_data['valleys']],  # 使用日期索引
-                   envelope[stability_data['valleys']],
-                   marker='v', color='r')
-        ax3.set_title(f'成长性得分: {stability_labels}', fontsize=10)
-        ax3.tick_params(axis='both', which='major', labelsize=8)
-        ax3.legend(fontsize=8)
-        self.canvas3.draw() 
+        self.charts.show(window_df, volume_ratio, return_labels,
+                         [(stability_data1, envelope1), (stability_data2, envelope2)])
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
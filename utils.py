@@ -1,5 +1,8 @@
 import numpy as np
-from scipy.signal import find_peaks, hilbert, butter, filtfilt
+from configparser import ConfigParser
+from scipy.signal import find_peaks, hilbert, filtfilt
+
+from feature_analysis import butter_coefficients
 
 class UtilsAnalyzer:
     def __init__(self):
@@ -16,8 +19,8 @@ class UtilsAnalyzer:
 
     def extract_envelope(self, data):
         """使用希尔伯特变换提取包络线"""
-        # 设计低通滤波器
-        b, a = butter(self.filter_order, self.cutoff_freq, btype='low')   
+        # 低通滤波器系数按(order, cutoff)缓存
+        b, a = butter_coefficients(self.filter_order, self.cutoff_freq)
         # 零相位滤波
         envelope = filtfilt(b, a, data)
 
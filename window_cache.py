@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from configparser import ConfigParser
+
+from feature_analysis import FeatureAnalyzer
+
+
+class EnvelopeWindowCache:
+    """
+    包络线分析页的滑动窗口预计算缓存
+
+    选中股票后在后台线程中一次性计算所有窗口起点的包络线、极值点、成长性分数和年化收益,
+    翻页时只需查表重绘. 选择其他股票时旧缓存被淘汰, 未完成的旧计算结果会被丢弃.
+    """
+    def __init__(self, window_size=None):
+        self.config = ConfigParser()
+        self.config.read('config.ini')
+        self.window_size = window_size or self.config.getint('envelope', 'window_size', fallback=260)
+        self.years_list = [int(y) for y in self.config.get('Returns', 'years', fallback='1,2,3,5,10').split(',')]
+        self.analyzer = FeatureAnalyzer()
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stock_code = None
+        self._data = None
+        self._thread = None
+
+    def start(self, stock_code, close_prices):
+        """淘汰旧缓存并在后台开始预计算"""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._stock_code = stock_code
+            self._data = None
+        prices = np.asarray(close_prices, dtype=float).copy()
+        self._thread = threading.Thread(target=self._precompute, args=(generation, prices), daemon=True)
+        self._thread.start()
+
+    def put(self, stock_code, data):
+        """直接使用已算好的结果(compute的返回值), 如后台预取的结果"""
+        with self._lock:
+            self._generation += 1
+            self._stock_code = stock_code
+            self._data = data
+
+    def evict(self):
+        """淘汰缓存, 进行中的计算结果将被丢弃"""
+        with self._lock:
+            self._generation += 1
+            self._stock_code = None
+            self._data = None
+
+    def is_ready(self, stock_code):
+        with self._lock:
+            return self._data is not None and self._stock_code == stock_code
+
+    def wait(self, timeout=None):
+        """等待当前的预计算完成"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _precompute(self, generation, prices):
+        try:
+            data = self.compute(prices)
+        except Exception as e:
+            print(f"窗口预计算失败: {str(e)}")
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._data = data
+
+    def compute(self, prices):
+        """计算所有窗口起点的分析结果, 以紧凑的数组形式返回"""
+        window_size = min(self.window_size, len(prices))
+        windows = sliding_window_view(prices, window_size)
+        envelopes = self.analyzer.extract_hilbert_envelope_batch(windows)
+        annual_returns = self.analyzer.calculate_annualized_returns_batch(windows, self.years_list)
+
+        data = {
+            'window_size': window_size,
+            'envelopes': envelopes.astype(np.float32),
+            'annual_returns': annual_returns,
+        }
+        extrema_lists = self.analyzer.find_extrema_batch_multi(
+            envelopes, [self.analyzer.low_rate, self.analyzer.low_rate2])
+        for low_rate_type, extrema_list in zip(('low_rate', 'low_rate2'), extrema_lists):
+            growth_data = self.analyzer.calculate_growth_score_batch(envelopes, extrema_list, self.years_list)
+            # 极值点按窗口顺序拼接, 用偏移量定位 (CSR格式)
+            peaks = [e['peaks'] for e in extrema_list]
+            valleys = [e['valleys'] for e in extrema_list]
+            data[low_rate_type] = {
+                'peaks': np.concatenate(peaks).astype(np.int32),
+                'peaks_offsets': np.concatenate([[0], np.cumsum([len(p) for p in peaks])]),
+                'valleys': np.concatenate(valleys).astype(np.int32),
+                'valleys_offsets': np.concatenate([[0], np.cumsum([len(v) for v in valleys])]),
+                'growth_scores': growth_data['growth_scores'],
+                'lastvalue': growth_data['lastvalue'],
+                'lastchange': growth_data['lastchange'],
+                'last_extrema_value': growth_data['last_extrema_value'],
+            }
+        return data
+
+    def get(self, stock_code, start_index):
+        """
+        查询窗口结果
+
+        返回:
+            None (缓存未就绪) 或 dict:
+                annual_returns: [(years, return), ...]
+                envelope: 窗口包络线
+                low_rate / low_rate2: 与analyze_stability返回字段一致的稳定性数据
+        """
+        with self._lock:
+            if self._data is None or self._stock_code != stock_code:
+                return None
+            data = self._data
+        if not 0 <= start_index < len(data['envelopes']):
+            return None
+
+        result = {
+            'annual_returns': [(y, r) for y, r in zip(self.years_list, data['annual_returns'][start_index])
+                               if not np.isnan(r)],
+            'envelope': data['envelopes'][start_index].astype(float),
+        }
+        for low_rate_type in ('low_rate', 'low_rate2'):
+            d = data[low_rate_type]
+            scores = d['growth_scores'][start_index]
+            result[low_rate_type] = {
+                'peaks': d['peaks'][d['peaks_offsets'][start_index]:d['peaks_offsets'][start_index+1]],
+                'valleys': d['valleys'][d['valleys_offsets'][start_index]:d['valleys_offsets'][start_index+1]],
+                'growth_scores': [(y, r) for y, r in zip(self.years_list, scores) if not np.isnan(r)],
+                'lastvalue': d['lastvalue'][start_index],
+                'lastchange': d['lastchange'][start_index],
+                'last_extrema_value': d['last_extrema_value'][start_index],
+            }
+        return result